@@ -0,0 +1,56 @@
+"""
+serialization of json module and orjson compared, on payloads of the paths using fast_json:
+dataset rows returned by console and consume endpoints, topic events ingested, json columns of topic rows.
+
+    python tests/benchmark_fast_json.py [rows]
+"""
+import sys
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+from watchmen.common.utils import fast_json
+from watchmen.config.config import processor_settings
+
+
+def build_dataset_rows(count: int) -> list:
+    return [[i, "customer-{0}".format(i), Decimal("{0}.25".format(i)), datetime(2021, 7, 1, 12, i % 60), i % 7 == 0]
+            for i in range(count)]
+
+
+def build_topic_events(count: int) -> list:
+    return [{"code": "order", "user": "admin", "tenantId": "1",
+             "data": {"orderId": i, "amount": i * 1.5, "status": "paid", "customer": {"id": i % 100, "level": "gold"},
+                      "items": [{"sku": "sku-{0}".format(j), "quantity": j} for j in range(5)]}}
+            for i in range(count)]
+
+
+def measure(name: str, func, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print("  {0:<28} {1:>10.2f} ms".format(name, seconds * 1000))
+    return seconds
+
+
+def run(rows: int):
+    dataset_rows = build_dataset_rows(rows)
+    topic_events = build_topic_events(rows)
+    event_payloads = fast_json.json_dumps(topic_events)
+    results = {}
+    for enabled in [False, True]:
+        processor_settings.FAST_JSON_ON = enabled
+        if enabled and not fast_json.fast_json_enabled():
+            print("orjson is not installed")
+            break
+        print("orjson" if enabled else "json")
+        results[enabled] = [
+            measure("dumps dataset rows", lambda: fast_json.json_dumps({"data": dataset_rows}), 10),
+            measure("dumps topic events", lambda: fast_json.json_dumps(topic_events), 10),
+            measure("loads topic events", lambda: fast_json.json_loads(event_payloads), 10)
+        ]
+    if len(results) == 2:
+        print("speed up: {0}".format(", ".join("{0:.1f}x".format(before / after)
+                                             for before, after in zip(results[False], results[True]))))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,118 @@
+import unittest
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from model.model.topic.topic import Topic
+
+from watchmen.config.config import processor_settings, COMBINER_DURABILITY_PIPELINE, COMBINER_DURABILITY_WINDOW, \
+    COMBINER_TRIGGER_FLUSH
+from watchmen.pipeline.core.combiner.aggregate_combiner import AggregateCombiner, combine_aggregate_row, \
+    flush_pipeline_aggregate_combiner, trigger_combined_row
+
+TOPIC = Topic(topicId="1", name="order_summary", kind="business")
+USER = SimpleNamespace(tenantId="1", name="admin")
+WHERE = {"customer_id": {"=": 1}}
+
+
+class RecordingWriter:
+    """
+    rows written by combiner, the writes of given times fail
+    """
+
+    def __init__(self, failures: int = 0):
+        self.rows = []
+        self.failures = failures
+
+    def write_aggregate_row(self, mappings, where_, target_topic, pipeline_uid, current_user, triggerable):
+        if self.failures > 0:
+            self.failures = self.failures - 1
+            raise Exception("write failed")
+        self.rows.append((where_, mappings))
+        return SimpleNamespace(topicName=target_topic.name, data=mappings, triggerType="update"), False
+
+
+def build_pipeline_context(trace_id):
+    return SimpleNamespace(pipelineTopic=None, pipeline=SimpleNamespace(pipelineId="p1"), currentUser=USER,
+                           traceId=trace_id, aggregateCombiner=None, pipeline_trigger_merge_list=[])
+
+
+class AggregateCombinerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = RecordingWriter()
+        patcher = mock.patch("watchmen.pipeline.core.combiner.aggregate_combiner.write_aggregate_row",
+                             self.writer.write_aggregate_row)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_combine_deltas_of_one_row(self):
+        combiner = AggregateCombiner()
+        combiner.combine({"total": {"_sum": Decimal("1.5")}, "orders": {"_count": 1}, "status": "new",
+                          "avg_amount": {"_avg": {"_sum": 10, "_count": 1}}}, WHERE, TOPIC, "p1", USER, "t1")
+        combiner.combine({"total": {"_sum": 2}, "orders": {"_count": 1}, "status": "paid",
+                          "avg_amount": {"_avg": {"_sum": 20, "_count": 1}}}, WHERE, TOPIC, "p1", USER, "t2")
+        combiner.combine({"total": {"_sum": 1}}, {"customer_id": {"=": 2}}, TOPIC, "p1", USER, "t3")
+        self.assertEqual(combiner.pending(), 3)
+        combiner.flush()
+        self.assertEqual(self.writer.rows, [
+            (WHERE, {"total": {"_sum": Decimal("3.5")}, "orders": {"_count": 2}, "status": "paid",
+                     "avg_amount": {"_avg": {"_sum": 30, "_count": 2}}}),
+            ({"customer_id": {"=": 2}}, {"total": {"_sum": 1}})])
+        self.assertEqual(combiner.pending(), 0)
+
+    def test_failed_rows_kept_and_merged_with_newer_deltas(self):
+        self.writer.failures = 1
+        combiner = AggregateCombiner()
+        combiner.combine({"total": {"_sum": 1}}, WHERE, TOPIC, "p1", USER, "t1")
+        with self.assertRaises(Exception):
+            combiner.flush()
+        combiner.combine({"total": {"_sum": 2}}, WHERE, TOPIC, "p1", USER, "t2")
+        self.assertEqual(combiner.pending(), 2)
+        combiner.flush()
+        self.assertEqual(self.writer.rows, [(WHERE, {"total": {"_sum": 3}})])
+
+    def test_deltas_of_one_pipeline_run_flushed_into_context(self):
+        with mock.patch.object(processor_settings, "AGGREGATE_COMBINER_DURABILITY", COMBINER_DURABILITY_PIPELINE):
+            context = build_pipeline_context("t1")
+            combine_aggregate_row(context, {"total": {"_sum": 1}}, WHERE, TOPIC)
+            combine_aggregate_row(context, {"total": {"_sum": 2}}, WHERE, TOPIC)
+            self.assertEqual(self.writer.rows, [])
+            flush_pipeline_aggregate_combiner(context)
+        self.assertEqual(self.writer.rows, [(WHERE, {"total": {"_sum": 3}})])
+        self.assertEqual([trigger.data for trigger in context.pipeline_trigger_merge_list], [{"total": {"_sum": 3}}])
+
+    def test_deltas_of_pipeline_runs_combined_in_window(self):
+        combiner = AggregateCombiner()
+        with mock.patch("watchmen.pipeline.core.combiner.aggregate_combiner.window_combiner", combiner), \
+                mock.patch("watchmen.pipeline.core.combiner.aggregate_combiner.window_flusher"), \
+                mock.patch("watchmen.pipeline.core.combiner.aggregate_combiner.trigger_combined_row") as trigger, \
+                mock.patch.object(processor_settings, "AGGREGATE_COMBINER_DURABILITY", COMBINER_DURABILITY_WINDOW), \
+                mock.patch.object(processor_settings, "AGGREGATE_COMBINER_TRIGGER", COMBINER_TRIGGER_FLUSH), \
+                mock.patch.object(processor_settings, "AGGREGATE_COMBINER_MAX_EVENTS", 3):
+            for trace_id in ["t1", "t2"]:
+                combine_aggregate_row(build_pipeline_context(trace_id), {"total": {"_sum": 1}}, WHERE, TOPIC)
+            self.assertEqual(self.writer.rows, [])
+            # flushed when max events are combined
+            combine_aggregate_row(build_pipeline_context("t3"), {"total": {"_sum": 1}}, WHERE, TOPIC)
+        self.assertEqual(self.writer.rows, [(WHERE, {"total": {"_sum": 3}})])
+        self.assertEqual(trigger.call_count, 1)
+        self.assertEqual(trigger.call_args[0][1].traceId, "t3")
+
+    def test_trigger_combined_row_without_executor(self):
+        from watchmen.pipeline.core.executor.pipeline_executor import PipelineExecutorNotStartedError
+
+        executor = mock.Mock()
+        executor.schedule_threadsafe.side_effect = PipelineExecutorNotStartedError()
+        combiner = AggregateCombiner()
+        combiner.combine({"total": {"_sum": 1}}, WHERE, TOPIC, "p1", USER, "t1")
+        row = list(combiner.rows.values())[0]
+        trigger_data = SimpleNamespace(topicName=TOPIC.name, data={"total": 1}, triggerType="update")
+        with mock.patch("watchmen.pipeline.core.combiner.aggregate_combiner.get_pipeline_executor",
+                        return_value=executor), mock.patch("watchmen.pipeline.index.trigger_pipeline") as trigger:
+            trigger_combined_row(trigger_data, row)
+        trigger.assert_called_once_with(TOPIC.name, {"total": 1}, "update", USER, "t1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from decimal import Decimal
+
+from watchmen.common.utils.data_utils import compute_average
+from watchmen.pipeline.core.action.utils import resolve_avg_aggregates, AGGREGATE_ASSIST
+from watchmen.pipeline.core.mapping.parse_mapping import compute_avg_delta
+
+
+def apply_deltas(*changes):
+    """
+    changes are (previous value, current value) of one source row, applied on one target row in order
+    """
+    target_data = None
+    for previous_value, current_value in changes:
+        mappings_results = {"amount_avg": {"_avg": compute_avg_delta(previous_value, current_value)}}
+        target_data = resolve_avg_aggregates(mappings_results, target_data)
+    return target_data
+
+
+class AvgAggregateTest(unittest.TestCase):
+
+    def test_avg_of_inserted_values(self):
+        target_data = apply_deltas((None, Decimal("10")), (None, Decimal("20")), (None, Decimal("30")))
+        self.assertEqual(target_data["amount_avg"], Decimal("20"))
+        self.assertEqual(target_data[AGGREGATE_ASSIST]["amount_avg"], {"_sum": 60.0, "_count": 3})
+
+    def test_null_value_not_counted(self):
+        target_data = apply_deltas((None, Decimal("10")), (None, None))
+        self.assertEqual(target_data["amount_avg"], Decimal("10"))
+        self.assertEqual(target_data[AGGREGATE_ASSIST]["amount_avg"]["_count"], 1)
+
+    def test_value_changed(self):
+        target_data = apply_deltas((None, Decimal("10")), (None, Decimal("20")), (Decimal("20"), Decimal("40")))
+        self.assertEqual(target_data["amount_avg"], Decimal("25"))
+
+    def test_value_changed_to_and_from_null(self):
+        target_data = apply_deltas((None, Decimal("10")), (None, Decimal("20")), (Decimal("20"), None))
+        self.assertEqual(target_data["amount_avg"], Decimal("10"))
+        target_data = apply_deltas((None, Decimal("10")), (None, None), (None, Decimal("30")))
+        self.assertEqual(target_data["amount_avg"], Decimal("20"))
+
+    def test_avg_of_no_values_is_null(self):
+        self.assertIsNone(apply_deltas((None, None))["amount_avg"])
+        self.assertIsNone(apply_deltas((None, Decimal("10")), (Decimal("10"), None))["amount_avg"])
+
+    def test_state_read_from_json(self):
+        target_data = {AGGREGATE_ASSIST: '{"amount_avg": {"_sum": 30, "_count": 2}}'}
+        mappings_results = {"amount_avg": {"_avg": compute_avg_delta(None, Decimal("30"))}}
+        self.assertEqual(resolve_avg_aggregates(mappings_results, target_data)["amount_avg"], Decimal("20"))
+
+    def test_compute_average(self):
+        self.assertEqual(compute_average({"_sum": Decimal("9"), "_count": 3}), Decimal("3"))
+        self.assertIsNone(compute_average({"_sum": 0, "_count": 0}))
+        # value written before avg state is kept
+        self.assertEqual(compute_average(Decimal("7")), Decimal("7"))
+
+
+if __name__ == "__main__":
+    unittest.main()
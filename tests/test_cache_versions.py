@@ -0,0 +1,52 @@
+import unittest
+
+from watchmen.common.cache.invalidation_bus import InvalidationBus
+from watchmen.common.cache.metadata_cache import MetadataCache
+from watchmen.common.cache.versions import Versions
+
+
+class VersionsTest(unittest.TestCase):
+
+    def test_increase(self):
+        versions = Versions(10)
+        self.assertEqual(versions.get("a"), 0)
+        self.assertEqual(versions.increase("a"), 1)
+        self.assertEqual(versions.increase("a"), 2)
+        self.assertEqual(versions.get("b"), 0)
+
+    def test_evicted_version_never_comes_back(self):
+        versions = Versions(2)
+        seen = {"a": [versions.get("a")]}
+        for _ in range(3):
+            seen["a"].append(versions.increase("a"))
+        versions.increase("b")
+        versions.increase("c")
+        # a is evicted, its old versions are not returned again
+        self.assertEqual(len(versions.versions), 2)
+        self.assertEqual(versions.get("a"), 3)
+        self.assertEqual(versions.increase("a"), 4)
+        self.assertNotIn(versions.get("a"), seen["a"])
+        # keys never increased share the floor
+        self.assertEqual(versions.get("d"), 3)
+
+    def test_stale_load_not_cached_after_eviction(self):
+        cache = MetadataCache("test", 10)
+        cache.versions = Versions(1)
+        version = cache.version("a")
+        cache.invalidate("a", False)
+        cache.invalidate("b", False)
+        cache.set(None, "a", "stale", version)
+        self.assertIsNone(cache.get(None, "a"))
+        cache.set(None, "a", "loaded", cache.version("a"))
+        self.assertEqual(cache.get(None, "a"), "loaded")
+
+
+class InvalidationBusTest(unittest.TestCase):
+
+    def test_publish_is_abstract(self):
+        with self.assertRaises(TypeError):
+            InvalidationBus()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import unittest
+from decimal import Decimal
+
+from watchmen.report.engine.columnar import ColumnarResult, fetch_columnar, build_arrow_schema, to_arrow_stream, \
+    arrow_enabled
+from watchmen.report.engine.dataset_export import CsvChunkWriter, ParquetChunkWriter
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+COLUMNS = ["name", "amount", "rate", "quantity"]
+# description of presto cursor, decimals are strings in rows
+DESCRIPTION = [("name", "varchar"), ("amount", "decimal(12,4)"), ("rate", "double"), ("quantity", "bigint")]
+
+
+class FakeCursor:
+    def __init__(self, rows, description):
+        self.rows = rows
+        self.description = None
+        self.pendingDescription = description
+
+    def fetchmany(self, size):
+        self.description = self.pendingDescription
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def write_parquet(chunks, description) -> bytes:
+    writer = ParquetChunkWriter(COLUMNS)
+    data = writer.header()
+    for rows in chunks:
+        data = data + writer.write(rows, description)
+    return data + writer.close()
+
+
+@unittest.skipIf(not arrow_enabled(), "pyarrow is not installed")
+class ParquetChunkWriterTest(unittest.TestCase):
+
+    def test_schema_of_description_fits_later_chunks(self):
+        chunks = [[("a", "1.5", 1, 1), ("b", None, None, None)],
+                  [("c", "12345678.1234", 2.25, 10 ** 12), ("d", "0.0001", 1e300, -1)]]
+        table = parquet.read_table(io.BytesIO(write_parquet(chunks, DESCRIPTION)))
+        self.assertEqual(table.schema.field("amount").type, pyarrow.decimal128(12, 4))
+        self.assertEqual(table.schema.field("rate").type, pyarrow.float64())
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.column("amount").to_pylist(),
+                         [Decimal("1.5"), None, Decimal("12345678.1234"), Decimal("0.0001")])
+        self.assertEqual(table.column("rate").to_pylist(), [1.0, None, 2.25, 1e300])
+
+    def test_inferred_types_widened_without_description(self):
+        chunks = [[("a", Decimal("1.5"), 1, 1)], [("b", Decimal("123456789012.5"), 2.5, 2)]]
+        table = parquet.read_table(io.BytesIO(write_parquet(chunks, None)))
+        self.assertEqual(table.schema.field("amount").type, pyarrow.decimal128(38, 1))
+        self.assertEqual(table.schema.field("rate").type, pyarrow.float64())
+        self.assertEqual(table.column("rate").to_pylist(), [1.0, 2.5])
+
+    def test_columns_without_value_are_strings(self):
+        schema = build_arrow_schema(COLUMNS, None, [[None], [None], [None], [None]])
+        self.assertTrue(all(pyarrow.types.is_string(field.type) for field in schema))
+
+    def test_no_rows(self):
+        self.assertEqual(write_parquet([], DESCRIPTION), b"")
+
+
+class ColumnarTest(unittest.TestCase):
+
+    def test_fetch_columnar(self):
+        result = fetch_columnar(FakeCursor([("a", "1.5", 1.0, 1), ("b", "2", 2.0, 2), ("c", "3", 3.0, 3)],
+                                           DESCRIPTION), 2)
+        self.assertEqual(result.rowCount, 3)
+        self.assertEqual(result.to_json(), {"columns": COLUMNS, "data": [["a", "b", "c"], ["1.5", "2", "3"],
+                                                                          [1.0, 2.0, 3.0], [1, 2, 3]]})
+
+    @unittest.skipIf(not arrow_enabled(), "pyarrow is not installed")
+    def test_arrow_stream(self):
+        result = ColumnarResult(["name", "quantity"])
+        result.append([("a", 1), ("b", None)])
+        table = pyarrow.ipc.open_stream(to_arrow_stream(result)).read_all()
+        self.assertEqual(table.to_pydict(), {"name": ["a", "b"], "quantity": [1, None]})
+
+    def test_csv_chunks(self):
+        writer = CsvChunkWriter(["name", "quantity"])
+        self.assertEqual(writer.header() + writer.write([("a", 1)], DESCRIPTION) + writer.close(),
+                         b"name,quantity\r\na,1\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
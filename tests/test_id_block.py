@@ -0,0 +1,76 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from watchmen.common.guid import id_block
+from watchmen.common.guid.id_block import IdBlockAllocator, get_int_surrogate_key, get_int_surrogate_keys
+from watchmen.config.config import processor_settings
+
+# bits of snowflake worker of watchmen_boot
+WORKER = SimpleNamespace(MAX_SEQUENCE=4095, TWEPOCH=1288834974657, TIMESTAMP_LEFT_SHIFT=22, DATACENTER_ID_SHIFT=17,
+                         WOKER_ID_SHIFT=12, datacenter_id=1, worker_id=2)
+NOW = 1630000000000
+
+
+class Clock:
+    def __init__(self, millis: int):
+        self.millis = millis
+
+    def __call__(self):
+        return self.millis
+
+
+class IdBlockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock(NOW)
+        self.allocator = IdBlockAllocator(WORKER)
+        for target, value in [("current_millis", self.clock), ("allocator", self.allocator),
+                              ("settings", SimpleNamespace(SNOWFLAKE_REMOTE=False)),
+                              ("__local", threading.local())]:
+            patcher = mock.patch.object(id_block, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.blockSize = processor_settings.SURROGATE_KEY_BLOCK_SIZE
+        processor_settings.SURROGATE_KEY_BLOCK_SIZE = 4
+
+    def tearDown(self):
+        processor_settings.SURROGATE_KEY_BLOCK_SIZE = self.blockSize
+
+    def test_blocks_are_continuous_and_ascending(self):
+        first = self.allocator.allocate(3)
+        second = self.allocator.allocate(2)
+        ids = first + second
+        self.assertEqual(ids, list(range(ids[0], ids[0] + 5)))
+        self.assertEqual(self.allocator.timestamp_of(ids[0]), NOW)
+        self.assertEqual((ids[0] >> WORKER.WOKER_ID_SHIFT) & 0x1f, WORKER.worker_id)
+
+    def test_block_cut_at_max_sequence(self):
+        self.allocator.allocate(4090)
+        self.assertEqual(len(self.allocator.allocate(10)), 6)
+        # sequences of millisecond exhausted, waits for next one
+        with mock.patch.object(id_block, "current_millis", mock.Mock(side_effect=[NOW, NOW, NOW + 1])):
+            ids = self.allocator.allocate(2)
+        self.assertEqual(self.allocator.timestamp_of(ids[0]), NOW + 1)
+        self.assertEqual(ids[0] & WORKER.MAX_SEQUENCE, 0)
+
+    def test_ids_of_thread_ascending(self):
+        ids = [get_int_surrogate_key() for _ in range(10)] + get_int_surrogate_keys(5)
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_buffer_expired_when_allocator_moves_to_newer_millisecond(self):
+        first = get_int_surrogate_key()
+        self.clock.millis = NOW + 1
+        # other thread allocates in next millisecond
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_int_surrogate_key()))
+        thread.start()
+        thread.join()
+        second = get_int_surrogate_key()
+        self.assertGreater(other[0], first)
+        self.assertGreater(second, other[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+
+from watchmen.config.config import processor_settings
+from watchmen.connector.kafka.fake_broker import FakeKafkaBroker, TopicPartition
+from watchmen.connector.kafka.kafka_connector import KafkaBatchConsumer
+
+TOPIC = "watchmen"
+GROUP = "test"
+
+
+def build_record_value(code, value, user="admin"):
+    return json.dumps({"code": code, "user": user, "data": {"value": value}}).encode("utf-8")
+
+
+class RecordingImporter:
+    """
+    raw events saved and pipelines run by consumer, pipelines of values in failures fail the given times
+    """
+
+    def __init__(self, failures: dict = None):
+        self.saved = []
+        self.pipelines = []
+        self.failures = dict(failures or {})
+
+    def save_batch(self, code, topic_events, user):
+        self.saved.extend(topic_event.data["value"] for topic_event in topic_events)
+
+    async def run_pipeline(self, topic_event, user):
+        value = topic_event.data["value"]
+        if self.failures.get(value, 0) > 0:
+            self.failures[value] = self.failures[value] - 1
+            raise Exception("pipeline of {0} failed".format(value))
+        self.pipelines.append(value)
+
+    @staticmethod
+    def find_user(topic_event):
+        return SimpleNamespace(tenantId="1", name=topic_event.user)
+
+
+class KafkaBatchConsumerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backoff = processor_settings.CONNECTOR_RETRY_BACKOFF
+        self.maxRetries = processor_settings.CONNECTOR_MAX_RETRIES
+        processor_settings.CONNECTOR_RETRY_BACKOFF = 0
+        processor_settings.CONNECTOR_MAX_RETRIES = 2
+        self.broker = FakeKafkaBroker()
+        self.tp = TopicPartition(TOPIC, 0)
+        # kept by process, consumers of reconnections share it
+        self.savedOffsets = {}
+
+    def tearDown(self):
+        processor_settings.CONNECTOR_RETRY_BACKOFF = self.backoff
+        processor_settings.CONNECTOR_MAX_RETRIES = self.maxRetries
+
+    def consume(self, importer: RecordingImporter, times: int):
+        async def run():
+            consumer = self.broker.create_consumer(TOPIC, group_id=GROUP)
+            await consumer.start()
+            batch_consumer = KafkaBatchConsumer(consumer, importer.save_batch, importer.run_pipeline,
+                                                importer.find_user, self.savedOffsets)
+            for _ in range(times):
+                await batch_consumer.run_once()
+
+        asyncio.run(run())
+
+    def committed(self):
+        return self.broker.commits.get((GROUP, self.tp))
+
+    def test_consume_and_commit(self):
+        for value in range(3):
+            self.broker.produce(TOPIC, build_record_value("order", value))
+        importer = RecordingImporter()
+        self.consume(importer, 1)
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0, 1, 2])
+        self.assertEqual(self.committed(), 3)
+
+    def test_runs_by_topic_code_keep_order(self):
+        self.broker.produce(TOPIC, build_record_value("order", 0))
+        self.broker.produce(TOPIC, build_record_value("customer", 1))
+        self.broker.produce(TOPIC, build_record_value("order", 2))
+        importer = RecordingImporter()
+        self.consume(importer, 1)
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0, 1, 2])
+
+    def test_retry_failed_pipeline_without_saving_again(self):
+        for value in range(3):
+            self.broker.produce(TOPIC, build_record_value("order", value))
+        importer = RecordingImporter({1: 1})
+        self.consume(importer, 1)
+        # offset of the failed event is not committed
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0])
+        self.assertEqual(self.committed(), 1)
+
+        self.consume(importer, 1)
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0, 1, 2])
+        self.assertEqual(self.committed(), 3)
+
+    def test_skip_event_failed_more_than_max_retries(self):
+        for value in range(3):
+            self.broker.produce(TOPIC, build_record_value("order", value))
+        importer = RecordingImporter({1: 100})
+        self.consume(importer, processor_settings.CONNECTOR_MAX_RETRIES + 1)
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0, 2])
+        self.assertEqual(self.committed(), 3)
+
+    def test_skip_malformed_record(self):
+        self.broker.produce(TOPIC, b"not json")
+        self.broker.produce(TOPIC, build_record_value("order", 1))
+        importer = RecordingImporter()
+        self.consume(importer, 1)
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(importer.pipelines, [1])
+        self.assertEqual(self.committed(), 2)
+
+    def test_consume_from_committed_offset(self):
+        for value in range(2):
+            self.broker.produce(TOPIC, build_record_value("order", value))
+        self.consume(RecordingImporter(), 1)
+        self.broker.produce(TOPIC, build_record_value("order", 2))
+        importer = RecordingImporter()
+        self.consume(importer, 1)
+        self.assertEqual(importer.saved, [2])
+        self.assertEqual(self.committed(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
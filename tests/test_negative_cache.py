@@ -0,0 +1,78 @@
+import threading
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from model.model.topic.factor import Factor
+from model.model.topic.topic import Topic
+
+from watchmen.config.config import processor_settings
+from watchmen.pipeline.storage.negative_cache import NegativeCacheManager, find_equality_key
+
+TOPIC = Topic(topicId="1", name="order", factors=[Factor(factorId="1", name="order_id", type="number"),
+                                                  Factor(factorId="2", name="code", type="text"),
+                                                  Factor(factorId="3", name="created_at", type="datetime")])
+
+
+class NegativeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.textKeys = processor_settings.NEGATIVE_CACHE_TEXT_KEYS
+        self.prescan = processor_settings.NEGATIVE_CACHE_PRESCAN
+        processor_settings.NEGATIVE_CACHE_PRESCAN = True
+
+    def tearDown(self):
+        processor_settings.NEGATIVE_CACHE_TEXT_KEYS = self.textKeys
+        processor_settings.NEGATIVE_CACHE_PRESCAN = self.prescan
+
+    def test_integral_numbers_have_same_key(self):
+        values = [10, Decimal("10.0"), Decimal("1E+1")]
+        keys = [find_equality_key({"order_id": {"=": value}}, TOPIC) for value in values]
+        self.assertEqual({key[2] for key in keys}, {"10"})
+
+    def test_inexact_values_have_no_key(self):
+        self.assertIsNone(find_equality_key({"order_id": {"=": Decimal("10.5")}}, TOPIC))
+        self.assertIsNone(find_equality_key({"order_id": {"=": "10"}}, TOPIC))
+        self.assertIsNone(find_equality_key({"created_at": {"=": datetime(2021, 7, 1)}}, TOPIC))
+        processor_settings.NEGATIVE_CACHE_TEXT_KEYS = False
+        self.assertIsNone(find_equality_key({"code": {"=": "A"}}, TOPIC))
+        processor_settings.NEGATIVE_CACHE_TEXT_KEYS = True
+        self.assertEqual(find_equality_key({"code": {"=": "A"}, "order_id": {"=": 1}}, TOPIC)[:2],
+                         (("code", "order_id"), ("text", "number")))
+
+    def test_prescanned_keys_and_rows_written_during_prescan(self):
+        manager = NegativeCacheManager()
+        scanning = threading.Event()
+        written = threading.Event()
+
+        def scan_keys(columns):
+            yield {"order_id": Decimal("1.000000")}
+            scanning.set()
+            # a row inserted while pre-scan is running
+            written.wait(5)
+            yield {"order_id": 2}
+
+        def write():
+            scanning.wait(5)
+            manager.add_row(TOPIC, {"order_id": 3}, "1")
+            written.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        cache = manager.get_cache(TOPIC, ("order_id",), ("number",), "1", scan_keys)
+        writer.join()
+        self.assertFalse(cache.is_absent("1"))
+        self.assertFalse(cache.is_absent("2"))
+        self.assertFalse(cache.is_absent("3"))
+        self.assertTrue(cache.is_absent("4"))
+
+    def test_inexact_row_disables_cache(self):
+        manager = NegativeCacheManager()
+        cache = manager.get_cache(TOPIC, ("order_id",), ("number",), "1", lambda columns: iter([]))
+        self.assertTrue(cache.is_absent("4"))
+        manager.add_row(TOPIC, {"order_id": Decimal("4.2")}, "1")
+        self.assertFalse(cache.is_absent("4"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from watchmen.config.config import processor_settings
+from watchmen.pipeline.core.journal.ingestion_journal import IngestionJournal, DEAD_LETTER
+from watchmen.pipeline.service.pipeline_journal_service import JournalDrainer, TRACE_ID, ACCEPTED_AT, EVENT, USER, \
+    FAILED_STAGE, SAVE, PIPELINE
+
+
+def build_record(value, code="order"):
+    return {TRACE_ID: str(value), ACCEPTED_AT: time.time(), EVENT: {"code": code, "data": {"value": value}},
+            USER: {"name": "admin", "tenantId": "1"}}
+
+
+class RecordingImporter:
+    """
+    raw rows saved and pipelines run by drainer, steps fail the given times
+    """
+
+    def __init__(self, save_failures: int = 0, pipeline_failures: int = 0):
+        self.saved = []
+        self.pipelines = []
+        self.saveFailures = save_failures
+        self.pipelineFailures = pipeline_failures
+
+    def save_run(self, records):
+        if self.saveFailures > 0:
+            self.saveFailures = self.saveFailures - 1
+            raise Exception("save failed")
+        self.saved.extend(record[EVENT]["data"]["value"] for record in records)
+
+    async def run_pipelines(self, records):
+        if self.pipelineFailures > 0:
+            self.pipelineFailures = self.pipelineFailures - 1
+            raise Exception("pipeline failed")
+        self.pipelines.extend(record[EVENT]["data"]["value"] for record in records)
+
+
+class JournalDrainerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backoff = processor_settings.CONNECTOR_RETRY_BACKOFF
+        self.maxRetries = processor_settings.CONNECTOR_MAX_RETRIES
+        processor_settings.CONNECTOR_RETRY_BACKOFF = 0
+        processor_settings.CONNECTOR_MAX_RETRIES = 2
+        self.directory = tempfile.mkdtemp()
+        self.journal = IngestionJournal(self.directory, 1 << 16, sync=False)
+
+    def tearDown(self):
+        processor_settings.CONNECTOR_RETRY_BACKOFF = self.backoff
+        processor_settings.CONNECTOR_MAX_RETRIES = self.maxRetries
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def drain(self, importer: RecordingImporter, *values) -> int:
+        for value in values:
+            self.journal.append(build_record(value))
+        drainer = JournalDrainer(self.journal, importer.save_run, importer.run_pipelines)
+        return asyncio.run(drainer.drain_once())
+
+    def replay(self, importer: RecordingImporter) -> int:
+        drainer = JournalDrainer(self.journal, importer.save_run, importer.run_pipelines)
+        return asyncio.run(drainer.replay_dead_letters())
+
+    def dead_letters(self):
+        path = os.path.join(self.directory, DEAD_LETTER)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def test_drain_and_commit(self):
+        importer = RecordingImporter()
+        self.assertEqual(self.drain(importer, 0, 1, 2), 3)
+        self.assertEqual(importer.saved, [0, 1, 2])
+        self.assertEqual(importer.pipelines, [0, 1, 2])
+        self.assertEqual(self.journal.depth, 0)
+        self.assertEqual(self.dead_letters(), [])
+
+    def test_retry_failed_pipelines_without_saving_again(self):
+        importer = RecordingImporter(pipeline_failures=2)
+        self.drain(importer, 0, 1)
+        self.assertEqual(importer.saved, [0, 1])
+        self.assertEqual(importer.pipelines, [0, 1])
+        self.assertEqual(self.dead_letters(), [])
+
+    def test_dead_letter_failed_pipelines_and_replay_without_saving(self):
+        importer = RecordingImporter(pipeline_failures=100)
+        self.drain(importer, 0, 1)
+        self.assertEqual(importer.saved, [0, 1])
+        self.assertEqual(importer.pipelines, [])
+        # checkpoint is moved after dead letter is written
+        self.assertEqual(self.journal.depth, 0)
+        self.assertEqual([record[FAILED_STAGE] for record in self.dead_letters()], [PIPELINE, PIPELINE])
+
+        importer = RecordingImporter()
+        self.assertEqual(self.replay(importer), 2)
+        self.assertEqual(importer.saved, [])
+        self.assertEqual(importer.pipelines, [0, 1])
+        self.assertEqual(self.dead_letters(), [])
+        self.assertEqual(self.replay(importer), 0)
+
+    def test_dead_letter_failed_save_and_replay(self):
+        importer = RecordingImporter(save_failures=100)
+        self.drain(importer, 0)
+        self.assertEqual(importer.saved, [])
+        self.assertEqual([record[FAILED_STAGE] for record in self.dead_letters()], [SAVE])
+
+        importer = RecordingImporter()
+        self.replay(importer)
+        self.assertEqual(importer.saved, [0])
+        self.assertEqual(importer.pipelines, [0])
+
+    def test_replay_failed_again_kept_in_dead_letter(self):
+        self.drain(RecordingImporter(pipeline_failures=100), 0)
+        importer = RecordingImporter(pipeline_failures=100)
+        self.replay(importer)
+        self.assertEqual(importer.saved, [])
+        self.assertEqual([record[TRACE_ID] for record in self.dead_letters()], ["0"])
+        self.assertEqual([record[FAILED_STAGE] for record in self.dead_letters()], [PIPELINE])
+
+
+if __name__ == "__main__":
+    unittest.main()
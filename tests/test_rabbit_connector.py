@@ -0,0 +1,143 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+
+from cacheout import LRUCache
+
+from watchmen.config.config import processor_settings
+from watchmen.connector.rabbitmq.local_queue import LocalQueue
+from watchmen.connector.rabbitmq.rabbit_connector import RabbitConsumer
+
+
+def build_message_body(code, value, user="admin"):
+    return json.dumps({"code": code, "user": user, "data": {"value": value}}).encode("utf-8")
+
+
+class RecordingImporter:
+    """
+    raw events saved and pipelines run by consumer, steps of values in failures fail the given times
+    """
+
+    def __init__(self, save_failures: dict = None, pipeline_failures: dict = None):
+        self.saved = []
+        self.pipelines = []
+        self.saveFailures = dict(save_failures or {})
+        self.pipelineFailures = dict(pipeline_failures or {})
+
+    @staticmethod
+    def fail(failures: dict, value, step: str):
+        if failures.get(value, 0) > 0:
+            failures[value] = failures[value] - 1
+            raise Exception("{0} of {1} failed".format(step, value))
+
+    def save_event(self, topic_event, user):
+        self.fail(self.saveFailures, topic_event.data["value"], "save")
+        self.saved.append(topic_event.data["value"])
+
+    async def run_pipeline(self, topic_event, user):
+        self.fail(self.pipelineFailures, topic_event.data["value"], "pipeline")
+        self.pipelines.append(topic_event.data["value"])
+
+    @staticmethod
+    def find_user(topic_event):
+        return SimpleNamespace(tenantId="1", name=topic_event.user)
+
+
+def failing_reject(settle):
+    def settle_or_fail(delivery_tag: int, multiple: bool, acked: bool):
+        if not acked:
+            raise Exception("reject failed")
+        settle(delivery_tag, multiple, acked)
+
+    return settle_or_fail
+
+
+class RabbitConsumerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backoff = processor_settings.CONNECTOR_RETRY_BACKOFF
+        self.maxRetries = processor_settings.CONNECTOR_MAX_RETRIES
+        processor_settings.CONNECTOR_RETRY_BACKOFF = 0
+        processor_settings.CONNECTOR_MAX_RETRIES = 2
+        # kept by process, consumers of reconnections share it
+        self.saved = LRUCache(maxsize=100, ttl=0)
+
+    def tearDown(self):
+        processor_settings.CONNECTOR_RETRY_BACKOFF = self.backoff
+        processor_settings.CONNECTOR_MAX_RETRIES = self.maxRetries
+
+    def consume(self, importer: RecordingImporter, messages: list, reject_failed: bool = False) -> LocalQueue:
+        """
+        messages are tuples of body and message id
+        """
+
+        async def run():
+            queue = LocalQueue()
+            for body, message_id in messages:
+                queue.publish(body, message_id)
+            if reject_failed:
+                queue.settle = failing_reject(queue.settle)
+            queue.close()
+            await RabbitConsumer(importer.save_event, importer.run_pipeline, importer.find_user,
+                                 concurrency=2, ack_batch=1, saved=self.saved).run(queue.iterator())
+            return queue
+
+        return asyncio.run(run())
+
+    def test_consume_and_ack(self):
+        importer = RecordingImporter()
+        queue = self.consume(importer, [(build_message_body("order", value), str(value)) for value in range(3)])
+        self.assertEqual(sorted(importer.saved), [0, 1, 2])
+        self.assertEqual(sorted(importer.pipelines), [0, 1, 2])
+        self.assertEqual(sorted(queue.acked), [1, 2, 3])
+        self.assertEqual(queue.unacked, [])
+
+    def test_retry_failed_pipeline_without_saving_again(self):
+        importer = RecordingImporter(pipeline_failures={1: 2})
+        queue = self.consume(importer, [(build_message_body("order", 1), "1")])
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(importer.pipelines, [1])
+        self.assertEqual(queue.acked, [1])
+
+    def test_retry_failed_save(self):
+        importer = RecordingImporter(save_failures={1: 1})
+        queue = self.consume(importer, [(build_message_body("order", 1), "1")])
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(importer.pipelines, [1])
+        self.assertEqual(queue.acked, [1])
+
+    def test_redelivered_message_not_saved_again(self):
+        importer = RecordingImporter()
+        self.consume(importer, [(build_message_body("order", 1), "1")])
+        # delivered again, eg. channel closed before ack is flushed
+        self.consume(importer, [(build_message_body("order", 1), "1")])
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(importer.pipelines, [1, 1])
+
+    def test_reject_event_failed_more_than_max_retries(self):
+        importer = RecordingImporter(pipeline_failures={1: 100})
+        queue = self.consume(importer, [(build_message_body("order", 1), "1")])
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(importer.pipelines, [])
+        self.assertEqual(queue.rejected, [1])
+
+    def test_reject_malformed_message(self):
+        importer = RecordingImporter()
+        queue = self.consume(importer, [(b"not json", "0"), (build_message_body("order", 1), "1")])
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(queue.rejected, [1])
+        self.assertEqual(queue.acked, [2])
+
+    def test_failed_reject_not_stall_acks(self):
+        importer = RecordingImporter()
+        queue = self.consume(importer, [(b"not json", "0"), (build_message_body("order", 1), "1")], reject_failed=True)
+        self.assertEqual(importer.saved, [1])
+        self.assertEqual(queue.rejected, [])
+        # acks of later messages are not stalled, the multiple ack covers the message failed to reject
+        self.assertEqual(queue.acked, [1, 2])
+        self.assertEqual(queue.unacked, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
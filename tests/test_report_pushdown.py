@@ -0,0 +1,140 @@
+import unittest
+from unittest import mock
+
+from model.model.common.parameter import Parameter, ParameterJoint
+from model.model.console_space.console_space import SubjectDataSet, SubjectDataSetJoin, SubjectDataSetColumn, \
+    SubjectDataSetFilterJoint
+from model.model.report.report import Report, ReportFunnel, ReportFunnelType
+from model.model.topic.factor import Factor
+from model.model.topic.topic import Topic
+from pypika import Table
+
+from watchmen.report.builder.dialects import PrestoQuery
+from watchmen.report.builder.pushdown import push_down_report_filters, find_source_topic_ids
+
+TOPICS = {
+    "order": Topic(topicId="order", name="order", factors=[Factor(factorId="amount", name="amount", type="number"),
+                                                           Factor(factorId="customer_id", name="customer_id",
+                                                                  type="text")]),
+    "customer": Topic(topicId="customer", name="customer",
+                      factors=[Factor(factorId="customer_id", name="customer_id", type="text"),
+                               Factor(factorId="level", name="level", type="number")])
+}
+
+# columns of dataset, report filters refer to them by column id
+AMOUNT = SubjectDataSetColumn(columnId="c1", alias="amount",
+                              parameter=Parameter(kind="topic", topicId="order", factorId="amount"))
+LEVEL = SubjectDataSetColumn(columnId="c2", alias="level",
+                             parameter=Parameter(kind="topic", topicId="customer", factorId="level"))
+
+
+def build_dataset(join_type="inner", columns=None) -> SubjectDataSet:
+    joins = [] if join_type is None else [SubjectDataSetJoin(topicId="order", factorId="customer_id",
+                                                             secondaryTopicId="customer",
+                                                             secondaryFactorId="customer_id", type=join_type)]
+    return SubjectDataSet(filters=SubjectDataSetFilterJoint(jointType="and", filters=[]),
+                          columns=columns or [AMOUNT, LEVEL], joins=joins)
+
+
+def column_filter(column: SubjectDataSetColumn, value: str, operator="equals") -> ParameterJoint:
+    return ParameterJoint(left=Parameter(kind="topic", topicId=column.parameter.topicId, factorId=column.columnId),
+                          operator=operator, right=Parameter(kind="constant", value=value))
+
+
+def conjunction(*filters) -> ParameterJoint:
+    return ParameterJoint(jointType="and", filters=list(filters))
+
+
+def topic_space_filter(topic_id):
+    # only order topic has space filter
+    if topic_id == "order":
+        return {"alias": "order", "query": PrestoQuery.from_(Table("topic_order")).select("*")}
+    return None
+
+
+def build_table(topic_id):
+    return Table("topic_" + TOPICS[topic_id].name)
+
+
+@mock.patch("watchmen.report.builder.pushdown.build_table_by_topic_id", build_table)
+@mock.patch("watchmen.report.builder.pushdown.get_topic_by_id", TOPICS.get)
+@mock.patch("watchmen.parser.console_paramter_parser.build_table_by_topic_id", build_table)
+@mock.patch("watchmen.parser.console_paramter_parser.get_topic_by_id", TOPICS.get)
+class ReportPushdownTest(unittest.TestCase):
+
+    @staticmethod
+    def push_down(dataset, filters=None, funnels=None):
+        return push_down_report_filters(Report(filters=filters, funnels=funnels), dataset, topic_space_filter)
+
+    @staticmethod
+    def find_sub_query_sql(pushdown, topic_id):
+        sub_query = pushdown.topicSpaceFilter(topic_id)
+        return sub_query["query"].get_sql() if sub_query else None
+
+    def test_push_into_space_filter_of_inner_join(self):
+        pushdown = self.push_down(build_dataset(), conjunction(column_filter(AMOUNT, "100")))
+        self.assertIsNone(pushdown.filters)
+        sql = self.find_sub_query_sql(pushdown, "order")
+        self.assertEqual(sql, "SELECT * FROM topic_order WHERE amount=100")
+
+    def test_create_sub_query_for_topic_without_space_filter(self):
+        pushdown = self.push_down(build_dataset(), conjunction(column_filter(LEVEL, "1")))
+        self.assertIsNone(pushdown.filters)
+        sql = self.find_sub_query_sql(pushdown, "customer")
+        self.assertEqual(sql, "SELECT * FROM topic_customer WHERE level=1")
+        self.assertEqual(pushdown.topicSpaceFilter("customer")["alias"], "customer")
+
+    def test_secondary_topic_of_left_join_not_pushed(self):
+        filters = conjunction(column_filter(AMOUNT, "100"), column_filter(LEVEL, "1"))
+        pushdown = self.push_down(build_dataset("left"), filters)
+        self.assertIn('amount=100', self.find_sub_query_sql(pushdown, "order"))
+        self.assertIsNone(self.find_sub_query_sql(pushdown, "customer"))
+        self.assertEqual(pushdown.filters.filters, [filters.filters[1]])
+
+    def test_primary_topic_of_right_join_not_pushed(self):
+        filters = conjunction(column_filter(AMOUNT, "100"), column_filter(LEVEL, "1"))
+        pushdown = self.push_down(build_dataset("right"), filters)
+        self.assertNotIn("WHERE", self.find_sub_query_sql(pushdown, "order"))
+        self.assertIn('level=1', self.find_sub_query_sql(pushdown, "customer"))
+        self.assertEqual(pushdown.filters.filters, [filters.filters[0]])
+
+    def test_conjunct_of_topics_left_on_chart_query(self):
+        mixed = ParameterJoint(jointType="or", filters=[column_filter(AMOUNT, "100"), column_filter(LEVEL, "1")])
+        filters = conjunction(mixed, column_filter(AMOUNT, "200"))
+        pushdown = self.push_down(build_dataset(), filters)
+        self.assertIn('amount=200', self.find_sub_query_sql(pushdown, "order"))
+        self.assertNotIn('amount=100', self.find_sub_query_sql(pushdown, "order"))
+        self.assertIsNone(self.find_sub_query_sql(pushdown, "customer"))
+        self.assertEqual(pushdown.filters.jointType, "and")
+        self.assertEqual(pushdown.filters.filters, [mixed])
+
+    def test_function_constant_left_on_chart_query(self):
+        filters = conjunction(column_filter(AMOUNT, "{&monthDiff(c1)}"))
+        pushdown = self.push_down(build_dataset(), filters)
+        self.assertEqual(pushdown.filters, filters)
+        self.assertNotIn("WHERE", self.find_sub_query_sql(pushdown, "order"))
+
+    def test_push_enabled_funnels(self):
+        funnels = [ReportFunnel(columnId=AMOUNT.columnId, type=ReportFunnelType.NUMERIC, range=True, enabled=True,
+                                values=["1", "10"]),
+                   ReportFunnel(columnId=LEVEL.columnId, type=ReportFunnelType.NUMERIC, enabled=False, values=["1"])]
+        pushdown = self.push_down(build_dataset(), funnels=funnels)
+        self.assertIn('amount BETWEEN 1 AND 10', self.find_sub_query_sql(pushdown, "order"))
+        self.assertIsNone(self.find_sub_query_sql(pushdown, "customer"))
+        self.assertEqual(pushdown.funnels, [funnels[1]])
+
+    def test_funnel_on_secondary_topic_of_left_join_not_pushed(self):
+        funnels = [ReportFunnel(columnId=LEVEL.columnId, type=ReportFunnelType.NUMERIC, enabled=True, values=["1"])]
+        pushdown = self.push_down(build_dataset("left"), funnels=funnels)
+        self.assertIsNone(self.find_sub_query_sql(pushdown, "customer"))
+        self.assertEqual(pushdown.funnels, funnels)
+
+    def test_source_topics_of_dataset_without_joins(self):
+        computed = SubjectDataSetColumn(columnId="c3", alias="total",
+                                        parameter=Parameter(kind="computed", type="add", parameters=[AMOUNT.parameter]))
+        self.assertEqual(find_source_topic_ids(build_dataset(None, [AMOUNT])), ["order"])
+        self.assertEqual(find_source_topic_ids(build_dataset(None, [computed, AMOUNT])), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
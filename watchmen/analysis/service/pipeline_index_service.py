@@ -4,7 +4,7 @@ from typing import List
 from model.model.common.parameter import Parameter
 from model.model.pipeline.pipeline import Pipeline, UnitAction, Stage, ProcessUnit
 from model.model.topic.topic import Topic
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 
 from watchmen.analysis.model.pipeline_index import PipelineIndex
 from watchmen.analysis.storage import pipeline_index_storage
@@ -4,7 +4,7 @@ from model.model.common.data_page import DataPage
 from model.model.common.pagination import Pagination
 
 from watchmen.auth.user_group import UserGroup
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
 from watchmen.database.find_storage_template import find_storage_template
 
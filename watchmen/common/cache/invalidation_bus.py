@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List
+
+from watchmen.config.config import processor_settings, INVALIDATION_BUS_LOCAL_FILE
+
+log = logging.getLogger("app." + __name__)
+
+ORIGIN = "origin"
+CHANNEL = "channel"
+
+# identity of current process, the messages published by itself are not delivered again
+process_origin = str(uuid.uuid4())
+
+
+class InvalidationBus(ABC):
+    """
+    broadcast cache invalidation messages to all workers.
+    messages are published after local caches are invalidated, so handlers are only called for other workers.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Callable]] = {}
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        self.handlers[channel] = [*self.handlers.get(channel, []), handler]
+
+    @abstractmethod
+    def publish(self, channel: str, message: dict):
+        pass
+
+    def dispatch(self, message: dict):
+        if message.get(ORIGIN) == process_origin:
+            return
+        for handler in self.handlers.get(message.get(CHANNEL), []):
+            try:
+                handler(message)
+            except Exception:
+                log.error(traceback.format_exc())
+
+
+class InProcessInvalidationBus(InvalidationBus):
+    """
+    no other worker to notify, for single worker deployment and tests
+    """
+
+    def publish(self, channel: str, message: dict):
+        pass
+
+
+class LocalFileInvalidationBus(InvalidationBus):
+    """
+    workers on one host append messages to a shared file, and tail it periodically
+    """
+
+    def __init__(self, path: str, poll_interval: float):
+        super().__init__()
+        self.path = path
+        self.pollInterval = poll_interval
+        self.lock = threading.Lock()
+        with open(self.path, "a"):
+            pass
+        self.offset = os.path.getsize(self.path)
+        threading.Thread(target=self.tail, daemon=True).start()
+
+    def publish(self, channel: str, message: dict):
+        line = json.dumps({**message, CHANNEL: channel, ORIGIN: process_origin}, default=str) + "\n"
+        with self.lock:
+            # small appends are atomic with O_APPEND, lines of workers are not interleaved
+            with open(self.path, "a") as file:
+                file.write(line)
+
+    def tail(self):
+        while True:
+            time.sleep(self.pollInterval)
+            try:
+                self.poll()
+            except Exception:
+                log.error(traceback.format_exc())
+
+    def poll(self):
+        if os.path.getsize(self.path) < self.offset:
+            # file is truncated
+            self.offset = 0
+        with open(self.path, "r") as file:
+            file.seek(self.offset)
+            while True:
+                line = file.readline()
+                if not line or not line.endswith("\n"):
+                    break
+                self.offset = self.offset + len(line.encode("utf-8"))
+                self.dispatch(json.loads(line))
+
+
+def __create_invalidation_bus() -> InvalidationBus:
+    if processor_settings.INVALIDATION_BUS == INVALIDATION_BUS_LOCAL_FILE:
+        return LocalFileInvalidationBus(processor_settings.INVALIDATION_BUS_FILE,
+                                        processor_settings.INVALIDATION_BUS_POLL_INTERVAL)
+    else:
+        return InProcessInvalidationBus()
+
+
+invalidation_bus = __create_invalidation_bus()
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    return invalidation_bus
+
+
+def register_invalidation_bus(bus: InvalidationBus):
+    """
+    replace the bus, eg. with a broker based implementation. subscriptions are moved to the new bus
+    """
+    global invalidation_bus
+    for channel, handlers in invalidation_bus.handlers.items():
+        for handler in handlers:
+            bus.subscribe(channel, handler)
+    invalidation_bus = bus
@@ -0,0 +1,92 @@
+import threading
+from typing import Dict
+
+from cacheout import Cache
+
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.common.cache.versions import Versions
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+
+METADATA_CHANNEL = "metadata"
+
+TOPIC_BY_NAME = "topic_by_name"
+TOPIC_BY_ID = "topic_by_id"
+PIPELINE_BY_ID = "pipeline_by_id"
+PIPELINES_BY_TOPIC_ID = "pipelines_by_topic_id"
+
+
+class MetadataCache:
+    """
+    metadata by (tenant, key). tenant None is used when loading without current user.
+
+    each key has a version which is increased on invalidation, a value loaded from storage is only cached
+    when the version is not changed during loading, so a concurrent invalidation is never overwritten by stale data.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.cache = Cache(maxsize=maxsize, ttl=0)
+        self.versions = Versions(processor_settings.CACHE_VERSIONS_SIZE)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, tenant_id, key):
+        value = self.cache.get((tenant_id, key))
+        if value is None:
+            CACHE_MISS.labels(self.name).inc()
+        else:
+            CACHE_HIT.labels(self.name).inc()
+        return value
+
+    def version(self, key) -> tuple:
+        return self.generation, self.versions.get(key)
+
+    def set(self, tenant_id, key, value, version: tuple = None):
+        if value is None:
+            return
+        with self.lock:
+            if version is not None and version != self.version(key):
+                return
+            self.cache.set((tenant_id, key), value)
+
+    def invalidate(self, key, publish: bool = True):
+        """
+        invalidate the key of all tenants, and of other workers when publish
+        """
+        with self.lock:
+            self.versions.increase(key)
+            self.cache.delete_many(lambda cache_key: cache_key[1] == key)
+        if publish:
+            get_invalidation_bus().publish(METADATA_CHANNEL, {"cache": self.name, "key": key})
+
+    def clear(self, publish: bool = True):
+        with self.lock:
+            self.generation = self.generation + 1
+            self.versions = Versions(processor_settings.CACHE_VERSIONS_SIZE)
+            self.cache.clear()
+        if publish:
+            get_invalidation_bus().publish(METADATA_CHANNEL, {"cache": self.name, "key": None})
+
+
+metadata_caches: Dict[str, MetadataCache] = {
+    name: MetadataCache(name, processor_settings.METADATA_CACHE_SIZE)
+    for name in [TOPIC_BY_NAME, TOPIC_BY_ID, PIPELINE_BY_ID, PIPELINES_BY_TOPIC_ID]
+}
+
+
+def get_metadata_cache(name: str) -> MetadataCache:
+    return metadata_caches[name]
+
+
+def __on_invalidation(message: dict):
+    cache = metadata_caches.get(message.get("cache"))
+    if cache is None:
+        return
+    if message.get("key") is None:
+        cache.clear(False)
+    else:
+        cache.invalidate(message.get("key"), False)
+
+
+get_invalidation_bus().subscribe(METADATA_CHANNEL, __on_invalidation)
@@ -0,0 +1,31 @@
+from collections import OrderedDict
+
+
+class Versions:
+    """
+    versions of keys, increased on invalidation. at most maxsize keys are kept, the least recently increased
+    key is evicted first.
+
+    keys not kept have the floor version, which is the greatest version evicted. a version of key never comes back
+    once the key is increased from it, so values cached with an old version are never hit again.
+    increase must be called under the lock of the cache, get can be called without it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.versions = OrderedDict()
+        self.floor = 0
+
+    def get(self, key) -> int:
+        return self.versions.get(key, self.floor)
+
+    def increase(self, key) -> int:
+        version = self.versions.get(key, self.floor) + 1
+        self.versions[key] = version
+        self.versions.move_to_end(key)
+        while len(self.versions) > self.maxsize:
+            evicted, evicted_version = next(iter(self.versions.items()))
+            # floor is raised before the key is removed, a concurrent get never sees an older version
+            self.floor = max(self.floor, evicted_version)
+            del self.versions[evicted]
+        return version
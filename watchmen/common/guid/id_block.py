@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import deque
+from typing import List
+
+from watchmen_boot.config.config import settings
+from watchmen_boot.guid.remoteid import next_id
+from watchmen_boot.guid.snowflake import worker, InvalidSystemClock
+
+from watchmen.config.config import processor_settings
+
+
+def current_millis() -> int:
+    return int(time.time() * 1000)
+
+
+class IdBlockAllocator:
+    """
+    snowflake sequences of this process, on worker id and datacenter id registered by watchmen_boot worker.
+    timestamp and sequence are kept here, all ids of process are allocated by this module
+    """
+
+    def __init__(self, snowflake_worker):
+        self.worker = snowflake_worker
+        self.lock = threading.Lock()
+        self.lastTimestamp = -1
+        self.sequence = -1
+
+    def allocate(self, size: int) -> List[int]:
+        """
+        reserve up to size sequences of current millisecond,
+        the ids of a block are continuous and greater than any id allocated before in this process
+        """
+        max_sequence = self.worker.MAX_SEQUENCE
+        with self.lock:
+            timestamp = current_millis()
+            if timestamp < self.lastTimestamp:
+                raise InvalidSystemClock
+            if timestamp == self.lastTimestamp:
+                start = self.sequence + 1
+                if start > max_sequence:
+                    while timestamp <= self.lastTimestamp:
+                        timestamp = current_millis()
+                    start = 0
+            else:
+                start = 0
+            end = min(start + size, max_sequence + 1)
+            self.sequence = end - 1
+            self.lastTimestamp = timestamp
+        base = ((timestamp - self.worker.TWEPOCH) << self.worker.TIMESTAMP_LEFT_SHIFT) | (
+                self.worker.datacenter_id << self.worker.DATACENTER_ID_SHIFT) | (
+                       self.worker.worker_id << self.worker.WOKER_ID_SHIFT)
+        return [base | sequence for sequence in range(start, end)]
+
+    def timestamp_of(self, id_: int) -> int:
+        return (id_ >> self.worker.TIMESTAMP_LEFT_SHIFT) + self.worker.TWEPOCH
+
+
+allocator = IdBlockAllocator(worker)
+__local = threading.local()
+
+
+def __get_buffer() -> deque:
+    buffer = getattr(__local, "buffer", None)
+    if buffer is None:
+        buffer = deque()
+        __local.buffer = buffer
+    elif len(buffer) > 0 and allocator.timestamp_of(buffer[0]) < allocator.lastTimestamp:
+        # allocator moved to a newer millisecond, ids left are less than ids allocated since by other threads
+        buffer.clear()
+    return buffer
+
+
+def get_int_surrogate_keys(count: int) -> List[int]:
+    """
+    vectorized allocation for bulk inserts, ids are ascending.
+    ids of one thread are always ascending. across threads, ids of a newer millisecond are greater,
+    ids of threads in one millisecond might interleave since each thread takes its own block.
+    """
+    if settings.SNOWFLAKE_REMOTE:
+        return [next_id() for _ in range(count)]
+    buffer = __get_buffer()
+    result = []
+    while len(buffer) > 0 and len(result) < count:
+        result.append(buffer.popleft())
+    while len(result) < count:
+        result.extend(allocator.allocate(count - len(result)))
+    return result
+
+
+def get_int_surrogate_key() -> int:
+    if settings.SNOWFLAKE_REMOTE:
+        return next_id()
+    buffer = __get_buffer()
+    if len(buffer) == 0:
+        buffer.extend(allocator.allocate(processor_settings.SURROGATE_KEY_BLOCK_SIZE))
+    return buffer.popleft()
+
+
+def get_surrogate_keys(count: int) -> List[str]:
+    return [str(id_) for id_ in get_int_surrogate_keys(count)]
+
+
+def get_surrogate_key() -> str:
+    return str(get_int_surrogate_key())
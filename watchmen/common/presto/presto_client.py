@@ -1,31 +1,170 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 from watchmen_boot.config.config import settings
 
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import PRESTO_POOL_WAIT_SECONDS, PRESTO_POOL_IN_USE, PRESTO_POOL_OPEN
+
+log = logging.getLogger("app." + __name__)
+
 PRESTODB = "prestodb"
 TRINO = "trino"
 
-if settings.PRESTO_ON and settings.PRESTO_LIB == TRINO:
-    import trino
-
-    conn = trino.dbapi.connect(
-        host=settings.PRESTO_HOST,
-        port=settings.PRESTO_PORT,
-        user=settings.PRESTO_USER,
-        # catalog=settings.PRESTO_CATALOG,
-        # schema=settings.PRESTO_SCHEMA,
-    )
-elif settings.PRESTO_ON and settings.PRESTO_LIB == PRESTODB:
-    import prestodb
-
-    conn = prestodb.dbapi.connect(
-        host=settings.PRESTO_HOST,
-        port=settings.PRESTO_PORT,
-        user=settings.PRESTO_USER,
-        # catalog=settings.PRESTO_CATALOG,
-        # schema=settings.PRESTO_SCHEMA,
-    )
-else:
-    conn = {}
-
-
-def get_connection():
-    return conn
+
+def create_connection():
+    if settings.PRESTO_ON and settings.PRESTO_LIB == TRINO:
+        import trino
+
+        return trino.dbapi.connect(
+            host=settings.PRESTO_HOST,
+            port=settings.PRESTO_PORT,
+            user=settings.PRESTO_USER,
+            # catalog=settings.PRESTO_CATALOG,
+            # schema=settings.PRESTO_SCHEMA,
+        )
+    elif settings.PRESTO_ON and settings.PRESTO_LIB == PRESTODB:
+        import prestodb
+
+        return prestodb.dbapi.connect(
+            host=settings.PRESTO_HOST,
+            port=settings.PRESTO_PORT,
+            user=settings.PRESTO_USER,
+            # catalog=settings.PRESTO_CATALOG,
+            # schema=settings.PRESTO_SCHEMA,
+        )
+    else:
+        return {}
+
+
+class PrestoConnectionPoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.createdAt = time.time()
+        self.lastUsed = self.createdAt
+
+
+class PrestoConnectionPool:
+    """
+    connections are created when needed up to size, a connection is used by one thread at a time.
+
+    an idle connection is checked before reuse, connections older than max age are recycled,
+    and a connection is discarded when an error is raised in use.
+    """
+
+    def __init__(self, size: int, timeout: float, max_age: float, check_idle: float, create=create_connection):
+        self.size = size
+        self.timeout = timeout
+        self.maxAge = max_age
+        self.checkIdle = check_idle
+        self.create = create
+        self.semaphore = threading.BoundedSemaphore(size)
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.open = 0
+        self.inUse = 0
+
+    @contextmanager
+    def connection(self):
+        start = time.time()
+        if not self.semaphore.acquire(timeout=self.timeout):
+            raise PrestoConnectionPoolTimeout("no presto connection is available in {0} seconds".format(self.timeout))
+        PRESTO_POOL_WAIT_SECONDS.observe(time.time() - start)
+        try:
+            pooled = self.__take()
+        except Exception:
+            self.semaphore.release()
+            raise
+        self.__count_in_use(1)
+        try:
+            yield pooled.conn
+        except Exception:
+            self.__discard(pooled)
+            pooled = None
+            raise
+        finally:
+            self.__count_in_use(-1)
+            if pooled is not None:
+                pooled.lastUsed = time.time()
+                with self.lock:
+                    self.idle.append(pooled)
+            self.semaphore.release()
+
+    def __take(self) -> PooledConnection:
+        while True:
+            with self.lock:
+                pooled = self.idle.pop() if self.idle else None
+            if pooled is None:
+                return self.__create()
+            now = time.time()
+            if now - pooled.createdAt > self.maxAge:
+                self.__discard(pooled)
+            elif now - pooled.lastUsed > self.checkIdle and not self.__is_healthy(pooled):
+                self.__discard(pooled)
+            else:
+                return pooled
+
+    def __create(self) -> PooledConnection:
+        pooled = PooledConnection(self.create())
+        with self.lock:
+            self.open = self.open + 1
+            PRESTO_POOL_OPEN.set(self.open)
+        return pooled
+
+    @staticmethod
+    def __is_healthy(pooled: PooledConnection) -> bool:
+        try:
+            cur = pooled.conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            return True
+        except Exception:
+            log.warning("presto connection is broken, it is discarded")
+            return False
+
+    def __discard(self, pooled: PooledConnection):
+        with self.lock:
+            self.open = self.open - 1
+            PRESTO_POOL_OPEN.set(self.open)
+        close = getattr(pooled.conn, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                log.warning("close presto connection failed")
+
+    def __count_in_use(self, delta: int):
+        with self.lock:
+            self.inUse = self.inUse + delta
+            PRESTO_POOL_IN_USE.set(self.inUse)
+
+    def close(self):
+        with self.lock:
+            idle = list(self.idle)
+            self.idle.clear()
+        for pooled in idle:
+            self.__discard(pooled)
+
+
+connection_pool = PrestoConnectionPool(processor_settings.PRESTO_POOL_SIZE,
+                                       processor_settings.PRESTO_POOL_TIMEOUT,
+                                       processor_settings.PRESTO_POOL_MAX_AGE,
+                                       processor_settings.PRESTO_POOL_CHECK_IDLE)
+
+
+def get_connection_pool() -> PrestoConnectionPool:
+    return connection_pool
+
+
+def presto_connection():
+    """
+    with presto_connection() as conn: the connection is returned to pool when block exits
+    """
+    return connection_pool.connection()
@@ -2,7 +2,7 @@ from typing import List
 
 from watchmen.common.security.pat.pat_model import PersonAccessToken
 from watchmen.common.security.pat.token_utils import create_token
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.database.find_storage_template import find_storage_template
 
 storage_template = find_storage_template()
@@ -179,3 +179,15 @@ def clean_password(user_list):
         user.password = None
 
     return user_list
+
+
+def compute_average(avg_state):
+    """
+    avg state is {"_sum": sum, "_count": count}, keep the scalar as is for the value written before avg state
+    """
+    if isinstance(avg_state, dict):
+        count = avg_state.get("_count", 0)
+        if count is None or count <= 0:
+            return None
+        return avg_state.get("_sum", 0) / count
+    return avg_state
@@ -0,0 +1,60 @@
+import decimal
+import json
+from datetime import datetime, date, time
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from watchmen.config.config import processor_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def __default(o):
+    """
+    decimal is serialized as float and datetime as iso format, as DateTimeEncoder does
+    """
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, BaseModel):
+        return o.dict()
+    if isinstance(o, (set, tuple)):
+        return list(o)
+    raise TypeError("Type is not JSON serializable: {0}".format(type(o).__name__))
+
+
+def fast_json_enabled() -> bool:
+    return orjson is not None and processor_settings.FAST_JSON_ON
+
+
+def json_loads(data):
+    """
+    accepts str and bytes
+    """
+    if fast_json_enabled():
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj) -> bytes:
+    if fast_json_enabled():
+        # datetime is passed to default, keeps iso format of python instead of rfc 3339 of orjson
+        return orjson.dumps(obj, default=__default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+                                   | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=__default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    return it directly from heavy endpoints, content is serialized without jsonable_encoder of fastapi
+    """
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
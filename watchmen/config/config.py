@@ -0,0 +1,111 @@
+from typing import List
+
+from pydantic import BaseSettings
+
+# aggregate combiner durability.
+# pipeline: deltas are written before the pipeline run ends, but only deltas of one event are combined.
+# window: deltas of all events are combined, but written up to one window after the runs end,
+# and deltas in memory are lost when the process is killed
+COMBINER_DURABILITY_PIPELINE = "pipeline"  # flush when the pipeline run ends
+COMBINER_DURABILITY_WINDOW = "window"  # flush by time window or event count, shared by all pipeline runs
+
+# aggregate combiner trigger semantics
+COMBINER_TRIGGER_FLUSH = "flush"  # trigger downstream pipelines once per flushed row
+COMBINER_TRIGGER_NONE = "none"  # do not trigger downstream pipelines for combined rows
+
+# invalidation bus of in memory caches
+INVALIDATION_BUS_IN_PROCESS = "in-process"  # single worker, or tests
+INVALIDATION_BUS_LOCAL_FILE = "local-file"  # workers on the same host share an append only file
+
+
+class ProcessorSettings(BaseSettings):
+    """
+    switches and tuning of the data processor, loaded from the same env file as watchmen_boot settings
+    """
+    AGGREGATE_COMBINER_ON: bool = False
+    AGGREGATE_COMBINER_DURABILITY: str = COMBINER_DURABILITY_WINDOW
+    AGGREGATE_COMBINER_TRIGGER: str = COMBINER_TRIGGER_FLUSH
+    AGGREGATE_COMBINER_WINDOW: float = 1.0  # seconds
+    AGGREGATE_COMBINER_MAX_EVENTS: int = 1000
+    SURROGATE_KEY_BLOCK_SIZE: int = 64  # snowflake ids reserved per thread at a time
+    FAST_JSON_ON: bool = True  # use orjson when it is installed
+    METADATA_CACHE_SIZE: int = 1000
+    METADATA_CACHE_WARM_UP: bool = True
+    CACHE_VERSIONS_SIZE: int = 100000  # versions of invalidated keys kept per cache, others share one
+    INVALIDATION_BUS: str = INVALIDATION_BUS_IN_PROCESS
+    INVALIDATION_BUS_FILE: str = "./watchmen_invalidation.log"
+    INVALIDATION_BUS_POLL_INTERVAL: float = 0.5  # seconds
+    ROW_CACHE_TOPICS: List[str] = []  # names of topics read through row cache, eg. small dimension topics
+    ROW_CACHE_SIZE: int = 10000  # rows per topic
+    ROW_CACHE_TTL: float = 300  # seconds
+    NEGATIVE_CACHE_ON: bool = False  # for batch and replay workers which are the only writer of target topics
+    NEGATIVE_CACHE_PRESCAN: bool = True  # load keys of target topic into bloom filter on first lookup
+    NEGATIVE_CACHE_PRESCAN_FETCH_SIZE: int = 10000  # key rows fetched at once in pre-scan
+    NEGATIVE_CACHE_CAPACITY: int = 1000000  # expected keys per bloom filter
+    NEGATIVE_CACHE_ERROR_RATE: float = 0.01
+    NEGATIVE_CACHE_MISS_SIZE: int = 10000  # missed keys kept per topic and key columns
+    NEGATIVE_CACHE_TEXT_KEYS: bool = False  # text key columns compare case and spaces, eg. binary collation
+    EVENT_USER_CACHE_SIZE: int = 1000
+    EVENT_USER_CACHE_TTL: float = 300  # seconds
+    CONNECTOR_RETRY_BACKOFF: float = 1.0  # seconds, doubled on each retry
+    CONNECTOR_MAX_BACKOFF: float = 60  # seconds
+    CONNECTOR_MAX_RETRIES: int = 3  # events failed more times are skipped and logged
+    KAFKA_GROUP_ID: str = "watchmen"
+    KAFKA_MAX_RECORDS: int = 500  # records per getmany
+    KAFKA_POLL_TIMEOUT: int = 1000  # milliseconds
+    RABBITMQ_PREFETCH: int = 100  # unacked messages delivered to consumer
+    RABBITMQ_CONCURRENCY: int = 8  # handler tasks
+    RABBITMQ_ACK_BATCH: int = 50  # messages acked at once
+    RABBITMQ_ACK_INTERVAL: float = 0.5  # seconds, acks are flushed at least in the interval
+    RABBITMQ_SAVED_MESSAGE_CACHE_SIZE: int = 100000  # ids of messages saved, not saved again when redelivered
+    PIPELINE_BATCH_CHUNK_SIZE: int = 1000  # rows saved by one bulk insert in batch ingestion
+    PIPELINE_EXECUTOR_WORKERS: int = 16  # threads running pipelines
+    PIPELINE_TENANT_CONCURRENCY: int = 8  # pipeline runs of one tenant at the same time
+    PIPELINE_EXECUTOR_MAX_PENDING: int = 10000  # runs scheduled and not finished, new runs are rejected beyond
+    PIPELINE_JOURNAL_ON: bool = False  # async pipeline data is journaled on local disk before acknowledging
+    PIPELINE_JOURNAL_DIR: str = "./journal"  # worker processes open journals in sub directories
+    PIPELINE_JOURNAL_SEGMENT_SIZE: int = 64 * 1024 * 1024  # bytes
+    PIPELINE_JOURNAL_SYNC: bool = True  # msync each appended event
+    PIPELINE_JOURNAL_DRAIN_BATCH: int = 500  # events drained at once
+    PIPELINE_JOURNAL_DRAIN_INTERVAL: float = 0.2  # seconds to wait when journal is empty
+    QUERY_CACHE_ON: bool = False  # cache results of chart and dataset queries, removed when topics are written
+    QUERY_CACHE_SIZE: int = 1000  # results
+    QUERY_CACHE_TTL: float = 60  # seconds
+    QUERY_CACHE_STALE_TTL: float = 300  # seconds a result is served after ttl while it is reloaded in background
+    QUERY_CACHE_REFRESH_WORKERS: int = 2
+    QUERY_CACHE_PUBLISH_INTERVAL: float = 1.0  # seconds, writes of one topic are published at most once in it
+    DASHBOARD_CHART_CONCURRENCY: int = 8  # chart queries of dashboards run at the same time
+    PRESTO_POOL_SIZE: int = 16  # connections, created when needed
+    PRESTO_POOL_TIMEOUT: float = 30  # seconds to wait for a connection
+    PRESTO_POOL_MAX_AGE: float = 3600  # seconds, older connections are recycled
+    PRESTO_POOL_CHECK_IDLE: float = 60  # seconds, connections idle longer are checked before reuse
+    DATASET_PAGING_CACHE_SIZE: int = 1000  # subjects and filters of dataset page boundaries and counts
+    DATASET_BOUNDARY_CACHE_TTL: float = 600  # seconds
+    DATASET_COUNT_CACHE_TTL: float = 60  # seconds
+    COMPILED_SQL_CACHE_SIZE: int = 5000  # compiled chart and dataset queries
+    EXPORT_FETCH_SIZE: int = 10000  # rows fetched and written at once in dataset export
+    EXPORT_MAX_ROWS: int = 1000000  # rows of one dataset export
+    COLUMNAR_FETCH_SIZE: int = 10000  # rows fetched at once for columnar results
+    MATERIALIZATION_ON: bool = False  # charts query materialized subject datasets when they are fresh
+    MATERIALIZATION_CATALOG: str = "mysql"  # presto catalog which materialized tables are created in
+    MATERIALIZATION_SCHEMA: str = "watchmen"
+    MATERIALIZATION_MAX_STALENESS: float = 300  # seconds since last refresh a materialization is queried
+    MATERIALIZATION_REFRESH_INTERVAL: float = 0  # seconds between background refreshes, 0 is off, set on one worker
+    MATERIALIZATION_REBUILD_INTERVAL: float = 86400  # seconds, rebuilt at least once in it to remove deleted rows
+    MATERIALIZATION_WATERMARK_LAG: float = 5  # seconds, rows inserted later than now minus lag wait for next refresh
+    MATERIALIZATION_LOOKUP_TTL: float = 10  # seconds a materialization is cached by report engine
+    QUERY_MONITOR_BATCH_SIZE: int = 100  # monitors saved by one bulk insert
+    QUERY_MONITOR_FLUSH_INTERVAL: float = 5  # seconds, queued monitors are saved at least in the interval
+    QUERY_MONITOR_MAX_PENDING: int = 10000  # monitors queued and not saved, new monitors are dropped beyond
+    QUERY_MONITOR_SCAN_FETCH_SIZE: int = 1000  # monitors fetched at once when finding slowest query sources
+    QUERY_MONITOR_SCAN_LIMIT: int = 100000  # monitors read at most when finding slowest query sources
+    QUERY_SLOW_THRESHOLD: float = 10  # seconds, slower queries are logged
+    REPORT_FILTER_PUSHDOWN_ON: bool = False  # report filters on one topic are applied before joins
+
+    class Config:
+        env_file = '.env'
+        env_file_encoding = 'utf-8'
+        case_sensitive = True
+
+
+processor_settings = ProcessorSettings()
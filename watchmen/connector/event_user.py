@@ -0,0 +1,37 @@
+import logging
+
+from cacheout import Cache
+from model.model.common.user import User
+from watchmen_boot.config.config import settings
+
+from watchmen.auth.storage.user import load_user_by_name
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+
+log = logging.getLogger("app." + __name__)
+
+EVENT_USER = "event_user"
+
+user_cache = Cache(maxsize=processor_settings.EVENT_USER_CACHE_SIZE, ttl=processor_settings.EVENT_USER_CACHE_TTL)
+
+
+def find_event_user(topic_event) -> User:
+    """
+    user of event consumed from broker, mock user when event has no user.
+    users are cached with ttl, changes of user are seen after ttl
+    """
+    if topic_event.user is None:
+        log.warning("user is mock user , pls check user in topic_event")
+        user_name = settings.MOCK_USER
+    else:
+        user_name = topic_event.user
+    user = user_cache.get(user_name)
+    if user is not None:
+        CACHE_HIT.labels(EVENT_USER).inc()
+        return user
+    CACHE_MISS.labels(EVENT_USER).inc()
+    user = load_user_by_name(user_name)
+    if user is None:
+        raise Exception("user {0} of topic event does not exist".format(user_name))
+    user_cache.set(user_name, user)
+    return user
@@ -0,0 +1,88 @@
+import asyncio
+import zlib
+from collections import namedtuple
+from typing import Dict, List
+
+TopicPartition = namedtuple("TopicPartition", ["topic", "partition"])
+ConsumerRecord = namedtuple("ConsumerRecord", ["topic", "partition", "offset", "key", "value", "timestamp"])
+
+
+class FakeKafkaBroker:
+    """
+    in process broker keeps records in memory, for testing consumers without kafka.
+    records with same key are always in same partition, as kafka default partitioner does
+    """
+
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self.logs: Dict[TopicPartition, List[ConsumerRecord]] = {}
+        self.commits: Dict[tuple, int] = {}
+        self.counter = 0
+
+    def produce(self, topic: str, value: bytes, key: bytes = None) -> ConsumerRecord:
+        if key is None:
+            partition = self.counter % self.partitions
+            self.counter = self.counter + 1
+        else:
+            partition = zlib.crc32(key) % self.partitions
+        tp = TopicPartition(topic, partition)
+        log = self.logs.setdefault(tp, [])
+        record = ConsumerRecord(topic, partition, len(log), key, value, 0)
+        log.append(record)
+        return record
+
+    def create_consumer(self, *topics, group_id: str = None):
+        return FakeKafkaConsumer(self, list(topics), group_id)
+
+
+class FakeKafkaConsumer:
+    """
+    the subset of AIOKafkaConsumer used by connector, all partitions of topics are assigned to one consumer
+    """
+
+    def __init__(self, broker: FakeKafkaBroker, topics: List[str], group_id: str = None):
+        self.broker = broker
+        self.topics = topics
+        self.groupId = group_id
+        self.positions: Dict[TopicPartition, int] = {}
+
+    async def start(self):
+        for tp in self.assignment():
+            self.positions[tp] = self.broker.commits.get((self.groupId, tp), 0)
+
+    async def stop(self):
+        pass
+
+    def assignment(self):
+        return {TopicPartition(topic, partition) for topic in self.topics for partition in range(self.broker.partitions)}
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int = None) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        batches = {}
+        remains = max_records
+        for tp in sorted(self.assignment()):
+            position = self.positions.get(tp, 0)
+            records = self.broker.logs.get(tp, [])[position:]
+            if remains is not None:
+                records = records[:remains]
+                remains = remains - len(records)
+            if records:
+                batches[tp] = records
+                self.positions[tp] = records[-1].offset + 1
+        if not batches and timeout_ms:
+            await asyncio.sleep(timeout_ms / 1000)
+        return batches
+
+    async def commit(self, offsets: Dict[TopicPartition, int] = None):
+        if offsets is None:
+            offsets = dict(self.positions)
+        for tp, offset in offsets.items():
+            self.broker.commits[(self.groupId, tp)] = offset
+
+    async def committed(self, tp: TopicPartition):
+        return self.broker.commits.get((self.groupId, tp))
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self.positions[tp] = offset
+
+    def highwater(self, tp: TopicPartition):
+        return len(self.broker.logs.get(tp, []))
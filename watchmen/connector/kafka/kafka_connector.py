@@ -1,34 +1,194 @@
 import asyncio
-import json
 import logging
+import time
 import traceback
+from typing import Dict, List, Optional
 
 from watchmen.collection.model.topic_event import TopicEvent
+from watchmen.config.config import processor_settings
+from watchmen.common.utils.fast_json import json_loads
+from watchmen.connector.event_user import find_event_user
+from watchmen.monitor.prometheus.metrics import CONNECTOR_EVENTS, CONNECTOR_BATCH_SECONDS, KAFKA_CONSUMER_LAG
+from watchmen.raw_data.service.import_raw_data import save_raw_topic_data_batch, run_raw_topic_pipeline
 from watchmen_boot.config.config import settings
-from watchmen.raw_data.service.import_raw_data import import_raw_topic_data
 
 log = logging.getLogger("app." + __name__)
-loop = asyncio.get_event_loop()
+
+KAFKA = "kafka"
+SAVE = "save"
+PIPELINE = "run pipelines of"
 
 kafka_topics = settings.KAFKA_TOPICS
 kafka_topics_list = kafka_topics.split(",")
 
 
+def __parse_record(record):
+    try:
+        return TopicEvent.parse_obj(json_loads(record.value))
+    except Exception:
+        # never blocks the partition by a malformed record
+        log.error("skip malformed record {0} of partition {1}-{2}: {3}".format(
+            record.offset, record.topic, record.partition, traceback.format_exc()))
+        CONNECTOR_EVENTS.labels(KAFKA, record.topic, "malformed").inc()
+        return None
+
+
+def split_runs(records) -> List[tuple]:
+    """
+    split records of partition into runs of consecutive events with same topic code and user.
+    runs are imported one by one, so the order of events in partition is kept.
+    returns (topic code, user name, events, offsets of events, last record) of each run
+    """
+    runs = []
+    for record in records:
+        topic_event = __parse_record(record)
+        if topic_event is None:
+            if runs:
+                runs[-1] = (*runs[-1][:4], record)
+            else:
+                runs.append((None, None, [], [], record))
+            continue
+        if runs and runs[-1][0] == topic_event.code and runs[-1][1] == topic_event.user:
+            runs[-1][2].append(topic_event)
+            runs[-1][3].append(record.offset)
+            runs[-1] = (*runs[-1][:4], record)
+        else:
+            runs.append((topic_event.code, topic_event.user, [topic_event], [record.offset], record))
+    return runs
+
+
+class KafkaBatchConsumer:
+    """
+    consume records by getmany, partitions in one batch are imported concurrently and records of one partition in order,
+    so events with same key are imported in order.
+    raw events of a run are saved by one bulk insert, then pipelines are run event by event.
+    offsets are committed up to the events which pipelines are run, failed records are consumed again after backoff.
+    raw events saved are not saved again when they are consumed again in this process.
+    """
+
+    def __init__(self, consumer, save_batch=save_raw_topic_data_batch, run_pipeline=run_raw_topic_pipeline,
+                 find_user=find_event_user, saved_offsets: Dict[tuple, int] = None):
+        self.consumer = consumer
+        self.saveBatch = save_batch
+        self.runPipeline = run_pipeline
+        self.findUser = find_user
+        self.running = True
+        self.failures: Dict[tuple, int] = {}
+        # offset of last raw event saved by partition, shared by consumers of reconnections
+        self.savedOffsets: Dict[tuple, int] = {} if saved_offsets is None else saved_offsets
+
+    async def run(self):
+        while self.running:
+            await self.run_once()
+
+    def stop(self):
+        self.running = False
+
+    async def run_once(self) -> int:
+        """
+        consume one batch, returns the number of records consumed
+        """
+        batches = await self.consumer.getmany(timeout_ms=processor_settings.KAFKA_POLL_TIMEOUT,
+                                              max_records=processor_settings.KAFKA_MAX_RECORDS)
+        if not batches:
+            return 0
+        start = time.time()
+        partitions = list(batches.items())
+        results = await asyncio.gather(*[self.import_partition(tp, records) for tp, records in partitions])
+        offsets = {}
+        failed = False
+        for (tp, records), (next_offset, error) in zip(partitions, results):
+            if next_offset > records[0].offset:
+                offsets[tp] = next_offset
+            if error is not None:
+                failed = True
+                self.consumer.seek(tp, next_offset)
+            self.__record_lag(tp, next_offset)
+        if offsets:
+            await self.consumer.commit(offsets)
+        CONNECTOR_BATCH_SECONDS.labels(KAFKA).observe(time.time() - start)
+        if failed:
+            retries = max(self.failures.values()) if self.failures else 1
+            await asyncio.sleep(processor_settings.CONNECTOR_RETRY_BACKOFF * (2 ** (retries - 1)))
+        return sum(len(records) for records in batches.values())
+
+    async def import_partition(self, tp, records) -> tuple:
+        """
+        returns the offset to consume next, and the error when some event is failed
+        """
+        next_offset = records[0].offset
+        for code, user_name, events, offsets, last_record in split_runs(records):
+            if events:
+                failure = await self.import_run(tp, code, events, offsets)
+                if failure is not None:
+                    return failure
+            next_offset = last_record.offset + 1
+        return next_offset, None
+
+    async def import_run(self, tp, code, events, offsets) -> Optional[tuple]:
+        """
+        returns the offset to consume next and the error when some event is failed, otherwise none
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            user = await loop.run_in_executor(None, self.findUser, events[0])
+            saved_offset = self.savedOffsets.get(tp, -1)
+            unsaved = [event for event, offset in zip(events, offsets) if offset > saved_offset]
+            if unsaved:
+                await loop.run_in_executor(None, self.saveBatch, code, unsaved, user)
+                self.savedOffsets[tp] = offsets[-1]
+            self.failures.pop((tp, offsets[0], SAVE), None)
+        except Exception as e:
+            if self.__give_up(tp, offsets[0], SAVE, code, len(events)):
+                return None
+            return offsets[0], e
+        for event, offset in zip(events, offsets):
+            try:
+                await self.runPipeline(event, user)
+                CONNECTOR_EVENTS.labels(KAFKA, tp.topic, "imported").inc()
+                self.failures.pop((tp, offset, PIPELINE), None)
+            except Exception as e:
+                if not self.__give_up(tp, offset, PIPELINE, code, 1):
+                    return offset, e
+        return None
+
+    def __give_up(self, tp, offset, step, code, count) -> bool:
+        retries = self.failures.get((tp, offset, step), 0) + 1
+        log.error("{0} {1} events of topic {2} from {3}-{4} at offset {5} failed {6} times: {7}".format(
+            step, count, code, tp.topic, tp.partition, offset, retries, traceback.format_exc()))
+        if retries > processor_settings.CONNECTOR_MAX_RETRIES:
+            self.failures.pop((tp, offset, step), None)
+            CONNECTOR_EVENTS.labels(KAFKA, tp.topic, "skipped").inc(count)
+            return True
+        self.failures[(tp, offset, step)] = retries
+        CONNECTOR_EVENTS.labels(KAFKA, tp.topic, "failed").inc(count)
+        return False
+
+    def __record_lag(self, tp, next_offset):
+        highwater = self.consumer.highwater(tp)
+        if highwater is not None:
+            KAFKA_CONSUMER_LAG.labels(tp.topic, str(tp.partition)).set(max(0, highwater - next_offset))
+
+
 async def consume():
     from aiokafka import AIOKafkaConsumer
-    consumer = AIOKafkaConsumer(
-        kafka_topics_list,
-        loop=loop, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVER,
-        value_deserializer=lambda m: json.loads(m.decode('utf-8')))
-
-    await consumer.start()
-    try:
-        async for msg in consumer:
-            topic_event = TopicEvent.parse_obj(msg.value)
-            await import_raw_topic_data(topic_event)
-    except:
-        log.error(traceback.format_exc())
-        await consume()
-    finally:
-        # Will leave consumer group; perform autocommit if enabled.
-        await consumer.stop()
+    saved_offsets = {}
+    while True:
+        consumer = AIOKafkaConsumer(
+            *kafka_topics_list,
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVER,
+            group_id=processor_settings.KAFKA_GROUP_ID,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest")
+        try:
+            await consumer.start()
+            await KafkaBatchConsumer(consumer, saved_offsets=saved_offsets).run()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.error(traceback.format_exc())
+            await asyncio.sleep(processor_settings.CONNECTOR_RETRY_BACKOFF)
+        finally:
+            # uncommitted records are consumed again by next consumer of group
+            await consumer.stop()
@@ -0,0 +1,71 @@
+import asyncio
+import json
+from typing import List
+
+
+class LocalMessage:
+    """
+    the subset of aio_pika IncomingMessage used by consumer
+    """
+
+    def __init__(self, queue, body: bytes, delivery_tag: int, message_id: str = None):
+        self.queue = queue
+        self.body = body
+        self.delivery_tag = delivery_tag
+        self.message_id = message_id
+
+    async def ack(self, multiple: bool = False):
+        self.queue.settle(self.delivery_tag, multiple, True)
+
+    async def reject(self, requeue: bool = False):
+        self.queue.settle(self.delivery_tag, False, False)
+
+
+class LocalQueue:
+    """
+    in process stand-in of rabbitmq queue, for testing and benchmarking consumer without broker, eg.
+
+        queue = LocalQueue()
+        queue.publish_events(events)
+        queue.close()
+        await RabbitConsumer(save_event=..., run_pipeline=...).run(queue.iterator())
+
+    acked and rejected delivery tags are kept for checking.
+    """
+
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.deliveryTag = 0
+        self.unacked: List[int] = []
+        self.acked: List[int] = []
+        self.rejected: List[int] = []
+
+    def publish(self, body: bytes, message_id: str = None):
+        self.deliveryTag = self.deliveryTag + 1
+        self.messages.put_nowait(LocalMessage(self, body, self.deliveryTag, message_id))
+
+    def publish_events(self, events: List[dict]):
+        for event in events:
+            self.publish(json.dumps(event).encode("utf-8"))
+
+    def close(self):
+        self.messages.put_nowait(None)
+
+    async def iterator(self):
+        while True:
+            message = await self.messages.get()
+            if message is None:
+                return
+            self.unacked.append(message.delivery_tag)
+            yield message
+
+    def settle(self, delivery_tag: int, multiple: bool, acked: bool):
+        if multiple:
+            tags = [tag for tag in self.unacked if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag]
+        self.unacked = [tag for tag in self.unacked if tag not in tags]
+        if acked:
+            self.acked.extend(tags)
+        else:
+            self.rejected.extend(tags)
@@ -1,55 +1,208 @@
-import json
+import asyncio
 import logging
 import traceback
+from collections import deque
 
 from aio_pika import ExchangeType
+from cacheout import LRUCache
 
-from watchmen.auth.storage.user import load_user_by_name
 from watchmen.collection.model.topic_event import TopicEvent
+from watchmen.common.utils.fast_json import json_loads
+from watchmen.config.config import processor_settings
+from watchmen.connector.event_user import find_event_user
+from watchmen.monitor.prometheus.metrics import CONNECTOR_EVENTS
+from watchmen.raw_data.service.import_raw_data import save_raw_topic_data_batch, run_raw_topic_pipeline
 from watchmen_boot.config.config import settings
-from watchmen.raw_data.service.import_raw_data import import_raw_topic_data
 
 log = logging.getLogger("app." + __name__)
 
+RABBITMQ = "rabbitmq"
 
-async def consume(loop):
-    import aio_pika
-    connection = await aio_pika.connect(
-        host=settings.RABBITMQ_HOST, port=settings.RABBITMQ_PORT, loop=loop, virtualhost=settings.RABBITMQ_VIRTUALHOST,
-        login=settings.RABBITMQ_USERNAME
-        , password=settings.RABBITMQ_PASSWORD
-    )
+# ids of messages which raw events are saved, messages delivered again are not saved twice
+saved_messages = LRUCache(maxsize=processor_settings.RABBITMQ_SAVED_MESSAGE_CACHE_SIZE, ttl=0)
+
+
+def save_topic_event(topic_event, user):
+    save_raw_topic_data_batch(topic_event.code, [topic_event], user)
+
+
+class AckBatcher:
+    """
+    messages are handled concurrently and finished out of order, acks are sent with multiple flag
+    up to the last message which all messages delivered before are finished
+    """
+
+    def __init__(self):
+        self.delivered = deque()
+        self.finished = {}
+        self.lock = asyncio.Lock()
 
-    async with connection:
-        queue_name = settings.RABBITMQ_QUEUE
+    def deliver(self, message):
+        self.delivered.append(message)
 
-        channel = await connection.channel()
+    def finish(self, message, rejected: bool = False):
+        self.finished[message.delivery_tag] = rejected
 
-        queue = await channel.declare_queue(
-            queue_name,
-            durable=settings.RABBITMQ_DURABLE,
-            auto_delete=settings.RABBITMQ_AUTO_DELETE
+    def pending(self) -> int:
+        return len(self.finished)
 
-        )
-        exchange = await channel.declare_exchange(name=queue_name, type=ExchangeType.DIRECT, auto_delete=True)
+    async def flush(self):
+        async with self.lock:
+            last_to_ack = None
+            while self.delivered and self.delivered[0].delivery_tag in self.finished:
+                message = self.delivered.popleft()
+                if not self.finished.pop(message.delivery_tag):
+                    last_to_ack = message
+            if last_to_ack is not None:
+                # rejected messages are settled already, they are not acked again
+                await last_to_ack.ack(multiple=True)
 
-        await queue.bind(exchange, queue_name)
-        # Creating channel
 
-        async with queue.iterator() as queue_iter:
+class RabbitConsumer:
+    """
+    messages are handled by concurrent tasks, the number of messages in process is limited by prefetch of channel.
+    events are not imported in order of delivery.
+    raw event is saved once, and pipelines are retried alone when they fail.
+    """
+
+    def __init__(self, save_event=save_topic_event, run_pipeline=run_raw_topic_pipeline, find_user=find_event_user,
+                 concurrency: int = None, ack_batch: int = None, saved: LRUCache = None):
+        self.saveEvent = save_event
+        self.runPipeline = run_pipeline
+        self.findUser = find_user
+        self.saved = saved_messages if saved is None else saved
+        self.concurrency = concurrency or processor_settings.RABBITMQ_CONCURRENCY
+        self.ackBatch = ack_batch or processor_settings.RABBITMQ_ACK_BATCH
+        self.messages = asyncio.Queue(maxsize=self.concurrency * 2)
+        self.acks = AckBatcher()
+
+    async def run(self, message_iterator):
+        """
+        consume until iterator is exhausted or broken, acks of finished messages are flushed before return
+        """
+        handlers = [asyncio.ensure_future(self.handle()) for _ in range(self.concurrency)]
+        flusher = asyncio.ensure_future(self.flush_periodically())
+        try:
+            async for message in message_iterator:
+                self.acks.deliver(message)
+                await self.messages.put(message)
+            await self.messages.join()
+        finally:
+            for task in [*handlers, flusher]:
+                task.cancel()
+            try:
+                await self.acks.flush()
+            except Exception:
+                # channel is closed, unacked messages are delivered again
+                log.error(traceback.format_exc())
+
+    async def handle(self):
+        while True:
+            message = await self.messages.get()
+            try:
+                if await self.process(message):
+                    self.acks.finish(message)
+                else:
+                    try:
+                        await message.reject(requeue=False)
+                    finally:
+                        # acks of messages delivered after it wait until it is finished, even reject failed
+                        self.acks.finish(message, True)
+                if self.acks.pending() >= self.ackBatch:
+                    await self.acks.flush()
+            except Exception:
+                log.error(traceback.format_exc())
+            finally:
+                self.messages.task_done()
 
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(processor_settings.RABBITMQ_ACK_INTERVAL)
             try:
-                async for message in queue_iter:
-                    async with message.process():
-                        payload = json.loads(message.body)
-                        topic_event = TopicEvent.parse_obj(payload)
-                        if topic_event.user is None:
-                            user = load_user_by_name(settings.MOCK_USER)
-                            log.warning("user is mock user , pls check user in topic_event")
-                        else:
-                            user = load_user_by_name(topic_event.user)
-
-                        await import_raw_topic_data(topic_event, user)
-            except:
+                await self.acks.flush()
+            except Exception:
                 log.error(traceback.format_exc())
-                consume(loop)
+
+    async def process(self, message) -> bool:
+        """
+        returns false when message is malformed or failed more than max retries
+        """
+        try:
+            topic_event = TopicEvent.parse_obj(json_loads(message.body))
+        except Exception:
+            log.error("reject malformed message: {0}".format(traceback.format_exc()))
+            CONNECTOR_EVENTS.labels(RABBITMQ, settings.RABBITMQ_QUEUE, "malformed").inc()
+            return False
+        loop = asyncio.get_event_loop()
+        message_id = message.message_id
+        try:
+            user = await self.retry(topic_event, "find user", loop.run_in_executor, None, self.findUser, topic_event)
+            if message_id is None or self.saved.get(message_id) is None:
+                await self.retry(topic_event, "save", loop.run_in_executor, None, self.saveEvent, topic_event, user)
+                if message_id is not None:
+                    self.saved.set(message_id, True)
+            await self.retry(topic_event, "run pipelines of", self.runPipeline, topic_event, user)
+        except RetriesExhaustedError:
+            CONNECTOR_EVENTS.labels(RABBITMQ, topic_event.code, "skipped").inc()
+            return False
+        CONNECTOR_EVENTS.labels(RABBITMQ, topic_event.code, "imported").inc()
+        return True
+
+    @staticmethod
+    async def retry(topic_event, step: str, func, *args):
+        """
+        await func until succeeded, raise RetriesExhaustedError when failed more than max retries
+        """
+        retries = 0
+        while True:
+            try:
+                return await func(*args)
+            except Exception:
+                retries = retries + 1
+                log.error("{0} event of topic {1} failed {2} times: {3}".format(
+                    step, topic_event.code, retries, traceback.format_exc()))
+                if retries > processor_settings.CONNECTOR_MAX_RETRIES:
+                    raise RetriesExhaustedError()
+                CONNECTOR_EVENTS.labels(RABBITMQ, topic_event.code, "failed").inc()
+                await asyncio.sleep(processor_settings.CONNECTOR_RETRY_BACKOFF * (2 ** (retries - 1)))
+
+
+class RetriesExhaustedError(Exception):
+    pass
+
+
+async def consume(loop=None):
+    import aio_pika
+    retries = 0
+    while True:
+        try:
+            connection = await aio_pika.connect(
+                host=settings.RABBITMQ_HOST, port=settings.RABBITMQ_PORT, loop=loop,
+                virtualhost=settings.RABBITMQ_VIRTUALHOST,
+                login=settings.RABBITMQ_USERNAME, password=settings.RABBITMQ_PASSWORD
+            )
+            async with connection:
+                queue_name = settings.RABBITMQ_QUEUE
+
+                channel = await connection.channel()
+                await channel.set_qos(prefetch_count=processor_settings.RABBITMQ_PREFETCH)
+
+                queue = await channel.declare_queue(
+                    queue_name,
+                    durable=settings.RABBITMQ_DURABLE,
+                    auto_delete=settings.RABBITMQ_AUTO_DELETE
+                )
+                exchange = await channel.declare_exchange(name=queue_name, type=ExchangeType.DIRECT, auto_delete=True)
+                await queue.bind(exchange, queue_name)
+                retries = 0
+
+                async with queue.iterator() as queue_iter:
+                    await RabbitConsumer().run(queue_iter)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.error(traceback.format_exc())
+        # reconnect with backoff, the queue iterator is ended when channel is closed as well
+        retries = retries + 1
+        await asyncio.sleep(min(processor_settings.CONNECTOR_RETRY_BACKOFF * (2 ** min(retries - 1, 10)),
+                                processor_settings.CONNECTOR_MAX_BACKOFF))
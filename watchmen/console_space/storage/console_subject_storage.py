@@ -1,10 +1,11 @@
 from model.model.console_space.console_space import ConsoleSpaceSubject
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
 # from watchmen.database.storage.storage_template import insert_one, find_, update_one, delete_, \
 #     find_one, update_one_first, delete_by_id
 from watchmen.database.find_storage_template import find_storage_template
+from watchmen.report.engine.sql_cache import subject_saved
 
 CONSOLE_SPACE_SUBJECTS = "console_space_subjects"
 
@@ -24,8 +25,9 @@ def load_console_subject_list_by_ids(subject_id_list, current_user):
 
 
 def update_console_subject(console_subject: ConsoleSpaceSubject):
-
-    return storage_template.update_one(console_subject, ConsoleSpaceSubject, CONSOLE_SPACE_SUBJECTS)
+    result = storage_template.update_one(console_subject, ConsoleSpaceSubject, CONSOLE_SPACE_SUBJECTS)
+    subject_saved(console_subject.subjectId)
+    return result
 
 
 def load_console_subject_by_id(subject_id, current_user) -> ConsoleSpaceSubject:
@@ -58,5 +60,10 @@ def load_console_subject_by_report_id(report_id, current_user) -> ConsoleSpaceSu
                                      ConsoleSpaceSubject, CONSOLE_SPACE_SUBJECTS)
 
 
+def load_console_subjects_by_report_ids(report_ids, current_user):
+    return storage_template.find_({"reportIds": {"in": report_ids}},
+                                  ConsoleSpaceSubject, CONSOLE_SPACE_SUBJECTS)
+
+
 def import_console_subject_to_db(subject):
     return storage_template.insert_one(subject, ConsoleSpaceSubject, CONSOLE_SPACE_SUBJECTS)
@@ -1,6 +1,6 @@
 from model.model.dashborad.dashborad import ConsoleDashboard
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
 from watchmen.database.find_storage_template import find_storage_template
 
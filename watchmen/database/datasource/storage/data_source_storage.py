@@ -2,7 +2,7 @@ from model.model.common.pagination import Pagination
 from model.model.common.user import User
 from watchmen_boot.storage.model.data_source import DataSource
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
 from watchmen_boot.config.config import settings
 from watchmen.database.find_storage_template import find_storage_template
@@ -45,5 +45,7 @@ class TableDefinition(object):
             return "writerId"
         elif table_name == "factor_index":
             return "factorindexid"
+        elif table_name == "subject_materializations":
+            return "subjectId"
         else:
             raise Exception("table_name does not exist {0}".format(table_name))
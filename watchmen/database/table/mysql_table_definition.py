@@ -193,6 +193,22 @@ class MysqlTableDefinition(TableDefinition):
                                                   Column('createtime', String(50), nullable=True)
                                                   )
 
+        self.subject_materializations_table = Table("subject_materializations", self.metadata,
+                                                    Column("subjectid", String(60), primary_key=True),
+                                                    Column("tenantid", String(60), nullable=False),
+                                                    Column("tablename", String(100), nullable=True),
+                                                    Column("retiredtablename", String(100), nullable=True),
+                                                    Column("sqlhash", String(60), nullable=True),
+                                                    Column("watermark", DateTime, nullable=True),
+                                                    Column("rebuiltat", DateTime, nullable=True),
+                                                    Column("refreshedat", DateTime, nullable=True),
+                                                    Column("rowcount", Integer, nullable=True),
+                                                    Column("status", String(10), nullable=True),
+                                                    Column("error", String(1000), nullable=True),
+                                                    Column('lastmodified', DateTime, nullable=True),
+                                                    Column('createtime', String(50), nullable=True)
+                                                    )
+
         self.console_reports_table = Table("reports", self.metadata,
                                            Column("reportid", String(60), primary_key=True),
                                            Column("name", String(50), nullable=False),
@@ -318,6 +334,8 @@ class MysqlTableDefinition(TableDefinition):
             return self.console_space_subjects_table
         elif table_name == "console_reports":
             return self.console_reports_table
+        elif table_name == "subject_materializations":
+            return self.subject_materializations_table
         elif table_name == "tenants":
             return self.tenants_table
         elif table_name == "pats":
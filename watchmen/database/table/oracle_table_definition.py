@@ -51,6 +51,8 @@ def get_pid(table_name):
         return "writerId"
     elif table_name == "factor_index":
         return "factorindexid"
+    elif table_name == "subject_materializations":
+        return "subjectId"
     else:
         raise Exception("table_name does not exist {0}".format(table_name))
 
@@ -230,6 +232,22 @@ console_space_subjects_table = Table("console_space_subjects", metadata,
                                      Column('createtime', String(50), nullable=True)
                                      )
 
+subject_materializations_table = Table("subject_materializations", metadata,
+                                       Column("subjectid", String(60), primary_key=True),
+                                       Column("tenantid", String(60), nullable=False),
+                                       Column("tablename", String(100), nullable=True),
+                                       Column("retiredtablename", String(100), nullable=True),
+                                       Column("sqlhash", String(60), nullable=True),
+                                       Column("watermark", DateTime, nullable=True),
+                                       Column("rebuiltat", DateTime, nullable=True),
+                                       Column("refreshedat", DateTime, nullable=True),
+                                       Column("rowcount", Integer, nullable=True),
+                                       Column("status", String(10), nullable=True),
+                                       Column("error", String(1000), nullable=True),
+                                       Column('lastmodified', DateTime, nullable=True),
+                                       Column('createtime', String(50), nullable=True)
+                                       )
+
 console_reports_table = Table("reports", metadata,
                               Column("reportid", String(60), primary_key=True),
                               Column("name", String(50), nullable=False),
@@ -360,6 +378,8 @@ def get_table_by_name(table_name):
         return console_space_subjects_table
     elif table_name == "console_reports":
         return console_reports_table
+    elif table_name == "subject_materializations":
+        return subject_materializations_table
     elif table_name == "pats":
         return pats_table
     elif table_name == "tenants":
@@ -10,7 +10,7 @@ from watchmen_boot.storage.mongo.index import build_code_options
 from storage.storage.exception.exception import OptimisticLockError, InsertConflictError
 
 from watchmen.common.constants.parameter_constants import RAW
-from watchmen.common.utils.data_utils import build_data_pages, build_collection_name
+from watchmen.common.utils.data_utils import build_data_pages, build_collection_name, compute_average
 from watchmen.database.topic.topic_storage_interface import TopicStorageInterface
 
 log = logging.getLogger("app." + __name__)
@@ -105,7 +105,7 @@ class MongoTopicStorage(TopicStorageInterface):
                 elif "_count" in value:
                     new_updates[key] = value["_count"]
                 elif "_avg" in value:
-                    new_updates[key] = value["_avg"]
+                    new_updates[key] = compute_average(value["_avg"])
                 else:
                     new_updates[key] = value
             else:
@@ -118,11 +118,12 @@ class MongoTopicStorage(TopicStorageInterface):
         for key, value in updates.items():
             if isinstance(value, dict):
                 if "_sum" in value:
-                    new_updates['$inc'] = {key: value["_sum"]}
+                    new_updates.setdefault('$inc', {})[key] = value["_sum"]
                 elif "_count" in value:
-                    new_updates['$inc'][key] = value["_count"]
+                    new_updates.setdefault('$inc', {})[key] = value["_count"]
                 elif "_avg" in value:
-                    pass
+                    # average depends on the sum and count kept in aggregate_assist_
+                    raise ValueError("avg of {0} should be resolved before update".format(key))
                 else:
                     new_updates["$set"][key] = value
             else:
@@ -220,6 +221,20 @@ class MongoTopicStorage(TopicStorageInterface):
         topic_data_col = self.client.get_collection(build_collection_name(topic_name), codec_options=codec_options)
         return topic_data_col.find(self.build_mongo_where_expression(where))
 
+    def topic_data_scan_columns(self, where, columns: list, topic_name: str, fetch_size: int):
+        codec_options = build_code_options()
+        topic_data_col = self.client.get_collection(build_collection_name(topic_name), codec_options=codec_options)
+        cursor = topic_data_col.find(self.build_mongo_where_expression(where),
+                                     projection={column: 1 for column in columns}, batch_size=fetch_size)
+        rows = []
+        for doc in cursor:
+            rows.append({column: doc.get(column) for column in columns})
+            if len(rows) >= fetch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
     def topic_data_find_with_aggregate(self, where, topic_name, aggregate):
         codec_options = build_code_options()
         topic_data_col = self.client.get_collection(build_collection_name(topic_name), codec_options=codec_options)
@@ -1,4 +1,3 @@
-import json
 import logging
 import operator
 import threading
@@ -17,9 +16,10 @@ from watchmen_boot.storage.mysql.mysql_utils import parse_obj
 from storage.storage.exception.exception import OptimisticLockError, InsertConflictError
 
 from watchmen_boot.cache.cache_manage import cacheman, STMT, COLUMNS_BY_TABLE_NAME
-from watchmen_boot.guid.snowflake import get_int_surrogate_key
+from watchmen.common.guid.id_block import get_int_surrogate_key, get_int_surrogate_keys
 from watchmen.common.utils.data_utils import build_data_pages, capital_to_lower, build_collection_name
-from watchmen.common.utils.data_utils import convert_to_dict
+from watchmen.common.utils.data_utils import convert_to_dict, compute_average
+from watchmen.common.utils.fast_json import json_loads
 from watchmen.database.topic.topic_storage_interface import TopicStorageInterface
 
 log = logging.getLogger("app." + __name__)
@@ -152,7 +152,7 @@ class MysqlTopicStorage(TopicStorageInterface):
                                     elif k == "_count":
                                         new_updates[key.lower()] = v
                                     elif k == "_avg":
-                                        pass  # todo
+                                        new_updates[key.lower()] = compute_average(v)
                             else:
                                 new_updates[key] = value_
                         else:
@@ -185,7 +185,9 @@ class MysqlTopicStorage(TopicStorageInterface):
                                     elif k == "_count":
                                         new_updates[key.lower()] = text(f'{key.lower()} + {v}')
                                     elif k == "_avg":
-                                        pass  # todo
+                                        # average depends on the sum and count kept in aggregate_assist_
+                                        raise ValueError(
+                                            "avg of {0} should be resolved before update".format(key))
                             else:
                                 new_updates[key] = value_
             return new_updates
@@ -273,9 +275,10 @@ class MysqlTopicStorage(TopicStorageInterface):
         table_name = f"topic_{topic_name}"
         table = self.get_topic_table_by_name(table_name)
         values = []
-        for instance in data:
+        ids = get_int_surrogate_keys(len(data))
+        for index, instance in enumerate(data):
             instance_dict: dict = convert_to_dict(instance)
-            instance_dict['id_'] = get_int_surrogate_key()
+            instance_dict['id_'] = ids[index]
             value = {}
             for key in table.c.keys():
                 value[key] = instance_dict.get(key)
@@ -347,7 +350,7 @@ class MysqlTopicStorage(TopicStorageInterface):
             for index, name in enumerate(columns):
                 if isinstance(table.c[name.lower()].type, JSON):
                     if row[index] is not None:
-                        result[name] = json.loads(row[index])
+                        result[name] = json_loads(row[index])
                     else:
                         result[name] = None
                 else:
@@ -372,7 +375,7 @@ class MysqlTopicStorage(TopicStorageInterface):
                 for index, name in enumerate(columns):
                     if isinstance(table.c[name.lower()].type, JSON):
                         if row[index] is not None:
-                            result[name] = json.loads(row[index])
+                            result[name] = json_loads(row[index])
                         else:
                             result[name] = None
                     else:
@@ -380,6 +383,20 @@ class MysqlTopicStorage(TopicStorageInterface):
                 results.append(result)
             return self._convert_list_elements_key(results, topic_name)
 
+    def topic_data_scan_columns(self, where, columns: list, topic_name: str, fetch_size: int):
+        table_name = 'topic_' + topic_name
+        table = self.get_topic_table_by_name(table_name)
+        stmt = select(*[table.c[column.lower()] for column in columns])
+        if where:
+            stmt = stmt.where(self.build_mysql_where_expression(table, where))
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(stmt)
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield [dict(zip(columns, row)) for row in rows]
+
     def topic_data_find_with_aggregate(self, where, topic_name, aggregate):
         table_name = 'topic_' + topic_name
         table = self.get_topic_table_by_name(table_name)
@@ -418,7 +435,7 @@ class MysqlTopicStorage(TopicStorageInterface):
                     for index, name in enumerate(columns):
                         if isinstance(table.c[name.lower()].type, JSON):
                             if row[index] is not None:
-                                result[name] = json.loads(row[index])
+                                result[name] = json_loads(row[index])
                             else:
                                 result[name] = None
                         else:
@@ -453,7 +470,7 @@ class MysqlTopicStorage(TopicStorageInterface):
                 result = {}
                 for index, name in enumerate(columns):
                     if name == "data_":
-                        result.update(json.loads(row[index]))
+                        result.update(json_loads(row[index]))
                 results.append(result)
         else:
             for row in res:
@@ -461,7 +478,7 @@ class MysqlTopicStorage(TopicStorageInterface):
                 for index, name in enumerate(columns):
                     if isinstance(table.c[name.lower()].type, JSON):
                         if row[index] is not None:
-                            result[name] = json.loads(row[index])
+                            result[name] = json_loads(row[index])
                         else:
                             result[name] = None
                     else:
@@ -1,5 +1,4 @@
 import datetime
-import json
 import logging
 import operator
 import threading
@@ -17,8 +16,10 @@ from watchmen_boot.storage.oracle.oracle_utils import parse_obj
 from storage.storage.exception.exception import InsertConflictError, OptimisticLockError
 
 from watchmen_boot.cache.cache_manage import cacheman, COLUMNS_BY_TABLE_NAME
-from watchmen_boot.guid.snowflake import get_surrogate_key
-from watchmen.common.utils.data_utils import build_data_pages, build_collection_name, convert_to_dict, capital_to_lower
+from watchmen.common.guid.id_block import get_surrogate_key
+from watchmen.common.utils.data_utils import build_data_pages, build_collection_name, convert_to_dict, capital_to_lower, \
+    compute_average
+from watchmen.common.utils.fast_json import json_loads
 
 from watchmen.database.topic.topic_storage_interface import TopicStorageInterface
 
@@ -143,7 +144,7 @@ class OracleTopicStorage(TopicStorageInterface):
                                     elif k == "_count":
                                         new_updates[key.lower()] = v
                                     elif k == "_avg":
-                                        new_updates[key.lower()] = v
+                                        new_updates[key.lower()] = compute_average(v)
                             else:
                                 new_updates[key] = value_
                         else:
@@ -176,7 +177,9 @@ class OracleTopicStorage(TopicStorageInterface):
                                     elif k == "_count":
                                         new_updates[key.lower()] = text(f'{key.lower()} + {v}')
                                     elif k == "_avg":
-                                        pass  # todo
+                                        # average depends on the sum and count kept in aggregate_assist_
+                                        raise ValueError(
+                                            "avg of {0} should be resolved before update".format(key))
                             else:
                                 new_updates[key] = value_
             return new_updates
@@ -304,7 +307,7 @@ class OracleTopicStorage(TopicStorageInterface):
             for index, name in enumerate(columns):
                 if isinstance(table.c[name.lower()].type, CLOB):
                     if row[name] is not None:
-                        result[name] = json.loads(row[name])
+                        result[name] = json_loads(row[name])
                     else:
                         result[name] = None
                 else:
@@ -330,7 +333,7 @@ class OracleTopicStorage(TopicStorageInterface):
                     for index, name in enumerate(columns):
                         if isinstance(table.c[name.lower()].type, CLOB):
                             if row[name] is not None:
-                                result[name] = json.loads(row[name])
+                                result[name] = json_loads(row[name])
                             else:
                                 result[name] = None
                         else:
@@ -346,6 +349,20 @@ class OracleTopicStorage(TopicStorageInterface):
                         result[name] = rows[index]
                 return result
 
+    def topic_data_scan_columns(self, where, columns: list, topic_name: str, fetch_size: int):
+        table_name = build_collection_name(topic_name)
+        table = self.get_topic_table_by_name(table_name)
+        stmt = select(*[table.c[column.lower()] for column in columns])
+        if where:
+            stmt = stmt.where(self.build_oracle_where_expression(table, where))
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(stmt)
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield [dict(zip(columns, row)) for row in rows]
+
     def topic_data_find_with_aggregate(self, where, topic_name, aggregate):
         table_name = 'topic_' + topic_name
         table = self.get_topic_table_by_name(table_name)
@@ -391,7 +408,7 @@ class OracleTopicStorage(TopicStorageInterface):
                     for index, name in enumerate(columns):
                         if isinstance(table.c[name.lower()].type, CLOB):
                             if row[name] is not None:
-                                result[name] = json.loads(row[name])
+                                result[name] = json_loads(row[name])
                             else:
                                 result[name] = None
                         else:
@@ -425,7 +442,7 @@ class OracleTopicStorage(TopicStorageInterface):
             res = cursor.fetchall()
         if self.storage_template.check_topic_type(name) == "raw":
             for row in res:
-                result.append(json.loads(row['DATA_']))
+                result.append(json_loads(row['DATA_']))
         else:
             for row in res:
                 if model is not None:
@@ -45,6 +45,12 @@ class TopicStorageInterface(abc.ABC):
     def topic_data_find_(self, where, topic_name):
         pass
 
+    def topic_data_scan_columns(self, where, columns: list, topic_name: str, fetch_size: int):
+        """
+        values of columns of rows, in lists of fetch size. rows are streamed, not loaded at once
+        """
+        pass
+
     @abc.abstractmethod
     def topic_data_find_with_aggregate(self, where, topic_name, aggregate):
         pass
@@ -39,6 +39,9 @@ class TopicStorageEngine(object):
     def topic_data_find_(self, where, topic_name):
         return self.template.topic_data_find_(where, topic_name)
 
+    def topic_data_scan_columns(self, where, columns: list, topic_name: str, fetch_size: int):
+        return self.template.topic_data_scan_columns(where, columns, topic_name, fetch_size)
+
     def topic_data_find_with_aggregate(self, where, topic_name, aggregate):
         return self.template.topic_data_find_with_aggregate(where, topic_name, aggregate)
 
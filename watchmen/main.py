@@ -5,10 +5,21 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from watchmen_boot.config.config import settings
+from watchmen.common.presto.presto_client import get_connection_pool
 from watchmen.connector.kafka import kafka_connector
 from watchmen.connector.rabbitmq import rabbit_connector
 from watchmen.monitor.prometheus.index import init_prometheus_monitor
-from watchmen.routers import admin, console, common, auth, metadata, cache, pipeline, data_patch, index, consume
+from watchmen.monitor.services.query_monitor_service import flush_query_monitors
+from watchmen.pipeline.core.combiner.aggregate_combiner import flush_window_aggregate_combiner
+from watchmen.pipeline.core.executor.pipeline_executor import start_pipeline_executor, shutdown_pipeline_executor
+from watchmen.pipeline.service.pipeline_journal_service import start_pipeline_journal, stop_pipeline_journal
+from watchmen.config.config import processor_settings
+from watchmen.pipeline.storage.pipeline_routing import build_pipeline_routing_table
+from watchmen.pipeline.storage.pipeline_storage import warm_up_pipeline_cache
+from watchmen.report.engine.materialization import start_materialization_refresher, stop_materialization_refresher
+from watchmen.topic.storage.topic_schema_storage import warm_up_topic_cache
+from watchmen.routers import admin, console, common, auth, metadata, cache, pipeline, data_patch, index, consume, \
+    monitor
 
 log = logging.getLogger("app." + __name__)
 
@@ -29,6 +40,20 @@ if settings.PROMETHEUS_ON:
 
 @app.on_event("startup")
 def startup():
+    try:
+        build_pipeline_routing_table()
+    except Exception as e:
+        # the routing table is built at the first trigger then
+        log.error("build pipeline routing table failed: {0}".format(e))
+    if processor_settings.METADATA_CACHE_WARM_UP:
+        try:
+            log.info("metadata cache warmed up with {0} topics and {1} pipelines".format(warm_up_topic_cache(),
+                                                                                       warm_up_pipeline_cache()))
+        except Exception as e:
+            log.error("warm up metadata cache failed: {0}".format(e))
+    start_pipeline_executor()
+    start_pipeline_journal()
+    start_materialization_refresher()
     if settings.CONNECTOR_KAFKA:
         asyncio.create_task(kafka_connector.consume())
     elif settings.CONNECTOR_RABBITMQ:
@@ -36,6 +61,16 @@ def startup():
         asyncio.ensure_future(rabbit_connector.consume(loop))
 
 
+@app.on_event("shutdown")
+def shutdown():
+    stop_pipeline_journal()
+    stop_materialization_refresher()
+    flush_window_aggregate_combiner()
+    shutdown_pipeline_executor()
+    flush_query_monitors()
+    get_connection_pool().close()
+
+
 log.info("system init rest api")
 
 app.include_router(admin.router)
@@ -48,3 +83,4 @@ app.include_router(pipeline.router)
 app.include_router(data_patch.router)
 app.include_router(index.router)
 app.include_router(consume.router)
+app.include_router(monitor.router)
@@ -6,6 +6,7 @@ from pydantic.main import BaseModel
 
 
 class QuerySource(BaseModel):
+    sourceId: str = None  # subject id or report id
     name: str = None
     queryType: str = None
     queryTimestamp: datetime = None
@@ -13,11 +14,12 @@ class QuerySource(BaseModel):
 
 class ResultSummary(BaseModel):
     resultCount: int = None
-    executionTime: int = None
+    executionTime: float = None
 
 
 class QuerySummary(BaseModel):
     querySql: str = None
+    sqlHash: str = None
     queryTimestamp: datetime = None
     resultSummary: ResultSummary = None
 
@@ -26,7 +28,19 @@ class QueryMonitor(WatchmenModel):
     queryUid: int = None
     querySource: QuerySource = None
     querySummaryList: List[QuerySummary] = []
-    executionTime: int = None
+    executionTime: float = None
     success: bool = True
     error: str = None
     tenantId: str = None
+
+
+class SlowQuerySource(BaseModel):
+    sourceId: str = None
+    name: str = None
+    queryType: str = None
+    queryCount: int = 0
+    errorCount: int = 0
+    averageTime: float = 0
+    maxTime: float = 0
+    maxResultCount: int = 0
+    slowestSqlHash: str = None
@@ -0,0 +1,18 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+CACHE_HIT = Counter("watchmen_cache_hit_total", "hits of in memory caches", ["cache"])
+CACHE_MISS = Counter("watchmen_cache_miss_total", "misses of in memory caches", ["cache"])
+
+CONNECTOR_EVENTS = Counter("watchmen_connector_events_total", "events consumed from brokers",
+                           ["connector", "topic", "status"])
+CONNECTOR_BATCH_SECONDS = Histogram("watchmen_connector_batch_seconds", "seconds to import one batch of events",
+                                    ["connector"])
+KAFKA_CONSUMER_LAG = Gauge("watchmen_kafka_consumer_lag", "records not consumed yet", ["topic", "partition"])
+PIPELINE_RUNS_PENDING = Gauge("watchmen_pipeline_runs_pending", "pipeline runs scheduled and not finished")
+PIPELINE_JOURNAL_DEPTH = Gauge("watchmen_pipeline_journal_depth", "journaled events not drained yet")
+PIPELINE_JOURNAL_AGE = Gauge("watchmen_pipeline_journal_age_seconds", "age of the oldest journaled event not drained")
+PRESTO_POOL_WAIT_SECONDS = Histogram("watchmen_presto_pool_wait_seconds", "seconds to wait for a presto connection")
+PRESTO_POOL_IN_USE = Gauge("watchmen_presto_pool_in_use", "presto connections in use")
+PRESTO_POOL_OPEN = Gauge("watchmen_presto_pool_open", "presto connections opened by pool")
+QUERY_SECONDS = Histogram("watchmen_query_seconds", "seconds of dataset and chart queries", ["type", "status"])
+QUERY_MONITOR_DROPPED = Counter("watchmen_query_monitor_dropped_total", "query monitors dropped when queue is full")
@@ -1,11 +1,10 @@
-import asyncio
-
 from model.model.common.alarm import AlarmMessage
 from model.model.pipeline.trigger_type import TriggerType
 
 from watchmen.collection.model.topic_event import TopicEvent
 from watchmen.common.constants import pipeline_constants
 from watchmen.common.notify.notify_service import send_notifier
+from watchmen.pipeline.core.executor.pipeline_executor import run_coroutine
 from watchmen.pipeline.index import trigger_pipeline
 from watchmen.pipeline.utils.units_func import add_audit_columns, INSERT
 from watchmen.topic.storage.topic_data_storage import save_topic_instance
@@ -22,4 +21,4 @@ def sync_alarm_message(alarm: AlarmMessage):
     trigger_pipeline(topic_event.code,
                      {pipeline_constants.NEW: topic_event.data, pipeline_constants.OLD: None},
                      TriggerType.insert)
-    asyncio.ensure_future(send_notifier(alarm))
+    run_coroutine(send_notifier(alarm))
@@ -1,42 +1,68 @@
-import asyncio
+import hashlib
+import logging
+import queue
+import threading
 import time
-from datetime import datetime
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import List
 
 from model.model.console_space.console_space import ConsoleSpaceSubject
 from model.model.report.report import Report
+from watchmen_boot.config.config import settings
 
-from watchmen.collection.model.topic_event import TopicEvent
-from watchmen_boot.guid.snowflake import get_surrogate_key
-from watchmen.monitor.model.query_monitor import QuerySource, QueryMonitor, QuerySummary, ResultSummary
-from watchmen.raw_data.service.import_raw_data import import_raw_topic_data
+from watchmen.common.guid.id_block import get_surrogate_key
+from watchmen.common.utils.fast_json import json_loads
+from watchmen.config.config import processor_settings
+from watchmen.database.topic.adapter.topic_storage_adapter import get_template_by_datasource_id
+from watchmen.database.topic_utils import get_flatten_field
+from watchmen.monitor.model.query_monitor import QuerySource, QueryMonitor, QuerySummary, ResultSummary, \
+    SlowQuerySource
+from watchmen.monitor.prometheus.metrics import QUERY_SECONDS, QUERY_MONITOR_DROPPED
+from watchmen.pipeline.utils.units_func import add_audit_columns, INSERT
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_name
+
+log = logging.getLogger("app." + __name__)
+
+QUERY_MONITOR_TOPIC = "raw_query_monitor"
+MAX_ERROR_LENGTH = 4000
 
 
 def __build_query_for_subject(condition):
     return condition
 
 
-def build_query_monitor(subject: ConsoleSpaceSubject, query_type: str):
+def build_query_monitor(subject: ConsoleSpaceSubject, query_type: str, current_user=None):
     query_monitor = QueryMonitor()
     query_monitor.queryUid = get_surrogate_key()
     query_source = QuerySource()
+    query_source.sourceId = subject.subjectId
     query_source.name = subject.name
     query_source.queryType = query_type
+    query_source.queryTimestamp = datetime.now().replace(tzinfo=None)
     query_monitor.querySource = query_source
+    if current_user is not None:
+        query_monitor.tenantId = current_user.tenantId
     return query_monitor
 
 
-def build_query_monitor_report(report: Report, query_type: str):
+def build_query_monitor_report(report: Report, query_type: str, current_user=None):
     query_monitor = QueryMonitor()
     query_monitor.queryUid = get_surrogate_key()
     query_source = QuerySource()
+    query_source.sourceId = report.reportId
     query_source.name = report.name
     query_source.queryType = query_type
+    query_source.queryTimestamp = datetime.now().replace(tzinfo=None)
     query_monitor.querySource = query_source
+    if current_user is not None:
+        query_monitor.tenantId = current_user.tenantId
     return query_monitor
 
 
 def build_query_summary(sql):
     query_summary = QuerySummary(querySql=sql)
+    query_summary.sqlHash = hashlib.sha1(sql.encode("utf-8")).hexdigest()
     query_summary.queryTimestamp = datetime.now().replace(tzinfo=None)
     return query_summary
 
@@ -49,7 +75,184 @@ def build_result_summary(row, start):
     return result_summary
 
 
-# async def sync_query_monitor_data(query_monitor: QueryMonitor):
-#     topic_event = TopicEvent(code="raw_query_monitor", data=query_monitor.dict())
-#
-#     asyncio.ensure_future(import_raw_topic_data(topic_event))
+def build_query_monitor_row(query_monitor: QueryMonitor, topic) -> dict:
+    data = query_monitor.dict()
+    if data.get("error") is not None:
+        data["error"] = data["error"][:MAX_ERROR_LENGTH]
+    row = {"data_": data, "tenant_id_": query_monitor.tenantId}
+    add_audit_columns(row, INSERT)
+    row.update(get_flatten_field(data, topic.factors))
+    return row
+
+
+class QueryMonitorWriter:
+    """
+    monitors are queued and saved into raw_query_monitor topic by a daemon thread, one bulk insert per batch.
+    a monitor is dropped when queue is full, queries are never blocked by saving monitors
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int):
+        self.batchSize = batch_size
+        self.flushInterval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, query_monitor: QueryMonitor):
+        if self.thread is None:
+            self.__start()
+        try:
+            self.queue.put_nowait(query_monitor)
+        except queue.Full:
+            QUERY_MONITOR_DROPPED.inc()
+
+    def __start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="query-monitor-writer", daemon=True)
+                self.thread.start()
+
+    def take_batch(self) -> List[QueryMonitor]:
+        batch = [self.queue.get()]
+        deadline = time.time() + self.flushInterval
+        while len(batch) < self.batchSize:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            try:
+                self.save(batch)
+            except Exception as e:
+                log.error("save {0} query monitors failed: {1}".format(len(batch), e))
+
+    def flush(self):
+        """
+        save monitors left in queue, on shutdown
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for index in range(0, len(batch), self.batchSize):
+            self.save(batch[index:index + self.batchSize])
+
+    @staticmethod
+    def save(batch: List[QueryMonitor]):
+        topic = get_topic_by_name(QUERY_MONITOR_TOPIC)
+        if topic is None:
+            log.warning("{0} query monitors are not saved, {1} topic does not exist".format(
+                len(batch), QUERY_MONITOR_TOPIC))
+            return
+        storage_template = get_template_by_datasource_id(topic.dataSourceId)
+        storage_template.topic_data_insert_([build_query_monitor_row(query_monitor, topic)
+                                             for query_monitor in batch], topic.name)
+
+
+query_monitor_writer = QueryMonitorWriter(processor_settings.QUERY_MONITOR_BATCH_SIZE,
+                                          processor_settings.QUERY_MONITOR_FLUSH_INTERVAL,
+                                          processor_settings.QUERY_MONITOR_MAX_PENDING)
+
+
+def save_query_monitor(query_monitor: QueryMonitor):
+    """
+    slow queries are logged, and the monitor is queued to save when QUERY_MONITOR_ON
+    """
+    QUERY_SECONDS.labels(query_monitor.querySource.queryType,
+                         "success" if query_monitor.success else "error").observe(query_monitor.executionTime or 0)
+    if (query_monitor.executionTime or 0) > processor_settings.QUERY_SLOW_THRESHOLD:
+        log.warning("slow {0} query of {1} {2} in {3:.3f} seconds, sql: {4}".format(
+            query_monitor.querySource.queryType, query_monitor.querySource.name, query_monitor.querySource.sourceId,
+            query_monitor.executionTime,
+            [(summary.sqlHash, summary.querySql) for summary in query_monitor.querySummaryList]))
+    if settings.QUERY_MONITOR_ON:
+        query_monitor_writer.put(query_monitor)
+
+
+def flush_query_monitors():
+    try:
+        query_monitor_writer.flush()
+    except Exception as e:
+        log.error("flush query monitors failed: {0}".format(e))
+
+
+def find_slowest_query_sources(current_user, top: int, hours: float) -> List[SlowQuerySource]:
+    """
+    subjects and reports ordered by average execution time of queries in last hours.
+    monitors are read in batches and aggregated one by one, at most QUERY_MONITOR_SCAN_LIMIT monitors are read
+    """
+    topic = get_topic_by_name(QUERY_MONITOR_TOPIC)
+    if topic is None:
+        return []
+    since = datetime.now().replace(tzinfo=None) - timedelta(hours=hours)
+    storage_template = get_template_by_datasource_id(topic.dataSourceId)
+    aggregator = SlowQuerySourceAggregator()
+    where = {"and": [{"tenant_id_": current_user.tenantId}, {"insert_time_": {">=": since}}]}
+    with closing(storage_template.topic_data_scan_columns(where, ["data_"], topic.name,
+                                                          processor_settings.QUERY_MONITOR_SCAN_FETCH_SIZE)) as batches:
+        for rows in batches:
+            for row in rows:
+                aggregator.add(__load_monitor_data(row.get("data_")))
+            if aggregator.monitorCount >= processor_settings.QUERY_MONITOR_SCAN_LIMIT:
+                log.warning("slowest query sources are aggregated from first {0} monitors in last {1} hours".format(
+                    aggregator.monitorCount, hours))
+                break
+    return aggregator.find_slowest(top)
+
+
+def __load_monitor_data(data):
+    if isinstance(data, (str, bytes)):
+        return json_loads(data)
+    return data
+
+
+class SlowQuerySourceAggregator:
+    """
+    execution times of monitors aggregated by query source
+    """
+
+    def __init__(self):
+        self.sources = {}
+        self.totalTimes = {}
+        self.monitorCount = 0
+
+    def add(self, monitor: dict):
+        self.monitorCount = self.monitorCount + 1
+        if not monitor:
+            return
+        query_source = monitor.get("querySource") or {}
+        key = (query_source.get("queryType"), query_source.get("sourceId"))
+        source = self.sources.get(key)
+        if source is None:
+            source = SlowQuerySource(sourceId=query_source.get("sourceId"), name=query_source.get("name"),
+                                     queryType=query_source.get("queryType"))
+            self.sources[key] = source
+            self.totalTimes[key] = 0
+        execution_time = monitor.get("executionTime") or 0
+        source.queryCount = source.queryCount + 1
+        if not monitor.get("success", True):
+            source.errorCount = source.errorCount + 1
+        self.totalTimes[key] = self.totalTimes[key] + execution_time
+        summaries = monitor.get("querySummaryList") or []
+        for summary in summaries:
+            result_summary = summary.get("resultSummary") or {}
+            source.maxResultCount = max(source.maxResultCount, result_summary.get("resultCount") or 0)
+        if execution_time >= source.maxTime:
+            source.maxTime = execution_time
+            if summaries:
+                source.slowestSqlHash = max(summaries, key=lambda summary: (summary.get("resultSummary") or {}).get(
+                    "executionTime") or 0).get("sqlHash")
+
+    def find_slowest(self, top: int) -> List[SlowQuerySource]:
+        for key, source in self.sources.items():
+            source.averageTime = self.totalTimes[key] / source.queryCount
+        return sorted(self.sources.values(), key=lambda source: source.averageTime, reverse=True)[:top]
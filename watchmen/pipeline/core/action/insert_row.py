@@ -6,7 +6,6 @@ from watchmen.pipeline.core.context.action_context import get_variables, ActionC
 from watchmen.pipeline.core.mapping.parse_mapping import parse_mappings
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
 from watchmen.pipeline.storage.write_topic_data import insert_topic_data
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 log = logging.getLogger("app." + __name__)
 
@@ -27,7 +26,7 @@ def init(action_context: ActionContext):
         if action.topicId is None:
             raise ValueError("action.topicId is empty {0}".format(action.topicId))
 
-        target_topic = get_topic_by_id(action.topicId)
+        target_topic = action_context.get_topic(action.topicId)
         variables = get_variables(action_context)
 
         log.info("target_topic name: {0}".format(target_topic.name))
@@ -41,7 +40,8 @@ def init(action_context: ActionContext):
 
         trigger_pipeline_data_list = [insert_topic_data(mappings_results,
                                                         action_context.get_pipeline_id()
-                                                        , target_topic, action_context.get_current_user())]
+                                                        , target_topic, action_context.get_current_user(),
+                                                        action_context.is_triggerable())]
 
         status.insertCount = status.insertCount + 1
         elapsed_time = time.time() - start
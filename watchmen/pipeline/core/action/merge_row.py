@@ -2,7 +2,8 @@ import logging
 import time
 
 from watchmen.common.utils.data_utils import get_id_name
-from watchmen.pipeline.core.action.utils import update_retry_callback, update_recovery_callback
+from watchmen.pipeline.core.action.utils import update_retry_callback, update_recovery_callback, \
+    has_avg_aggregates, update_row_with_avg_aggregates
 from watchmen.pipeline.core.by.parse_on_parameter import parse_parameter_joint
 from watchmen.pipeline.core.context.action_context import get_variables, ActionContext
 from watchmen.pipeline.core.mapping.parse_mapping import parse_mappings
@@ -10,7 +11,6 @@ from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
 from watchmen.pipeline.core.retry.retry_template import retry_template, RetryPolicy
 from watchmen.pipeline.storage.read_topic_data import query_topic_data
 from watchmen.pipeline.storage.write_topic_data import update_topic_data_one
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 log = logging.getLogger("app." + __name__)
 
@@ -32,7 +32,7 @@ def init(action_context: ActionContext):
             raise ValueError("action.topicId is empty {0}".format(action.topicId))
 
         pipeline_topic = action_context.unitContext.stageContext.pipelineContext.pipelineTopic
-        target_topic = get_topic_by_id(action.topicId)
+        target_topic = action_context.get_topic(action.topicId)
 
         variables = get_variables(action_context)
 
@@ -54,17 +54,24 @@ def init(action_context: ActionContext):
             raise Exception("can't insert data in merge row action ")
         else:
             if target_topic.type == "aggregate":
-                args = [mappings_results, where_, target_topic, action_context.get_current_user()]
+                args = [mappings_results, where_, target_topic, action_context.get_current_user(),
+                        action_context.is_triggerable()]
                 retry_callback = (update_retry_callback, args)
                 recovery_callback = (update_recovery_callback, args)
                 execute_ = retry_template(retry_callback, recovery_callback, RetryPolicy())
                 result = execute_()
                 trigger_pipeline_data_list.append(result)
+            elif has_avg_aggregates(mappings_results):
+                trigger_pipeline_data_list.append(
+                    update_row_with_avg_aggregates(mappings_results, where_, target_topic,
+                                                   action_context.get_pipeline_id(), action_context.get_current_user(),
+                                                   action_context.is_triggerable()))
             else:
                 trigger_pipeline_data_list.append(
                     update_topic_data_one(mappings_results, target_data,
                                           action_context.get_pipeline_id(),
-                                          target_data[get_id_name()], target_topic, action_context.get_current_user()))
+                                          target_data[get_id_name()], target_topic, action_context.get_current_user(),
+                                          action_context.is_triggerable()))
         status.updateCount = status.updateCount + 1
         elapsed_time = time.time() - start
         status.completeTime = elapsed_time
@@ -4,9 +4,7 @@ import time
 from watchmen.pipeline.core.by.parse_on_parameter import parse_parameter_joint
 from watchmen.pipeline.core.context.action_context import get_variables, set_variable, ActionContext
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
-from watchmen.pipeline.storage.read_topic_data import query_topic_data, query_topic_data_aggregate
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+from watchmen.pipeline.storage.read_topic_data import query_topic_data_through_cache, query_topic_data_aggregate
 
 log = logging.getLogger("app." + __name__)
 
@@ -26,16 +24,16 @@ def init(action_context: ActionContext):
         action = action_context.action
 
         pipeline_topic = action_context.unitContext.stageContext.pipelineContext.pipelineTopic
-        target_topic = get_topic_by_id(action.topicId)
+        target_topic = action_context.get_topic(action.topicId)
         variables = get_variables(action_context)
 
         where_ = parse_parameter_joint(action.by, current_data, variables, pipeline_topic, target_topic)
         status.by = where_
 
-        target_factor = get_factor(action.factorId, target_topic)
+        target_factor = action_context.get_factor(action.factorId, target_topic)
 
         if action.arithmetic == "none" or action.arithmetic is None:
-            target_data = query_topic_data(where_, target_topic, action_context.get_current_user())
+            target_data = query_topic_data_through_cache(where_, target_topic, action_context.get_current_user())
             if target_data is not None:
                 if isinstance(target_data, list):
                     raise ValueError("read factor action should just get one factor record")
@@ -5,8 +5,6 @@ from watchmen.pipeline.core.by.parse_on_parameter import parse_parameter_joint
 from watchmen.pipeline.core.context.action_context import ActionContext, get_variables, set_variable
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
 from watchmen.pipeline.storage.read_topic_data import query_multiple_topic_data
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 log = logging.getLogger("app." + __name__)
 
@@ -26,13 +24,13 @@ def init(action_context: ActionContext):
         action = action_context.action
 
         pipeline_topic = action_context.unitContext.stageContext.pipelineContext.pipelineTopic
-        target_topic = get_topic_by_id(action.topicId)
+        target_topic = action_context.get_topic(action.topicId)
         variables = get_variables(action_context)
 
         where_ = parse_parameter_joint(action.by, current_data, variables, pipeline_topic, target_topic)
         status.by = where_
 
-        target_factor = get_factor(action.factorId, target_topic)
+        target_factor = action_context.get_factor(action.factorId, target_topic)
 
         target_data = query_multiple_topic_data(where_, target_topic,
                                                 action_context.get_current_user())
@@ -4,7 +4,6 @@ from watchmen.pipeline.core.by.parse_on_parameter import parse_parameter_joint
 from watchmen.pipeline.core.context.action_context import ActionContext, set_variable, get_variables
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
 from watchmen.pipeline.storage.read_topic_data import query_topic_data, query_multiple_topic_data
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 
 def init(action_context: ActionContext):
@@ -21,7 +20,7 @@ def init(action_context: ActionContext):
         current_data = action_context.currentOfTriggerData
         action = action_context.action
 
-        target_topic = get_topic_by_id(action.topicId)
+        target_topic = action_context.get_topic(action.topicId)
         pipeline_topic = action_context.unitContext.stageContext.pipelineContext.pipelineTopic
 
         variables = get_variables(action_context)
@@ -1,28 +1,143 @@
+import json
 import logging
+from decimal import Decimal
 
 from model.model.common.user import User
 from model.model.pipeline.trigger_data import TriggerData
+from model.model.pipeline.trigger_type import TriggerType
 from model.model.topic.topic import Topic
+from storage.storage.engine_adaptor import MONGO
+from storage.storage.exception.exception import InsertConflictError
+from watchmen_boot.config.config import settings
 
-from watchmen.common.utils.data_utils import get_id_name_by_datasource
+from watchmen.common.utils.data_utils import get_id_name_by_datasource, compute_average
 from watchmen.database.datasource.container import data_source_container
 from watchmen.database.topic.adapter.topic_storage_adapter import get_template_by_datasource_id
-from watchmen.pipeline.storage.read_topic_data import query_topic_data
+from watchmen.pipeline.core.retry.retry_template import RetryPolicy, retry_template
+from watchmen.pipeline.storage.negative_cache import note_topic_row_written
+from watchmen.pipeline.storage.read_topic_data import query_topic_data, query_topic_data_unless_absent
+from watchmen.pipeline.storage.row_cache import invalidate_topic_rows
+from watchmen.pipeline.storage.write_topic_data import insert_topic_data, need_trigger_pipeline, \
+    update_topic_data_one, update_topic_data_one_with_version
+from watchmen.report.engine.result_cache import invalidate_query_results
 
 log = logging.getLogger("app." + __name__)
 
 
-def update_recovery_callback(mappings_results: dict, where_: dict, target_topic: Topic):
+AGGREGATE_ASSIST = "aggregate_assist_"
+
+
+def __to_json_number(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def __read_aggregate_assist(target_data) -> dict:
+    if target_data is None:
+        return {}
+    assist = target_data.get(AGGREGATE_ASSIST)
+    if assist is None:
+        return {}
+    if isinstance(assist, str):
+        return json.loads(assist) if assist != "" else {}
+    return dict(assist)
+
+
+def resolve_avg_aggregates(mappings_results: dict, target_data) -> dict:
+    """
+    avg mapping is {"_avg": {"_sum": delta of sum, "_count": delta of count}},
+    apply the deltas on the state kept in aggregate_assist_ of target data, and replace the mapping with the average.
+    must be called under optimistic lock (version_), then the state and the average are updated atomically.
+    """
+    assist = None
+    for name, value in mappings_results.items():
+        if isinstance(value, dict) and "_avg" in value:
+            if assist is None:
+                assist = __read_aggregate_assist(target_data)
+            delta = value["_avg"]
+            state = assist.get(name, {"_sum": 0, "_count": 0})
+            if isinstance(delta, dict):
+                sum_ = Decimal(str(state.get("_sum", 0))) + Decimal(str(delta.get("_sum", 0) or 0))
+                count_ = state.get("_count", 0) + delta.get("_count", 0)
+            else:
+                # scalar avg value, count it as one more value
+                sum_ = Decimal(str(state.get("_sum", 0))) + Decimal(str(delta or 0))
+                count_ = state.get("_count", 0) + 1
+            state = {"_sum": __to_json_number(sum_), "_count": count_}
+            assist[name] = state
+            mappings_results[name] = compute_average({"_sum": sum_, "_count": count_})
+    if assist is not None:
+        mappings_results[AGGREGATE_ASSIST] = assist
+    return mappings_results
+
+
+def has_avg_aggregates(mappings_results: dict) -> bool:
+    return any(isinstance(value, dict) and "_avg" in value for value in mappings_results.values())
+
+
+def __update_avg_row(mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid, current_user: User,
+                     triggerable, with_version):
+    target_data = query_topic_data(where_, target_topic, current_user)
+    if target_data is None:
+        raise RuntimeError(
+            "update topic {0} failed, the target record is not exist. where: {1}".format(target_topic.name, where_))
+    id_ = target_data.get(
+        get_id_name_by_datasource(data_source_container.get_data_source_by_id(target_topic.dataSourceId)), None)
+    version_ = target_data.get("version_", None)
+    # resolve on a copy, the original deltas are applied again on the latest data when retry
+    mappings_results = resolve_avg_aggregates(dict(mappings_results), target_data)
+    if with_version and version_ is not None:
+        mappings_results['version_'] = version_
+        return update_topic_data_one_with_version(mappings_results, target_data, pipeline_uid, id_, version_,
+                                                  target_topic, current_user, triggerable)
+    return update_topic_data_one(mappings_results, target_data, pipeline_uid, id_, target_topic, current_user,
+                                 triggerable)
+
+
+def update_avg_retry_callback(mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid,
+                              current_user: User, triggerable=True):
+    return __update_avg_row(mappings_results, where_, target_topic, pipeline_uid, current_user, triggerable, True)
+
+
+def update_avg_recovery_callback(mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid,
+                                 current_user: User, triggerable=True):
+    log.error("The maximum number of retry times (3) is exceeded, retry failed. Do recovery, "
+              "mappings_results: {0}, where: {1}, target_topic: {2}".format(mappings_results, where_, target_topic))
+    return __update_avg_row(mappings_results, where_, target_topic, pipeline_uid, current_user, triggerable, False)
+
+
+def update_row_with_avg_aggregates(mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid,
+                                   current_user: User, triggerable=True):
+    """
+    update row of non-aggregate topic with avg mappings, the row is read and avg is resolved in each attempt,
+    under optimistic lock (version_) when the row has version
+    """
+    args = [mappings_results, where_, target_topic, pipeline_uid, current_user, triggerable]
+    retry_callback = (update_avg_retry_callback, args)
+    recovery_callback = (update_avg_recovery_callback, args)
+    execute_ = retry_template(retry_callback, recovery_callback, RetryPolicy())
+    return execute_()
+
+
+def update_recovery_callback(mappings_results: dict, where_: dict, target_topic: Topic, current_user: User,
+                             triggerable=True):
     log.error("The maximum number of retry times (3) is exceeded, retry failed. Do recovery, "
               "mappings_results: {0}, where: {1}, target_topic: {2}".format(mappings_results, where_, target_topic))
     target_data = query_topic_data(where_,
-                                   target_topic.name)
+                                   target_topic, current_user)
     if target_data is not None:
         id_ = target_data.get(
             get_id_name_by_datasource(data_source_container.get_data_source_by_id(target_topic.dataSourceId)), None)
         if id_ is not None:
+            mappings_results = resolve_avg_aggregates(dict(mappings_results), target_data)
             template = get_template_by_datasource_id(target_topic.dataSourceId)
             template.topic_data_update_one(id_, mappings_results, target_topic.name)
+            invalidate_topic_rows(target_topic)
+            invalidate_query_results(target_topic)
+            note_topic_row_written(target_topic, {**target_data, **mappings_results}, current_user)
+            if not need_trigger_pipeline(target_topic, TriggerType.update, current_user, triggerable):
+                return None
             data = {**target_data, **mappings_results}
             return TriggerData(topicName=target_topic.name,
                                triggerType="Update",
@@ -35,7 +150,8 @@ def update_recovery_callback(mappings_results: dict, where_: dict, target_topic:
             "target topic {0} recovery failed. the record is not exist. where: {1}".format(target_topic.name, where_))
 
 
-def update_retry_callback(mappings_results: dict, where_: dict, target_topic: Topic, current_user: User):
+def update_retry_callback(mappings_results: dict, where_: dict, target_topic: Topic, current_user: User,
+                          triggerable=True):
     target_data = query_topic_data(where_,
                                    target_topic, current_user)
 
@@ -44,9 +160,16 @@ def update_retry_callback(mappings_results: dict, where_: dict, target_topic: To
             get_id_name_by_datasource(data_source_container.get_data_source_by_id(target_topic.dataSourceId)), None)
         version_ = target_data.get("version_", None)
         if id_ is not None and version_ is not None:
+            # resolve on a copy, the original deltas are applied again on the latest data when retry
+            mappings_results = resolve_avg_aggregates(dict(mappings_results), target_data)
             mappings_results['version_'] = version_
             template = get_template_by_datasource_id(target_topic.dataSourceId)
             template.topic_data_update_one_with_version(id_, version_, mappings_results, target_topic.name)
+            invalidate_topic_rows(target_topic)
+            invalidate_query_results(target_topic)
+            note_topic_row_written(target_topic, {**target_data, **mappings_results}, current_user)
+            if not need_trigger_pipeline(target_topic, TriggerType.update, current_user, triggerable):
+                return None
             data = {**target_data, **mappings_results}
             return TriggerData(topicName=target_topic.name,
                                triggerType="Update",
@@ -58,3 +181,28 @@ def update_retry_callback(mappings_results: dict, where_: dict, target_topic: To
     else:
         raise RuntimeError(
             "update topic {0} failed, the target record is not exist. where: {1}".format(target_topic.name, where_))
+
+
+def write_aggregate_row(mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid,
+                        current_user: User, triggerable=True):
+    """
+    insert the aggregate row when it is not exists, otherwise update it with optimistic lock and retry.
+    returns the trigger data (None when no pipeline consumes it) and a flag which is true when the row is inserted
+    """
+    target_data = query_topic_data_unless_absent(where_, target_topic, current_user)
+    if target_data is None:
+        try:
+            insert_results = resolve_avg_aggregates(dict(mappings_results), None)
+            if settings.STORAGE_ENGINE == MONGO:
+                insert_results["version_"] = 0
+                insert_results.setdefault(AGGREGATE_ASSIST, {})
+            result = insert_topic_data(insert_results, pipeline_uid, target_topic, current_user, triggerable)
+            return result, True
+        except InsertConflictError:
+            log.info("the insert failed because of conflict, try to update operator")
+
+    args = [mappings_results, where_, target_topic, current_user, triggerable]
+    retry_callback = (update_retry_callback, args)
+    recovery_callback = (update_recovery_callback, args)
+    execute_ = retry_template(retry_callback, recovery_callback, RetryPolicy())
+    return execute_(), False
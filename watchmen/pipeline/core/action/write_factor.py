@@ -4,7 +4,8 @@ from decimal import Decimal
 
 from watchmen.common.utils.data_utils import get_id_name_by_datasource
 from watchmen.database.datasource.container import data_source_container
-from watchmen.pipeline.core.action.utils import update_retry_callback, update_recovery_callback
+from watchmen.pipeline.core.action.utils import update_retry_callback, update_recovery_callback, \
+    has_avg_aggregates, update_row_with_avg_aggregates
 from watchmen.pipeline.core.by.parse_on_parameter import parse_parameter_joint
 from watchmen.pipeline.core.context.action_context import ActionContext, get_variables
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
@@ -13,8 +14,6 @@ from watchmen.pipeline.core.parameter.utils import check_and_convert_value_by_fa
 from watchmen.pipeline.core.retry.retry_template import retry_template, RetryPolicy
 from watchmen.pipeline.storage.read_topic_data import query_topic_data
 from watchmen.pipeline.storage.write_topic_data import update_topic_data_one
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 log = logging.getLogger("app." + __name__)
 
@@ -36,7 +35,7 @@ def init(action_context: ActionContext):
         if action.topicId is not None:
 
             pipeline_topic = action_context.get_pipeline_context().pipelineTopic
-            target_topic = get_topic_by_id(action.topicId)
+            target_topic = action_context.get_topic(action.topicId)
             variables = get_variables(action_context)
 
             where_ = parse_parameter_joint(action.by, current_data, variables, pipeline_topic, target_topic)
@@ -45,7 +44,7 @@ def init(action_context: ActionContext):
             target_data = query_topic_data(where_,
                                            target_topic, action_context.get_current_user())
 
-            target_factor = get_factor(action.factorId, target_topic)
+            target_factor = action_context.get_factor(action.factorId, target_topic)
             source_ = action.source
             arithmetic = action.arithmetic
 
@@ -67,25 +66,35 @@ def init(action_context: ActionContext):
                 else:
                     result = {target_factor.name: {"_count": 0}}
             elif arithmetic == "avg":
-                result = {target_factor.name: {"_avg": current_value_}}
+                previous_value_ = check_and_convert_value_by_factor(target_factor,
+                                                                    parse_parameter(source_, previous_data, variables))
+                if previous_value_ is None:
+                    previous_value_ = 0
+                value_ = Decimal(current_value_) - Decimal(previous_value_)
+                result = {target_factor.name: {"_avg": {"_sum": value_, "_count": 1 if previous_data is None else 0}}}
 
             updates_ = result
             trigger_pipeline_data_list = []
             if target_data is not None:
                 if target_topic.type == "aggregate":
-                    args = [updates_, where_, target_topic, action_context.get_current_user()]
+                    args = [updates_, where_, target_topic, action_context.get_current_user(),
+                            action_context.is_triggerable()]
                     retry_callback = (update_retry_callback, args)
                     recovery_callback = (update_recovery_callback, args)
                     execute_ = retry_template(retry_callback, recovery_callback, RetryPolicy())
                     result = execute_()
                     trigger_pipeline_data_list.append(result)
+                elif has_avg_aggregates(updates_):
+                    trigger_pipeline_data_list.append(update_row_with_avg_aggregates(
+                        updates_, where_, target_topic, action_context.get_pipeline_id(),
+                        action_context.get_current_user(), action_context.is_triggerable()))
                 else:
                     trigger_pipeline_data_list.append(update_topic_data_one(
                         updates_, target_data,
                         action_context.get_pipeline_id(),
                         target_data[get_id_name_by_datasource(
                             data_source_container.get_data_source_by_id(target_topic.dataSourceId))],
-                        target_topic, action_context.get_current_user()))
+                        target_topic, action_context.get_current_user(), action_context.is_triggerable()))
             else:
                 raise Exception("can't insert data in write factor action ")
 
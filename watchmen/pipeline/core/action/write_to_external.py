@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import time
 
@@ -6,6 +5,7 @@ from watchmen_boot.config.config import settings
 from watchmen.external.service.index import get_writer_func
 from watchmen.external.storage import external_storage
 from watchmen.pipeline.core.context.action_context import ActionContext
+from watchmen.pipeline.core.executor.pipeline_executor import run_coroutine
 from watchmen.pipeline.core.monitor.model.pipeline_monitor import ActionStatus
 
 log = logging.getLogger("app." + __name__)
@@ -27,7 +27,7 @@ def init(action_context: ActionContext):
             external_writer = external_storage.load_external_writer_by_id(action.externalWriterId)
             if external_writer:
                 writer = get_writer_func(external_writer, topic)
-                asyncio.ensure_future(writer(action.eventCode, current_data, previous_data))
+                run_coroutine(writer(action.eventCode, current_data, previous_data))
         else:
             log.info(f"EXTERNAL_WRITER_ON  value is {settings.EXTERNAL_WRITER_ON}")
         elapsed_time = time.time() - start
@@ -4,15 +4,14 @@ from model.model.report.column import Operator
 
 from watchmen.common.utils.data_utils import build_collection_name
 from watchmen.pipeline.core.case.model.parameter import Parameter, ParameterJoint
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+from watchmen.pipeline.core.context.metadata_snapshot import find_topic_by_id, find_factor
 
 
 def parse_parameter(parameter_: Parameter):
     if parameter_.kind == "topic":
-        topic = get_topic_by_id(parameter_.topicId)
+        topic = find_topic_by_id(parameter_.topicId)
         topic_name = build_collection_name(topic.name)
-        factor = get_factor(parameter_.factorId, topic)
+        factor = find_factor(parameter_.factorId, topic)
         factor_name = factor.name
         return f'{factor_name.upper()}'
     elif parameter_.kind == 'constant':
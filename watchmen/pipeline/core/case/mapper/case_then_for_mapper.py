@@ -10,15 +10,14 @@ from watchmen.pipeline.core.case.function.utils import parse_constant_expression
     get_variable_with_func_pattern, DOT, get_variable_with_dot_pattern
 from watchmen.pipeline.core.case.model.parameter import Parameter, ParameterJoint
 from watchmen.pipeline.core.parameter.utils import cal_factor_value
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+from watchmen.pipeline.core.context.metadata_snapshot import find_topic_by_id, find_factor
 
 
 def parse_parameter(parameter_: Parameter, instance, variables):
     if parameter_.kind == "topic":
-        topic = get_topic_by_id(parameter_.topicId)
+        topic = find_topic_by_id(parameter_.topicId)
         topic_name = build_collection_name(topic.name)
-        factor = get_factor(parameter_.factorId, topic)
+        factor = find_factor(parameter_.factorId, topic)
         return cal_factor_value(instance, factor)
     elif parameter_.kind == 'constant':
         if parameter_.value is None:
@@ -0,0 +1,270 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from decimal import Decimal
+from typing import Dict, List
+
+from model.model.common.user import User
+from model.model.pipeline.trigger_data import TriggerData
+from model.model.topic.topic import Topic
+from watchmen_boot.config.config import settings
+
+from watchmen.common.constants import pipeline_constants
+from watchmen.config.config import processor_settings, COMBINER_DURABILITY_WINDOW, COMBINER_TRIGGER_FLUSH
+from watchmen.pipeline.core.action.utils import write_aggregate_row
+from watchmen.pipeline.core.executor.pipeline_executor import get_pipeline_executor, \
+    PipelineExecutorNotStartedError
+
+log = logging.getLogger("app." + __name__)
+
+SUM = "_sum"
+COUNT = "_count"
+AVG = "_avg"
+
+
+def aggregate_combiner_enabled() -> bool:
+    # actions in dask workers run in other processes, deltas buffered there can not be flushed by this process
+    return processor_settings.AGGREGATE_COMBINER_ON and not settings.DASK_ON
+
+
+def add_delta(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if isinstance(left, Decimal) or isinstance(right, Decimal):
+        return Decimal(str(left)) + Decimal(str(right))
+    return left + right
+
+
+class CombinedRow:
+    """
+    deltas of one aggregate row, identified by target topic, tenant and the "by" condition of action
+    """
+    targetTopic: Topic
+    where: dict
+    mappings: dict
+    eventCount: int = 0
+    pipelineUid: str = None
+    currentUser: User = None
+    traceId: str = None
+    triggerable: bool = True
+
+    def __init__(self, target_topic, where_, pipeline_uid, current_user, trace_id, triggerable):
+        self.targetTopic = target_topic
+        self.where = where_
+        self.mappings = {}
+        self.pipelineUid = pipeline_uid
+        self.currentUser = current_user
+        self.traceId = trace_id
+        self.triggerable = triggerable
+
+    def combine(self, mappings_results: dict):
+        self.add_mappings(mappings_results)
+        self.eventCount = self.eventCount + 1
+
+    def merge(self, newer):
+        """
+        merge deltas combined after this row, values as is of newer row win
+        """
+        self.add_mappings(newer.mappings)
+        self.eventCount = self.eventCount + newer.eventCount
+        self.traceId = newer.traceId
+
+    def add_mappings(self, mappings_results: dict):
+        for name, value in mappings_results.items():
+            previous = self.mappings.get(name)
+            if isinstance(value, dict) and SUM in value:
+                self.mappings[name] = {SUM: add_delta(previous.get(SUM) if isinstance(previous, dict) else None,
+                                                  value[SUM])}
+            elif isinstance(value, dict) and COUNT in value:
+                self.mappings[name] = {COUNT: add_delta(previous.get(COUNT) if isinstance(previous, dict) else None,
+                                                    value[COUNT])}
+            elif isinstance(value, dict) and AVG in value:
+                # sum and count deltas of avg are additive, the average is resolved when the row is written
+                previous_avg = previous.get(AVG) if isinstance(previous, dict) else None
+                delta = value[AVG]
+                if isinstance(previous_avg, dict) and isinstance(delta, dict):
+                    self.mappings[name] = {AVG: {SUM: add_delta(previous_avg.get(SUM), delta.get(SUM)),
+                                                 COUNT: add_delta(previous_avg.get(COUNT), delta.get(COUNT))}}
+                else:
+                    self.mappings[name] = {AVG: delta}
+            else:
+                # as is, the latest one wins
+                self.mappings[name] = value
+
+
+def build_combine_key(target_topic: Topic, where_: dict, current_user: User):
+    tenant_id = current_user.tenantId if current_user is not None else None
+    return target_topic.topicId, tenant_id, json.dumps(where_, sort_keys=True, default=str)
+
+
+class AggregateCombiner:
+    """
+    accumulate the aggregate deltas (_sum, _count, _avg) per target row in memory,
+    and write each row once with one atomic increment when flush.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.rows: Dict[tuple, CombinedRow] = {}
+        self.eventCount = 0
+
+    def combine(self, mappings_results: dict, where_: dict, target_topic: Topic, pipeline_uid, current_user: User,
+                trace_id=None, triggerable=True):
+        key = build_combine_key(target_topic, where_, current_user)
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                row = CombinedRow(target_topic, where_, pipeline_uid, current_user, trace_id, triggerable)
+                self.rows[key] = row
+            row.combine(mappings_results)
+            row.traceId = trace_id
+            self.eventCount = self.eventCount + 1
+            return self.eventCount
+
+    def pending(self) -> int:
+        return self.eventCount
+
+    def take(self) -> Dict[tuple, CombinedRow]:
+        with self.lock:
+            rows = self.rows
+            self.rows = {}
+            self.eventCount = 0
+            return rows
+
+    def restore(self, key: tuple, row: CombinedRow):
+        """
+        keep the deltas of row failed to write for next flush, deltas combined since are merged into it
+        """
+        with self.lock:
+            newer = self.rows.get(key)
+            if newer is not None:
+                self.eventCount = self.eventCount - newer.eventCount
+                row.merge(newer)
+            self.rows[key] = row
+            self.eventCount = self.eventCount + row.eventCount
+
+    def flush(self) -> List[TriggerData]:
+        rows = list(self.take().items())
+        trigger_pipeline_data_list = []
+        for index, (key, row) in enumerate(rows):
+            try:
+                trigger_data, inserted = write_aggregate_row(row.mappings, row.where, row.targetTopic,
+                                                             row.pipelineUid, row.currentUser, row.triggerable)
+            except Exception:
+                # rows not written are kept, the caller fails and may flush again
+                for failed_key, failed_row in rows[index:]:
+                    self.restore(failed_key, failed_row)
+                raise
+            log.debug("flush {0} combined events to topic {1}, inserted: {2}".format(row.eventCount,
+                                                                                  row.targetTopic.name, inserted))
+            if row.triggerable and trigger_data is not None:
+                trigger_pipeline_data_list.append(trigger_data)
+        return trigger_pipeline_data_list
+
+    def flush_and_trigger(self):
+        for key, row in self.take().items():
+            try:
+                trigger_data, inserted = write_aggregate_row(row.mappings, row.where, row.targetTopic,
+                                                             row.pipelineUid, row.currentUser, row.triggerable)
+            except Exception:
+                log.error("flush combined row failed, kept for next flush, topic: {0}, where: {1}, "
+                          "mappings: {2}\n{3}".format(row.targetTopic.name, row.where, row.mappings,
+                                                      traceback.format_exc()))
+                self.restore(key, row)
+                continue
+            if processor_settings.AGGREGATE_COMBINER_TRIGGER == COMBINER_TRIGGER_FLUSH \
+                    and row.triggerable and trigger_data is not None:
+                trigger_combined_row(trigger_data, row)
+
+
+def trigger_combined_row(trigger_data: TriggerData, row: CombinedRow):
+    """
+    combined rows are flushed by window flusher thread or by pipelines in executor threads,
+    downstream pipelines are scheduled on pipeline executor as pipelines triggered by requests
+    """
+    # pipeline index imports actions, which import this module
+    from watchmen.pipeline.index import trigger_pipeline
+
+    args = (trigger_data.topicName, trigger_data.data, trigger_data.triggerType, row.currentUser, row.traceId)
+    tenant_id = row.currentUser.tenantId if row.currentUser is not None else None
+    try:
+        try:
+            # runs of combined rows share trace id of the last event, they are not keyed by it
+            get_pipeline_executor().schedule_threadsafe(None, tenant_id, trigger_pipeline, *args)
+        except PipelineExecutorNotStartedError:
+            # no event loop, eg. in scripts
+            trigger_pipeline(*args)
+    except Exception:
+        log.error(traceback.format_exc())
+
+
+class WindowFlusher:
+    """
+    flush the shared combiner periodically, started at the first combined event
+    """
+
+    def __init__(self, combiner: AggregateCombiner):
+        self.combiner = combiner
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.started:
+            return
+        with self.lock:
+            if not self.started:
+                threading.Thread(target=self.run, daemon=True).start()
+                self.started = True
+
+    def run(self):
+        while True:
+            time.sleep(processor_settings.AGGREGATE_COMBINER_WINDOW)
+            if self.combiner.pending() > 0:
+                self.combiner.flush_and_trigger()
+
+
+window_combiner = AggregateCombiner()
+window_flusher = WindowFlusher(window_combiner)
+
+
+def combine_aggregate_row(pipeline_context, mappings_results: dict, where_: dict, target_topic: Topic):
+    pipeline_topic = pipeline_context.pipelineTopic
+    triggerable = pipeline_topic is None or pipeline_topic.kind != pipeline_constants.SYSTEM
+    if processor_settings.AGGREGATE_COMBINER_DURABILITY == COMBINER_DURABILITY_WINDOW:
+        window_flusher.start()
+        pending = window_combiner.combine(mappings_results, where_, target_topic, pipeline_context.pipeline.pipelineId,
+                                          pipeline_context.currentUser, pipeline_context.traceId, triggerable)
+        if pending >= processor_settings.AGGREGATE_COMBINER_MAX_EVENTS:
+            window_combiner.flush_and_trigger()
+    else:
+        if pipeline_context.aggregateCombiner is None:
+            pipeline_context.aggregateCombiner = AggregateCombiner()
+        pending = pipeline_context.aggregateCombiner.combine(mappings_results, where_, target_topic,
+                                                             pipeline_context.pipeline.pipelineId,
+                                                             pipeline_context.currentUser, pipeline_context.traceId,
+                                                             triggerable)
+        if pending >= processor_settings.AGGREGATE_COMBINER_MAX_EVENTS:
+            __flush_into_pipeline_context(pipeline_context)
+
+
+def __flush_into_pipeline_context(pipeline_context):
+    triggers = pipeline_context.aggregateCombiner.flush()
+    if processor_settings.AGGREGATE_COMBINER_TRIGGER == COMBINER_TRIGGER_FLUSH and triggers:
+        pipeline_context.pipeline_trigger_merge_list = [*pipeline_context.pipeline_trigger_merge_list, *triggers]
+
+
+def flush_pipeline_aggregate_combiner(pipeline_context):
+    """
+    flush deltas buffered by one pipeline run, the trigger data is merged into the pipeline context
+    """
+    if pipeline_context.aggregateCombiner is not None:
+        __flush_into_pipeline_context(pipeline_context)
+
+
+def flush_window_aggregate_combiner():
+    if window_combiner.pending() > 0:
+        window_combiner.flush_and_trigger()
@@ -2,6 +2,7 @@ import copy
 
 from model.model.pipeline.pipeline import UnitAction
 
+from watchmen.common.constants import pipeline_constants
 from watchmen.monitor.model.pipeline_monitor import UnitActionStatus
 from watchmen.pipeline.core.context.unit_context import UnitContext
 
@@ -33,6 +34,17 @@ class ActionContext:
     def get_pipeline_context(self):
         return self.unitContext.stageContext.pipelineContext
 
+    def get_topic(self, topic_id):
+        return self.unitContext.stageContext.pipelineContext.metadata.get_topic_by_id(topic_id)
+
+    def get_factor(self, factor_id, topic):
+        return self.unitContext.stageContext.pipelineContext.metadata.get_factor(factor_id, topic)
+
+    def is_triggerable(self):
+        # pipeline worker never triggers the data written by pipelines of system topic
+        pipeline_topic = self.unitContext.stageContext.pipelineContext.pipelineTopic
+        return pipeline_topic is None or pipeline_topic.kind is None or pipeline_topic.kind != pipeline_constants.SYSTEM
+
 
 def get_variables(action_context: ActionContext) -> dict:
     variables = copy.deepcopy(action_context.unitContext.stageContext.pipelineContext.variables)
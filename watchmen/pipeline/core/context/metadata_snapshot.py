@@ -0,0 +1,96 @@
+from contextvars import ContextVar
+from typing import Dict
+
+from model.model.pipeline.pipeline import Pipeline
+from model.model.topic.factor import Factor
+from model.model.topic.topic import Topic
+
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_id, get_topic_by_name
+
+
+class MetadataSnapshot:
+    """
+    topics and factors resolved once for one trigger, shared by all pipelines run by the trigger.
+    the pipelines see the same metadata even when it is changed by admin in the middle of the run.
+    """
+
+    def __init__(self, current_user=None):
+        self.currentUser = current_user
+        self.topicsById: Dict[str, Topic] = {}
+        self.topicsByName: Dict[str, Topic] = {}
+        self.factorsByTopicId: Dict[str, Dict[str, Factor]] = {}
+
+    def __add_topic(self, topic: Topic):
+        self.topicsById[topic.topicId] = topic
+        self.topicsByName[topic.name] = topic
+        self.factorsByTopicId[topic.topicId] = {factor.factorId: factor for factor in topic.factors}
+        return topic
+
+    def get_topic_by_id(self, topic_id) -> Topic:
+        topic = self.topicsById.get(topic_id)
+        if topic is None:
+            topic = get_topic_by_id(topic_id)
+            if topic is not None:
+                self.__add_topic(topic)
+        return topic
+
+    def get_topic_by_name(self, topic_name) -> Topic:
+        topic = self.topicsByName.get(topic_name)
+        if topic is None:
+            topic = get_topic_by_name(topic_name, self.currentUser)
+            if topic is not None:
+                self.__add_topic(topic)
+        return topic
+
+    def get_factor(self, factor_id, topic: Topic) -> Factor:
+        factors = self.factorsByTopicId.get(topic.topicId)
+        if factors is None:
+            self.__add_topic(topic)
+            factors = self.factorsByTopicId[topic.topicId]
+        return factors.get(factor_id)
+
+    def prepare(self, pipeline: Pipeline):
+        """
+        resolve the source topic and target topics of actions in advance
+        """
+        self.get_topic_by_id(pipeline.topicId)
+        for stage in pipeline.stages:
+            for unit in stage.units:
+                if unit.do is None:
+                    continue
+                for action in unit.do:
+                    topic_id = getattr(action, "topicId", None)
+                    if topic_id is not None:
+                        self.get_topic_by_id(topic_id)
+        return self
+
+
+__current_snapshot: ContextVar = ContextVar("metadata_snapshot", default=None)
+
+
+def activate_snapshot(snapshot: MetadataSnapshot):
+    return __current_snapshot.set(snapshot)
+
+
+def deactivate_snapshot(token):
+    __current_snapshot.reset(token)
+
+
+def find_topic_by_id(topic_id) -> Topic:
+    """
+    the topic in snapshot of running trigger, or from metadata cache when out of any trigger (eg. in dask worker)
+    """
+    snapshot = __current_snapshot.get()
+    if snapshot is None:
+        return get_topic_by_id(topic_id)
+    return snapshot.get_topic_by_id(topic_id)
+
+
+def find_factor(factor_id, topic: Topic) -> Factor:
+    snapshot = __current_snapshot.get()
+    if snapshot is None:
+        for factor in topic.factors:
+            if factor.factorId == factor_id:
+                return factor
+        return None
+    return snapshot.get_factor(factor_id, topic)
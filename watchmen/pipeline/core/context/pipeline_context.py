@@ -3,6 +3,7 @@ from model.model.pipeline.pipeline import Pipeline
 from model.model.topic.topic import Topic
 
 from watchmen.monitor.model.pipeline_monitor import PipelineRunStatus
+from watchmen.pipeline.core.context.metadata_snapshot import MetadataSnapshot
 
 
 class PipelineContext:
@@ -18,8 +19,10 @@ class PipelineContext:
     pipeline_trigger_merge_list = []
     currentUser: User = None
     traceId: str = None
+    aggregateCombiner = None
+    metadata: MetadataSnapshot = None
 
-    def __init__(self, pipeline, data, current_user, trace_id):
+    def __init__(self, pipeline, data, current_user, trace_id, metadata=None):
         self.traceId = trace_id
         self.pipeline = pipeline
         self.data = data
@@ -27,3 +30,5 @@ class PipelineContext:
         self.previousOfTriggerData = data.get("old")
         self.currentOfTriggerData = data.get("new")
         self.variables = {}
+        self.aggregateCombiner = None
+        self.metadata = metadata if metadata is not None else MetadataSnapshot(current_user)
@@ -1,7 +1,7 @@
 import datetime
 
 from watchmen.common.constants import pipeline_constants
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.pipeline.core.dependency.denpendence import Graph, add_edge, show_graph
 from watchmen.pipeline.core.dependency.graph.property import Property
 from watchmen.pipeline.core.dependency.graph.relationship import Relationship
@@ -1,6 +1,6 @@
 from model.model.topic.factor import Factor
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.pipeline.core.dependency.graph.label import Label
 from watchmen.pipeline.core.dependency.graph.node import Node
 from watchmen.pipeline.core.dependency.graph.property import Property
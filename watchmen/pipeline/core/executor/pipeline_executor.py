@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict
+
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import PIPELINE_RUNS_PENDING
+
+log = logging.getLogger("app." + __name__)
+
+
+class PipelineExecutorBusyError(Exception):
+    pass
+
+
+class PipelineExecutorNotStartedError(Exception):
+    pass
+
+
+class PipelineRun:
+    """
+    awaitable handle of a pipeline run scheduled on executor
+    """
+
+    def __init__(self, trace_id, tenant_id):
+        self.traceId = trace_id
+        self.tenantId = tenant_id
+        self.task = None
+        self.started = False
+        self.cancelRequested = False
+
+    def cancel(self) -> bool:
+        """
+        a run not started is never started. a started run is completed, pipelines cannot be interrupted in thread
+        """
+        self.cancelRequested = True
+        if self.started:
+            return False
+        self.task.cancel()
+        return True
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    def __await__(self):
+        return self.task.__await__()
+
+
+def execute_run(run: PipelineRun, func, args):
+    # started is set before checking cancellation, so cancel always knows whether the run is started
+    run.started = True
+    if run.cancelRequested:
+        raise asyncio.CancelledError()
+    return func(*args)
+
+
+class PipelineExecutor:
+    """
+    pipelines are synchronous, they are run on bounded threads to keep the event loop serving requests.
+    runs of one tenant are limited by a semaphore, so one tenant cannot occupy all threads.
+    """
+
+    def __init__(self, max_workers: int, tenant_concurrency: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.tenantConcurrency = tenant_concurrency
+        self.maxPending = max_pending
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.runs: Dict[str, PipelineRun] = {}
+        # event loop of server, coroutines started by pipelines in threads are run on it
+        self.loop = None
+
+    def start(self):
+        self.loop = asyncio.get_event_loop()
+
+    def get_semaphore(self, tenant_id) -> asyncio.Semaphore:
+        semaphore = self.semaphores.get(tenant_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.tenantConcurrency)
+            self.semaphores[tenant_id] = semaphore
+        return semaphore
+
+    def check_capacity(self):
+        if len(self.runs) >= self.maxPending:
+            raise PipelineExecutorBusyError("too many pipeline runs pending [{0}]".format(len(self.runs)))
+
+    def schedule(self, trace_id, tenant_id, func, *args) -> PipelineRun:
+        """
+        schedule func on executor in event loop, returns the handle without waiting
+        """
+        self.check_capacity()
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        run = PipelineRun(trace_id, tenant_id)
+        run.task = asyncio.ensure_future(self.execute(run, func, args))
+        key = id(run) if trace_id is None else trace_id
+        self.runs[key] = run
+        PIPELINE_RUNS_PENDING.set(len(self.runs))
+        run.task.add_done_callback(lambda task: self.finish(key, task))
+        return run
+
+    async def submit(self, trace_id, tenant_id, func, *args):
+        return await self.schedule(trace_id, tenant_id, func, *args)
+
+    async def execute(self, run: PipelineRun, func, args):
+        async with self.get_semaphore(run.tenantId):
+            if run.cancelRequested:
+                raise asyncio.CancelledError()
+            return await asyncio.get_event_loop().run_in_executor(self.executor, execute_run, run, func, args)
+
+    def finish(self, key, task):
+        self.runs.pop(key, None)
+        PIPELINE_RUNS_PENDING.set(len(self.runs))
+        if not task.cancelled() and task.exception() is not None:
+            # retrieved here, scheduled runs may never be awaited
+            log.error("pipeline run {0} failed: {1}".format(key, task.exception()))
+
+    def schedule_threadsafe(self, trace_id, tenant_id, func, *args) -> Future:
+        """
+        schedule func from threads out of event loop, eg. background flushers
+        """
+        if self.loop is None or self.loop.is_closed():
+            raise PipelineExecutorNotStartedError("pipeline executor is not started")
+        return asyncio.run_coroutine_threadsafe(self.submit(trace_id, tenant_id, func, *args), self.loop)
+
+    def find_run(self, trace_id) -> PipelineRun:
+        return self.runs.get(trace_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+pipeline_executor = PipelineExecutor(processor_settings.PIPELINE_EXECUTOR_WORKERS,
+                                     processor_settings.PIPELINE_TENANT_CONCURRENCY,
+                                     processor_settings.PIPELINE_EXECUTOR_MAX_PENDING)
+
+
+def get_pipeline_executor() -> PipelineExecutor:
+    return pipeline_executor
+
+
+def start_pipeline_executor():
+    pipeline_executor.start()
+
+
+def __log_coroutine_error(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        log.error("coroutine started by pipeline failed: {0}".format(future.exception()))
+
+
+def run_coroutine(coro):
+    """
+    run coroutine started by pipelines, eg. external writers and notifiers.
+    pipelines run in executor threads which have no event loop, the coroutine is passed to the loop of server then
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop = pipeline_executor.loop
+        if loop is None or loop.is_closed():
+            coro.close()
+            raise RuntimeError("no event loop to run coroutine started by pipeline")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        future.add_done_callback(__log_coroutine_error)
+        return future
+    return asyncio.ensure_future(coro)
+
+
+def shutdown_pipeline_executor():
+    pipeline_executor.shutdown()
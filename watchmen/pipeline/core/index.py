@@ -1,30 +1,39 @@
 import logging
+from typing import List
 
 from model.model.pipeline.trigger_type import TriggerType
 
+from watchmen.pipeline.core.context.metadata_snapshot import MetadataSnapshot
 from watchmen.pipeline.core.context.pipeline_context import PipelineContext
 from watchmen.pipeline.core.worker.pipeline_worker import run_pipeline
-from watchmen.pipeline.storage.pipeline_storage import load_pipeline_by_topic_id
-from watchmen.topic.storage.topic_schema_storage import get_topic
+from watchmen.pipeline.storage.pipeline_routing import find_pipelines_to_trigger
 
 log = logging.getLogger("app." + __name__)
 
 
-def __match_trigger_type(trigger_type, pipeline):
-    if trigger_type == TriggerType.insert and (pipeline.type == "insert-or-merge" or pipeline.type == "insert"):
-        return True
-    elif trigger_type == TriggerType.update and (pipeline.type == "insert-or-merge" or pipeline.type == "update"):
-        return True
-    elif trigger_type == TriggerType.delete and pipeline.type == "delete":
-        return True
-    else:
-        return False
+def trigger_pipeline_2(topic_name, instance, trigger_type: TriggerType, current_user=None, trace_id=None):
+    metadata = MetadataSnapshot(current_user)
+    topic = metadata.get_topic_by_name(topic_name)
+    # only the enabled pipelines of trigger type are routed
+    for pipeline in find_pipelines_to_trigger(topic.topicId, trigger_type, current_user):
+        pipeline_context = PipelineContext(pipeline, instance, current_user, trace_id, metadata.prepare(pipeline))
+        run_pipeline(pipeline_context,current_user)
 
 
-def trigger_pipeline_2(topic_name, instance, trigger_type: TriggerType, current_user=None, trace_id=None):
-    topic = get_topic(topic_name, current_user)
-    pipeline_list = load_pipeline_by_topic_id(topic.topicId, current_user)
-    for pipeline in pipeline_list:
-        if __match_trigger_type(trigger_type, pipeline):
-            pipeline_context = PipelineContext(pipeline, instance, current_user, trace_id)
-            run_pipeline(pipeline_context,current_user)
+def trigger_pipeline_batch_2(topic_name, instances: List, trigger_type: TriggerType, current_user=None,
+                             trace_ids: List = None):
+    """
+    instances of one topic share one snapshot and routing, pipelines are run for instances in order
+    """
+    metadata = MetadataSnapshot(current_user)
+    topic = metadata.get_topic_by_name(topic_name)
+    pipelines = find_pipelines_to_trigger(topic.topicId, trigger_type, current_user)
+    if not pipelines:
+        return
+    for pipeline in pipelines:
+        metadata.prepare(pipeline)
+    if trace_ids is None:
+        trace_ids = [None] * len(instances)
+    for instance, trace_id in zip(instances, trace_ids):
+        for pipeline in pipelines:
+            run_pipeline(PipelineContext(pipeline, instance, current_user, trace_id, metadata), current_user)
@@ -0,0 +1,254 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+from watchmen.common.utils.fast_json import json_loads, json_dumps
+
+log = logging.getLogger("app." + __name__)
+
+# length and crc32 of payload, a record with length 0 is the end of data in segment
+HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT = "checkpoint.json"
+LOCK = "journal.lock"
+DEAD_LETTER = "dead-letter.jsonl"
+DEAD_LETTER_REPLAY = "dead-letter-replay.jsonl"
+WORKER_PREFIX = "worker-"
+
+
+def segment_name(sequence: int) -> str:
+    return "{0}{1:010d}{2}".format(SEGMENT_PREFIX, sequence, SEGMENT_SUFFIX)
+
+
+class Segment:
+    """
+    a preallocated file mapped into memory, records are appended until it is full
+    """
+
+    def __init__(self, path: str, sequence: int, size: int):
+        self.path = path
+        self.sequence = sequence
+        exists = os.path.exists(path)
+        self.file = open(path, "r+b" if exists else "w+b")
+        if not exists or os.path.getsize(path) < size:
+            self.file.truncate(size)
+        self.size = os.path.getsize(path)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    def read(self, offset: int) -> Tuple[Optional[bytes], int]:
+        """
+        returns the payload at offset and the offset of next record, payload is None at the end of data
+        """
+        if offset + HEADER.size > self.size:
+            return None, offset
+        length, crc = HEADER.unpack_from(self.map, offset)
+        if length == 0 or offset + HEADER.size + length > self.size:
+            return None, offset
+        start = offset + HEADER.size
+        payload = bytes(self.map[start:start + length])
+        if zlib.crc32(payload) != crc:
+            # torn record of a crash, the data ends here
+            return None, offset
+        return payload, start + length
+
+    def write(self, offset: int, payload: bytes, sync: bool) -> int:
+        start = offset + HEADER.size
+        self.map[start:start + len(payload)] = payload
+        # header is written at last, readers never see a record partially written
+        HEADER.pack_into(self.map, offset, len(payload), zlib.crc32(payload))
+        end = start + len(payload)
+        if sync:
+            aligned = offset - offset % mmap.PAGESIZE
+            self.map.flush(aligned, end - aligned)
+        return end
+
+    def fits(self, offset: int, payload: bytes) -> bool:
+        return offset + HEADER.size * 2 + len(payload) <= self.size
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class IngestionJournal:
+    """
+    append only journal of accepted events on local disk, in segments mapped into memory.
+    the checkpoint is the position of the first event not drained, events after it are drained again after crash.
+    the directory is locked, it must not be shared by worker processes, see open_worker_journal.
+    """
+
+    def __init__(self, directory: str, segment_size: int, sync: bool = True):
+        self.directory = directory
+        self.segmentSize = segment_size
+        self.sync = sync
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.lockFile = open(os.path.join(directory, LOCK), "w")
+        try:
+            fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lockFile.close()
+            raise
+        self.segments = {}
+        self.checkpoint = self.__load_checkpoint()
+        sequences = self.__list_sequences()
+        self.writeSequence = sequences[-1] if sequences else self.checkpoint[0]
+        self.writeOffset = self.__find_end(self.__get_segment(self.writeSequence))
+        self.depth = self.__count_from(self.checkpoint)
+
+    def __list_sequences(self) -> List[int]:
+        sequences = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                sequences.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(sequences)
+
+    def __load_checkpoint(self) -> Tuple[int, int]:
+        path = os.path.join(self.directory, CHECKPOINT)
+        if not os.path.exists(path):
+            return 0, 0
+        with open(path, "r") as file:
+            checkpoint = json.load(file)
+        return checkpoint["segment"], checkpoint["offset"]
+
+    def __get_segment(self, sequence: int) -> Segment:
+        with self.lock:
+            segment = self.segments.get(sequence)
+            if segment is None:
+                segment = Segment(os.path.join(self.directory, segment_name(sequence)), sequence, self.segmentSize)
+                self.segments[sequence] = segment
+            return segment
+
+    @staticmethod
+    def __find_end(segment: Segment) -> int:
+        offset = 0
+        while True:
+            payload, next_offset = segment.read(offset)
+            if payload is None:
+                return offset
+            offset = next_offset
+
+    def __count_from(self, position: Tuple[int, int]) -> int:
+        count = 0
+        while True:
+            records, position = self.read(position, 10000)
+            if not records:
+                return count
+            count = count + len(records)
+
+    def append(self, record: dict):
+        payload = json_dumps(record)
+        with self.lock:
+            segment = self.__get_segment(self.writeSequence)
+            if not segment.fits(self.writeOffset, payload):
+                if self.writeOffset == 0:
+                    raise ValueError("event of {0} bytes is too large for journal".format(len(payload)))
+                self.writeSequence = self.writeSequence + 1
+                self.writeOffset = 0
+                segment = self.__get_segment(self.writeSequence)
+            self.writeOffset = segment.write(self.writeOffset, payload, self.sync)
+            self.depth = self.depth + 1
+
+    def read(self, position: Tuple[int, int], limit: int) -> Tuple[List[dict], Tuple[int, int]]:
+        """
+        returns records from position, and the position after them
+        """
+        sequence, offset = position
+        records = []
+        while len(records) < limit:
+            if sequence > self.writeSequence:
+                break
+            payload, next_offset = self.__get_segment(sequence).read(offset)
+            if payload is None:
+                if sequence < self.writeSequence:
+                    sequence, offset = sequence + 1, 0
+                    continue
+                break
+            records.append(json_loads(payload))
+            offset = next_offset
+        return records, (sequence, offset)
+
+    def commit(self, position: Tuple[int, int], count: int):
+        """
+        move checkpoint after drained records, segments before checkpoint are removed
+        """
+        path = os.path.join(self.directory, CHECKPOINT)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"segment": position[0], "offset": position[1]}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        with self.lock:
+            self.checkpoint = position
+            self.depth = max(0, self.depth - count)
+            for sequence in self.__list_sequences():
+                if sequence >= position[0]:
+                    break
+                segment = self.segments.pop(sequence, None)
+                if segment is not None:
+                    segment.close()
+                os.remove(os.path.join(self.directory, segment_name(sequence)))
+
+    def dead_letter(self, records: List[dict]):
+        """
+        keep records which can not be drained in dead letter file, they are not lost when checkpoint is moved
+        """
+        with self.lock:
+            with open(os.path.join(self.directory, DEAD_LETTER), "ab") as file:
+                for record in records:
+                    file.write(json_dumps(record) + b"\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def take_dead_letters(self) -> List[dict]:
+        """
+        records of dead letter file to replay, they are kept in replay file until finish_dead_letters.
+        records of replay left by a crash are taken again
+        """
+        path = os.path.join(self.directory, DEAD_LETTER)
+        replay_path = os.path.join(self.directory, DEAD_LETTER_REPLAY)
+        with self.lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(path):
+                    return []
+                os.replace(path, replay_path)
+            with open(replay_path, "rb") as file:
+                return [json_loads(line) for line in file if line.strip()]
+
+    def finish_dead_letters(self):
+        """
+        records failed again in replay are in dead letter file already
+        """
+        with self.lock:
+            replay_path = os.path.join(self.directory, DEAD_LETTER_REPLAY)
+            if os.path.exists(replay_path):
+                os.remove(replay_path)
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments.values():
+                segment.close()
+            self.segments = {}
+        fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_UN)
+        self.lockFile.close()
+
+
+def open_worker_journal(directory: str, segment_size: int, sync: bool = True) -> IngestionJournal:
+    """
+    each worker process opens its own journal, in the first sub directory not locked by other workers.
+    a restarted worker takes over the journal left by the stopped one, and drains its events.
+    """
+    index = 0
+    while True:
+        try:
+            return IngestionJournal(os.path.join(directory, "{0}{1}".format(WORKER_PREFIX, index)), segment_size, sync)
+        except BlockingIOError:
+            index = index + 1
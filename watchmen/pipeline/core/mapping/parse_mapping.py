@@ -1,6 +1,7 @@
 from model.model.topic.factor import Factor
 from model.model.topic.topic import Topic
 
+from watchmen.pipeline.core.context.metadata_snapshot import find_factor
 from watchmen.pipeline.core.parameter.parse_parameter import parse_parameter
 from watchmen.pipeline.core.parameter.utils import check_and_convert_value_by_factor
 
@@ -38,7 +39,10 @@ def parse_mappings(mappings, target_topic, previous_data, current_data, variable
                 result = {target_factor.name: {"_count": 0}}
             having_aggregate_functions = True
         elif arithmetic == "avg":
-            result = {target_factor.name: {"_avg": current_value_}}
+            # deltas of sum and count, the average is computed with the state kept in aggregate_assist_
+            previous_value_ = None if previous_data is None else check_and_convert_value_by_factor(
+                target_factor, parse_parameter(source, previous_data, variables))
+            result = {target_factor.name: {"_avg": compute_avg_delta(previous_value_, current_value_)}}
             having_aggregate_functions = True
 
         mappings_results.update(result)
@@ -47,6 +51,18 @@ def parse_mappings(mappings, target_topic, previous_data, current_data, variable
 
 
 def get_factor(factor_id, target_topic: Topic) -> Factor:
-    for factor in target_topic.factors:
-        if factor.factorId == factor_id:
-            return factor
+    return find_factor(factor_id, target_topic)
+
+
+def compute_avg_delta(previous_value_, current_value_) -> dict:
+    """
+    as avg of sql, null values are not counted. previous value is None when it is null or there is no previous data
+    """
+    if previous_value_ is None and current_value_ is None:
+        return {"_sum": 0, "_count": 0}
+    elif previous_value_ is None:
+        return {"_sum": current_value_, "_count": 1}
+    elif current_value_ is None:
+        return {"_sum": -previous_value_, "_count": -1}
+    else:
+        return {"_sum": current_value_ - previous_value_, "_count": 0}
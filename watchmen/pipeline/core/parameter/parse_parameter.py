@@ -3,7 +3,7 @@ from decimal import Decimal
 from typing import List
 from model.model.report.column import Operator
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen_boot.utils.date_func import parsing_and_formatting, YEAR, MONTH, WEEK_OF_YEAR, DAY_OF_WEEK, WEEK_OF_MONTH, \
     QUARTER, HALF_YEAR, DAY_OF_MONTH
 
@@ -20,15 +20,14 @@ from watchmen.pipeline.core.parameter.operator.more_equals import do_more_equals
 from watchmen.pipeline.core.parameter.operator.not_equals import do_not_equals_with_value_type_check
 from watchmen.pipeline.core.parameter.operator.not_in_operator import do_not_in_with_value_type_check
 from watchmen.pipeline.core.parameter.utils import cal_factor_value, convert_datetime, check_and_convert_value_by_factor
-from watchmen.pipeline.utils.units_func import get_factor
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+from watchmen.pipeline.core.context.metadata_snapshot import find_topic_by_id, find_factor
 
 
 def parse_parameter(parameter_: Parameter, instance, variables):
     if parameter_.kind == "topic":
-        topic = get_topic_by_id(parameter_.topicId)
+        topic = find_topic_by_id(parameter_.topicId)
         topic_name = build_collection_name(topic.name)
-        factor = get_factor(parameter_.factorId, topic)
+        factor = find_factor(parameter_.factorId, topic)
         value_ = cal_factor_value(instance, factor)
         return check_and_convert_value_by_factor(factor, value_)
     elif parameter_.kind == 'constant':
@@ -30,7 +30,8 @@ def run_action(action_context: ActionContext):
     try:
         action_run_status, trigger_pipeline_data_list = func()
         action_context.actionStatus = action_run_status
-        return action_context, trigger_pipeline_data_list
+        # no trigger data is built when there is no pipeline to trigger
+        return action_context, [trigger_data for trigger_data in trigger_pipeline_data_list if trigger_data is not None]
     except Exception as e:
         log.error(traceback.format_exc())
         raise e
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import time
 import traceback
@@ -9,18 +8,19 @@ from model.model.pipeline.trigger_type import TriggerType
 
 import watchmen
 from watchmen.common.constants import pipeline_constants
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import get_id_name_by_datasource
 from watchmen_boot.config.config import settings
 from watchmen.database.datasource.container import data_source_container
 from watchmen.monitor.model.pipeline_monitor import PipelineRunStatus, StageRunStatus
 from watchmen.monitor.services import pipeline_monitor_service
+from watchmen.pipeline.core.combiner.aggregate_combiner import flush_pipeline_aggregate_combiner
+from watchmen.pipeline.core.context.metadata_snapshot import activate_snapshot, deactivate_snapshot
 from watchmen.pipeline.core.context.pipeline_context import PipelineContext
 from watchmen.pipeline.core.context.stage_context import StageContext
 from watchmen.pipeline.core.parameter.parse_parameter import parse_parameter_joint
 from watchmen.pipeline.core.worker.stage_worker import run_stage
 from watchmen.pipeline.utils.constants import PIPELINE_UID, FINISHED, ERROR
-from watchmen.topic.storage.topic_schema_storage import get_topic_by_id, get_topic_by_name
 
 log = logging.getLogger("app." + __name__)
 
@@ -44,12 +44,12 @@ def __merge_pipeline_data(pipeline_trigger_merge_list):
     return merge_context
 
 
-def __trigger_all_pipeline(pipeline_trigger_merge_list, current_user=None, trace_id=None):
+def __trigger_all_pipeline(pipeline_trigger_merge_list, current_user=None, trace_id=None, metadata=None):
     after_merge_list = __merge_pipeline_data(pipeline_trigger_merge_list)
 
     for topic_name, item in after_merge_list.items():
         merge_data = {}
-        topic = get_topic_by_name(topic_name,current_user)
+        topic = metadata.get_topic_by_name(topic_name)
         if TriggerType.update.value in item:
             for update_data in item[TriggerType.update.value]:
                 old_value = update_data[pipeline_constants.OLD]
@@ -79,8 +79,12 @@ def should_run(pipeline_context: PipelineContext) -> bool:
     return parse_parameter_joint(pipeline.on, current_data, variables)
 
 
-async def sync_pipeline_monitor_log(pipeline_status):
-    pipeline_monitor_service.sync_pipeline_monitor_data(pipeline_status)
+def sync_pipeline_monitor_log(pipeline_status):
+    # saved in the thread running pipeline, a failed monitor never stops the pipelines left of trigger
+    try:
+        pipeline_monitor_service.sync_pipeline_monitor_data(pipeline_status)
+    except Exception as e:
+        log.error("save monitor of pipeline {0} failed: {1}".format(pipeline_status.pipelineName, e))
 
 
 # noinspection PyBroadException
@@ -98,14 +102,18 @@ def run_pipeline(pipeline_context: PipelineContext,current_user):
         raise Exception("pipeline_context currentUser is None")
 
     if pipeline.enabled:
-        pipeline_topic = get_topic_by_id(pipeline.topicId)
+        metadata = pipeline_context.metadata.prepare(pipeline)
+        pipeline_topic = metadata.get_topic_by_id(pipeline.topicId)
         pipeline_status.pipelineTopicName = pipeline_topic.name
-        pipeline_context = PipelineContext(pipeline, data, pipeline_context.currentUser, pipeline_context.traceId)
+        pipeline_context = PipelineContext(pipeline, data, pipeline_context.currentUser, pipeline_context.traceId,
+                                           metadata)
         pipeline_context.variables[PIPELINE_UID] = pipeline_status.uid
         pipeline_context.pipelineTopic = pipeline_topic
         pipeline_context.pipelineStatus = pipeline_status
         start = time.time()
         if should_run(pipeline_context):
+            # topic parameters in expressions are resolved by the snapshot as well
+            snapshot_token = activate_snapshot(metadata)
             # noinspection PyBroadException
             try:
                 for stage in pipeline.stages:
@@ -114,6 +122,7 @@ def run_pipeline(pipeline_context: PipelineContext,current_user):
                     stage_run_status.name = stage.name
                     run_stage(stage_context, stage_run_status)
                     pipeline_status.stages.append(stage_context.stageStatus)
+                flush_pipeline_aggregate_combiner(pipeline_context)
 
                 elapsed_time = time.time() - start
                 pipeline_status.completeTime = elapsed_time
@@ -121,17 +130,24 @@ def run_pipeline(pipeline_context: PipelineContext,current_user):
                 log.info("run pipeline \"{0}\" spend time \"{1}\" ".format(pipeline.name, elapsed_time))
                 if pipeline_topic.kind is None or pipeline_topic.kind != pipeline_constants.SYSTEM:
                     __trigger_all_pipeline(pipeline_context.pipeline_trigger_merge_list, pipeline_context.currentUser,
-                                           pipeline_context.traceId)
+                                           pipeline_context.traceId, metadata)
             except Exception as e:
                 trace = traceback.format_exc()
                 log.error(trace)
                 pipeline_status.error = trace
                 pipeline_status.status = ERROR
+                if pipeline_context.aggregateCombiner is not None and pipeline_context.aggregateCombiner.pending() > 0:
+                    # keep the deltas of processed events, downstream pipelines are not triggered for a failed run
+                    try:
+                        pipeline_context.aggregateCombiner.flush()
+                    except Exception:
+                        log.error(traceback.format_exc())
             finally:
+                deactivate_snapshot(snapshot_token)
                 if settings.PIPELINE_MONITOR_ON:
                     if pipeline_topic.kind is not None and pipeline_topic.kind == pipeline_constants.SYSTEM:
                         log.debug("pipeline_status is {0}".format(pipeline_status))
                     else:
-                        asyncio.ensure_future(sync_pipeline_monitor_log(pipeline_status))
+                        sync_pipeline_monitor_log(pipeline_status)
                 else:
                     log.info("pipeline {0} status is {1}".format(pipeline.name, pipeline_status.status))
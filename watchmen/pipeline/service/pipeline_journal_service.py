@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+import traceback
+from typing import List
+
+from model.model.common.user import User
+
+from watchmen.collection.model.topic_event import TopicEvent
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import PIPELINE_JOURNAL_DEPTH, PIPELINE_JOURNAL_AGE
+from watchmen.pipeline.core.journal.ingestion_journal import IngestionJournal, open_worker_journal
+from watchmen.pipeline.service.pipeline_service import save_topic_data_batch, run_pipeline_batch, get_input_data
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_name_and_tenant_id
+
+log = logging.getLogger("app." + __name__)
+
+TRACE_ID = "trace_id"
+ACCEPTED_AT = "accepted_at"
+EVENT = "event"
+USER = "user"
+# stage failed of dead letter record, pipelines are run only when replaying records failed in pipeline stage
+FAILED_STAGE = "failed_stage"
+SAVE = "save"
+PIPELINE = "pipeline"
+
+
+def split_journal_runs(records: List[dict]) -> List[List[dict]]:
+    """
+    consecutive records with same topic code, user and failed stage are drained as one batch,
+    the order of records is kept
+    """
+    runs = []
+    for record in records:
+        key = (record[EVENT].get("code"), record[USER].get("name"), record[USER].get("tenantId"),
+               record.get(FAILED_STAGE))
+        if runs and runs[-1][0] == key:
+            runs[-1][1].append(record)
+        else:
+            runs.append((key, [record]))
+    return [run for _, run in runs]
+
+
+def __parse_run(records: List[dict]):
+    return User.parse_obj(records[0][USER]), [TopicEvent.parse_obj(record[EVENT]) for record in records]
+
+
+def save_journal_run(records: List[dict]):
+    current_user, topic_events = __parse_run(records)
+    code = topic_events[0].code
+    topic = get_topic_by_name_and_tenant_id(code, current_user.tenantId)
+    if topic is None:
+        raise Exception(f"{code} topic name does not exist")
+    save_topic_data_batch(topic, [get_input_data(topic, topic_event) for topic_event in topic_events], current_user)
+
+
+async def run_journal_pipelines(records: List[dict]):
+    current_user, topic_events = __parse_run(records)
+    await run_pipeline_batch(topic_events[0].code, topic_events, current_user,
+                             [record[TRACE_ID] for record in records])
+
+
+class JournalDrainer:
+    """
+    drain journaled events in batches, raw rows are saved once and pipelines are run, then checkpoint is moved.
+    pipelines are retried alone when they fail after raw rows are saved.
+    events drained before crash and not checkpointed are drained again, so raw rows may be duplicated.
+    events failed more than max retries are moved to dead letter file of journal, with the stage failed.
+    """
+
+    def __init__(self, journal: IngestionJournal, save_run=save_journal_run, run_pipelines=run_journal_pipelines):
+        self.journal = journal
+        self.saveRun = save_run
+        self.runPipelines = run_pipelines
+        self.running = True
+
+    async def run(self):
+        while self.running:
+            try:
+                drained = await self.drain_once()
+            except Exception:
+                log.error(traceback.format_exc())
+                drained = 0
+            if drained == 0:
+                await asyncio.sleep(processor_settings.PIPELINE_JOURNAL_DRAIN_INTERVAL)
+
+    def stop(self):
+        self.running = False
+
+    async def drain_once(self) -> int:
+        loop = asyncio.get_event_loop()
+        records, position = await loop.run_in_executor(None, self.journal.read, self.journal.checkpoint,
+                                                       processor_settings.PIPELINE_JOURNAL_DRAIN_BATCH)
+        PIPELINE_JOURNAL_DEPTH.set(self.journal.depth)
+        PIPELINE_JOURNAL_AGE.set(time.time() - records[0][ACCEPTED_AT] if records else 0)
+        if not records:
+            return 0
+        for run in split_journal_runs(records):
+            await self.drain_run(run)
+        await loop.run_in_executor(None, self.journal.commit, position, len(records))
+        PIPELINE_JOURNAL_DEPTH.set(self.journal.depth)
+        return len(records)
+
+    async def drain_run(self, records: List[dict], saved: bool = False):
+        loop = asyncio.get_event_loop()
+        retries = 0
+        while True:
+            try:
+                if not saved:
+                    await loop.run_in_executor(None, self.saveRun, records)
+                    saved = True
+                await self.runPipelines(records)
+                return
+            except Exception:
+                retries = retries + 1
+                log.error("{0} of {1} journaled events failed {2} times: {3}".format(
+                    PIPELINE if saved else SAVE, len(records), retries, traceback.format_exc()))
+                if retries > processor_settings.CONNECTOR_MAX_RETRIES:
+                    stage = PIPELINE if saved else SAVE
+                    # checkpoint is not moved when dead letter is not written
+                    await loop.run_in_executor(None, self.journal.dead_letter,
+                                               [{**record, FAILED_STAGE: stage} for record in records])
+                    log.error("move journaled events of trace ids {0} failed in {1} to dead letter".format(
+                        [record[TRACE_ID] for record in records], stage))
+                    return
+                await asyncio.sleep(processor_settings.CONNECTOR_RETRY_BACKOFF * (2 ** (retries - 1)))
+
+    async def replay_dead_letters(self) -> int:
+        """
+        drain records of dead letter file again, raw rows of records failed in pipeline stage are not saved again.
+        records failed again are moved to dead letter file again
+        """
+        loop = asyncio.get_event_loop()
+        records = await loop.run_in_executor(None, self.journal.take_dead_letters)
+        for run in split_journal_runs(records):
+            saved = run[0].get(FAILED_STAGE) == PIPELINE
+            await self.drain_run([{key: value for key, value in record.items() if key != FAILED_STAGE}
+                                  for record in run], saved)
+        await loop.run_in_executor(None, self.journal.finish_dead_letters)
+        return len(records)
+
+
+pipeline_journal: IngestionJournal = None
+journal_drainer: JournalDrainer = None
+
+
+def pipeline_journal_enabled() -> bool:
+    return pipeline_journal is not None
+
+
+async def journal_topic_event(topic_event: TopicEvent, current_user: User, trace_id):
+    """
+    the event is durable when returned, raw row is saved and pipelines are run by drainer later
+    """
+    record = {TRACE_ID: trace_id, ACCEPTED_AT: time.time(), EVENT: topic_event.dict(),
+              USER: current_user.dict(exclude={"password"})}
+    await asyncio.get_event_loop().run_in_executor(None, pipeline_journal.append, record)
+    PIPELINE_JOURNAL_DEPTH.set(pipeline_journal.depth)
+
+
+def start_pipeline_journal():
+    """
+    open journal and start drainer in event loop, events left by last run are drained first
+    """
+    global pipeline_journal, journal_drainer
+    if not processor_settings.PIPELINE_JOURNAL_ON:
+        return
+    pipeline_journal = open_worker_journal(processor_settings.PIPELINE_JOURNAL_DIR,
+                                           processor_settings.PIPELINE_JOURNAL_SEGMENT_SIZE,
+                                           processor_settings.PIPELINE_JOURNAL_SYNC)
+    log.info("pipeline journal {0} is opened with {1} events to drain".format(pipeline_journal.directory,
+                                                                             pipeline_journal.depth))
+    journal_drainer = JournalDrainer(pipeline_journal)
+    asyncio.ensure_future(journal_drainer.run())
+
+
+def stop_pipeline_journal():
+    # events not drained are kept in journal, they are drained at next start
+    if journal_drainer is not None:
+        journal_drainer.stop()
+    if pipeline_journal is not None:
+        pipeline_journal.close()
+
+
+async def replay_pipeline_dead_letters() -> int:
+    """
+    replay dead letters of journal of this worker process
+    """
+    if journal_drainer is None:
+        return 0
+    return await journal_drainer.replay_dead_letters()
@@ -1,22 +1,43 @@
+import asyncio
+from typing import List
+
 from model.model.pipeline.trigger_type import TriggerType
 
 from watchmen.common.constants import pipeline_constants
-from watchmen.common.utils.data_utils import is_raw
+from watchmen.common.utils.data_utils import is_raw, add_tenant_id_to_instance
 from watchmen.database.topic_utils import get_flatten_field
-from watchmen.pipeline.index import trigger_pipeline
+from watchmen.pipeline.core.executor.pipeline_executor import get_pipeline_executor, PipelineRun
+from watchmen.pipeline.index import trigger_pipeline, trigger_pipeline_batch
 from watchmen.pipeline.utils.units_func import INSERT, add_audit_columns, convert_datetime, DATETIME, FULL_DATETIME
-from watchmen.topic.storage.topic_data_storage import save_topic_instance
+from watchmen.topic.storage.topic_data_storage import save_topic_instance, save_topic_instances
 
 
 async def save_topic_data(topic, data, current_user):
+    # storage is synchronous, save in thread to keep event loop serving requests
+    await asyncio.get_event_loop().run_in_executor(None, save_topic_data_now, topic, data, current_user)
+
+
+def save_topic_data_now(topic, data, current_user):
+    data = build_topic_data(topic, data)
+    save_topic_instance(topic, data, current_user)
+
+
+def save_topic_data_batch(topic, data_list: List, current_user):
+    """
+    rows of one topic are saved by one bulk insert
+    """
+    save_topic_instances(topic, [add_tenant_id_to_instance(build_topic_data(topic, data), current_user)
+                                 for data in data_list])
+
+
+def build_topic_data(topic, data):
     add_audit_columns(data, INSERT)
     if is_raw(topic):
         flatten_fields = get_flatten_field(data["data_"], topic.factors)
         data.update(flatten_fields)
     else:
         data = process_factor_format(topic,data)
-
-    save_topic_instance(topic, data, current_user)
+    return data
 
 
 def process_factor_format(topic,data):
@@ -46,5 +67,21 @@ def get_input_data(topic, topic_event):
 
 
 async def run_pipeline(topic_event, current_user, trace_id=None):
-    trigger_pipeline(topic_event.code, {pipeline_constants.NEW: topic_event.data, pipeline_constants.OLD: None},
-                     TriggerType.insert, current_user, trace_id)
+    await schedule_pipeline(topic_event, current_user, trace_id)
+
+
+def schedule_pipeline(topic_event, current_user, trace_id=None) -> PipelineRun:
+    """
+    run pipelines on pipeline executor, returns the awaitable handle
+    """
+    return get_pipeline_executor().schedule(trace_id, current_user.tenantId, trigger_pipeline, topic_event.code,
+                                            {pipeline_constants.NEW: topic_event.data, pipeline_constants.OLD: None},
+                                            TriggerType.insert, current_user, trace_id)
+
+
+async def run_pipeline_batch(topic_code, topic_events: List, current_user, trace_ids: List = None):
+    await get_pipeline_executor().submit(trace_ids[0] if trace_ids else None, current_user.tenantId,
+                                         trigger_pipeline_batch, topic_code,
+                                         [{pipeline_constants.NEW: topic_event.data, pipeline_constants.OLD: None}
+                                          for topic_event in topic_events],
+                                         TriggerType.insert, current_user, trace_ids)
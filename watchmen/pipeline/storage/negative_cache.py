@@ -0,0 +1,317 @@
+import hashlib
+import logging
+import math
+import threading
+from decimal import Decimal
+from typing import Dict, Optional
+
+from cacheout import LRUCache
+from model.model.topic.topic import Topic
+
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+
+log = logging.getLogger("app." + __name__)
+
+TENANT_ID = "tenant_id_"
+# factor types which values written and values in conditions are converted to same type, see
+# check_and_convert_value_by_factor. datetime is not, formats of it differ between rows and conditions
+INTEGER_FACTOR_TYPES = ["sequence", "number", "unsigned", "year", "month"]
+TEXT_FACTOR_TYPES = ["text"]
+
+
+class BloomFilter:
+    """
+    bits of keys added, a key not in filter is never added. a key in filter might not be added,
+    with probability of error rate when the number of keys is within capacity
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashCount = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashCount)]
+
+    def add(self, key: str):
+        for position in self.__positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, key: str) -> bool:
+        for position in self.__positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def __normalize_value(factor_type: str, value) -> Optional[str]:
+    """
+    None when the value is not compared by database as it is normalized, the key of it is not exact
+    """
+    if factor_type in INTEGER_FACTOR_TYPES:
+        # decimal places of number columns might round values away, only integral values are exact
+        if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+            return None
+        if isinstance(value, int):
+            return str(value)
+        if not math.isfinite(value) or value != int(value):
+            return None
+        return str(int(value))
+    if factor_type in TEXT_FACTOR_TYPES and processor_settings.NEGATIVE_CACHE_TEXT_KEYS:
+        return value if isinstance(value, str) else None
+    return None
+
+
+def build_key(factor_types: tuple, values) -> Optional[str]:
+    normalized = [__normalize_value(factor_type, value) for factor_type, value in zip(factor_types, values)]
+    if any(value is None for value in normalized):
+        return None
+    return "\x1f".join(normalized)
+
+
+def find_factor_types(topic: Topic, columns: tuple) -> Optional[tuple]:
+    """
+    types of factors of key columns, None when any of them has no exact key
+    """
+    factors = {factor.name: factor for factor in topic.factors or []}
+    factor_types = tuple(factors[column].type if column in factors else None for column in columns)
+    if all(factor_type in INTEGER_FACTOR_TYPES or (
+            factor_type in TEXT_FACTOR_TYPES and processor_settings.NEGATIVE_CACHE_TEXT_KEYS)
+           for factor_type in factor_types):
+        return factor_types
+    return None
+
+
+def __collect_equalities(where_, equalities: dict) -> bool:
+    for name, condition in where_.items():
+        if name == TENANT_ID:
+            continue
+        if name == "and":
+            for sub_where in condition:
+                if not isinstance(sub_where, dict) or not __collect_equalities(sub_where, equalities):
+                    return False
+            continue
+        if name == "or" or not isinstance(condition, dict) or list(condition.keys()) != ["="]:
+            return False
+        value = condition["="]
+        if value is None or isinstance(value, (dict, list)) or name in equalities:
+            return False
+        equalities[name] = value
+    return True
+
+
+def find_equality_key(where_, topic: Topic) -> Optional[tuple]:
+    """
+    returns (columns, factor types, key) when where_ is only equality conditions joint by "and",
+    on columns with exact keys. otherwise None.
+    """
+    equalities = {}
+    if not isinstance(where_, dict) or not __collect_equalities(where_, equalities) or not equalities:
+        return None
+    columns = tuple(sorted(equalities.keys()))
+    factor_types = find_factor_types(topic, columns)
+    if factor_types is None:
+        return None
+    key = build_key(factor_types, [equalities[column] for column in columns])
+    if key is None:
+        return None
+    return columns, factor_types, key
+
+
+class NegativeCache:
+    """
+    keys known not exist in topic for one tenant, by one group of key columns.
+
+    the bloom filter holds keys exist, it is trusted only after topic is pre-scanned,
+    so a key not in filter is absent. the lru holds keys just missed by lookup.
+    inserted keys are added to filter and removed from lru.
+    when a row has key values which are not exact, the cache never reports absent again.
+    """
+
+    def __init__(self, topic_name: str, columns: tuple, factor_types: tuple):
+        self.name = "negative:" + topic_name
+        self.columns = columns
+        self.factorTypes = factor_types
+        self.bloom = BloomFilter(processor_settings.NEGATIVE_CACHE_CAPACITY,
+                                 processor_settings.NEGATIVE_CACHE_ERROR_RATE)
+        self.misses = LRUCache(maxsize=processor_settings.NEGATIVE_CACHE_MISS_SIZE)
+        self.prescanned = False
+        self.exact = True
+        self.version = 0
+        # keys of rows inserted during pre-scan, added to filter when pre-scan is done
+        self.pending = None
+        self.lock = threading.Lock()
+        self.scanLock = threading.Lock()
+
+    def is_absent(self, key: str) -> bool:
+        absent = self.exact and (self.misses.has(key) or (self.prescanned and not self.bloom.might_contain(key)))
+        if absent:
+            CACHE_HIT.labels(self.name).inc()
+        else:
+            CACHE_MISS.labels(self.name).inc()
+        return absent
+
+    def add_miss(self, key: str, version: int):
+        with self.lock:
+            # a row is inserted during lookup
+            if version != self.version:
+                return
+            self.misses.set(key, True)
+
+    def __find_row_key(self, row: dict):
+        """
+        False when row has no key, it never matches equality conditions
+        """
+        values = [row.get(column) for column in self.columns]
+        if any(value is None for value in values):
+            return False
+        return build_key(self.factorTypes, values)
+
+    def add_row(self, row: dict):
+        key = self.__find_row_key(row)
+        if key is False:
+            return
+        with self.lock:
+            self.version = self.version + 1
+            if key is None:
+                self.exact = False
+                self.misses.clear()
+            elif self.pending is not None:
+                self.pending.append(key)
+                self.misses.delete(key)
+            else:
+                self.bloom.add(key)
+                self.misses.delete(key)
+
+    def prescan(self, scan_keys) -> Optional[int]:
+        """
+        scans keys once, callers of same cache wait for the first one. returns None when it is scanned already
+        """
+        with self.scanLock:
+            if self.prescanned:
+                return None
+            with self.lock:
+                self.pending = []
+            bloom = BloomFilter(processor_settings.NEGATIVE_CACHE_CAPACITY,
+                                processor_settings.NEGATIVE_CACHE_ERROR_RATE)
+            exact = True
+            count = 0
+            try:
+                for row in scan_keys(self.columns):
+                    key = self.__find_row_key(row)
+                    if key is None:
+                        exact = False
+                    elif key is not False:
+                        bloom.add(key)
+                    count = count + 1
+            except Exception:
+                with self.lock:
+                    for key in self.pending:
+                        self.bloom.add(key)
+                    self.pending = None
+                raise
+            with self.lock:
+                for key in self.pending:
+                    bloom.add(key)
+                self.pending = None
+                self.bloom = bloom
+                self.exact = self.exact and exact
+                self.prescanned = True
+            return count
+
+
+class NegativeCacheManager:
+    """
+    negative caches by (topic, key columns, tenant), for batch and replay workers.
+
+    it assumes current worker is the only writer of target topics during the batch,
+    rows inserted by others are not seen until the caches are cleared.
+    """
+
+    def __init__(self):
+        self.caches: Dict[str, Dict[tuple, NegativeCache]] = {}
+        self.lock = threading.RLock()
+
+    def get_cache(self, topic: Topic, columns: tuple, factor_types: tuple, tenant_id, scan_keys) -> NegativeCache:
+        topic_caches = self.caches.get(topic.name, {})
+        cache = topic_caches.get((columns, tenant_id))
+        if cache is None:
+            with self.lock:
+                topic_caches = self.caches.get(topic.name, {})
+                cache = topic_caches.get((columns, tenant_id))
+                if cache is None:
+                    cache = NegativeCache(topic.name, columns, factor_types)
+                    self.caches[topic.name] = {**topic_caches, (columns, tenant_id): cache}
+        if processor_settings.NEGATIVE_CACHE_PRESCAN and not cache.prescanned:
+            # out of manager lock, rows inserted during pre-scan are kept by cache and added after
+            count = cache.prescan(scan_keys)
+            if count is not None:
+                log.info("negative cache of topic {0} on {1} is pre-scanned with {2} rows".format(
+                    topic.name, columns, count))
+        return cache
+
+    def add_row(self, topic: Topic, row: dict, tenant_id):
+        with self.lock:
+            topic_caches = self.caches.get(topic.name, {})
+        for (columns, cache_tenant_id), cache in topic_caches.items():
+            if cache_tenant_id == tenant_id:
+                cache.add_row(row)
+
+    def clear(self, topic_name=None):
+        with self.lock:
+            if topic_name is None:
+                self.caches = {}
+            else:
+                self.caches.pop(topic_name, None)
+
+
+negative_cache_manager = NegativeCacheManager()
+
+
+def negative_cache_enabled() -> bool:
+    return processor_settings.NEGATIVE_CACHE_ON
+
+
+def __get_tenant_id(current_user):
+    return current_user.tenantId if current_user is not None else None
+
+
+def find_row_unless_absent(where_, topic: Topic, current_user, load, scan_keys):
+    """
+    skip the lookup when the row is known not exist, only for equality conditions on exact key columns.
+    scan_keys streams values of key columns of all rows of topic for current tenant, for pre-scan
+    """
+    if not negative_cache_enabled():
+        return load(where_, topic, current_user)
+    equality_key = find_equality_key(where_, topic)
+    if equality_key is None:
+        return load(where_, topic, current_user)
+    columns, factor_types, key = equality_key
+    cache = negative_cache_manager.get_cache(topic, columns, factor_types, __get_tenant_id(current_user), scan_keys)
+    if cache.is_absent(key):
+        return None
+    version = cache.version
+    row = load(where_, topic, current_user)
+    if row is None:
+        cache.add_miss(key, version)
+    return row
+
+
+def note_topic_row_written(topic: Topic, row: dict, current_user):
+    """
+    the key columns of row exist now, called after a row is inserted, or updated with the whole row
+    """
+    if negative_cache_enabled() and row is not None:
+        negative_cache_manager.add_row(topic, row, __get_tenant_id(current_user))
+
+
+def invalidate_negative_cache(topic: Topic):
+    """
+    for writes that rows are unknown, eg. update by condition
+    """
+    if negative_cache_enabled():
+        negative_cache_manager.clear(topic.name)
@@ -0,0 +1,131 @@
+import logging
+import threading
+from typing import Dict, List
+
+from model.model.pipeline.pipeline import Pipeline
+from model.model.pipeline.trigger_type import TriggerType
+
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.common.cache.metadata_cache import METADATA_CHANNEL, PIPELINE_BY_ID
+from watchmen.database.find_storage_template import find_storage_template
+
+log = logging.getLogger("app." + __name__)
+
+PIPELINES = "pipelines"
+
+TRIGGER_TYPES_BY_PIPELINE_TYPE = {
+    "insert-or-merge": [TriggerType.insert, TriggerType.update],
+    "insert": [TriggerType.insert],
+    "update": [TriggerType.update],
+    "delete": [TriggerType.delete]
+}
+
+storage_template = find_storage_template()
+
+
+def build_route_key(tenant_id, topic_id, trigger_type: TriggerType):
+    return tenant_id, topic_id, trigger_type.value
+
+
+class PipelineRoutingTable:
+    """
+    enabled pipelines by (tenant, topic, trigger type).
+    route lists are never modified in place, readers can iterate them without lock.
+    routes with tenant None contain the pipelines of all tenants, for the triggers without current user.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.routes: Dict[tuple, List[Pipeline]] = {}
+        self.pipelines: Dict[str, Pipeline] = {}
+        self.loaded = False
+
+    def build(self):
+        pipelines = storage_template.list_all(Pipeline, PIPELINES)
+        with self.lock:
+            self.routes = {}
+            self.pipelines = {}
+            for pipeline in pipelines:
+                self.__add(pipeline)
+            self.loaded = True
+        log.info("pipeline routing table is built with {0} pipelines".format(len(pipelines)))
+
+    def route(self, tenant_id, topic_id, trigger_type: TriggerType) -> List[Pipeline]:
+        if not self.loaded:
+            self.build()
+        return self.routes.get(build_route_key(tenant_id, topic_id, trigger_type), [])
+
+    def put(self, pipeline: Pipeline):
+        if not self.loaded:
+            return
+        with self.lock:
+            self.__remove(pipeline.pipelineId)
+            self.__add(pipeline)
+
+    def remove(self, pipeline_id):
+        if not self.loaded:
+            return
+        with self.lock:
+            self.__remove(pipeline_id)
+
+    def refresh(self, pipeline_id):
+        """
+        reload the pipeline from storage, for partial updates such as enabled and name
+        """
+        if not self.loaded:
+            return
+        pipeline = storage_template.find_one({"pipelineId": pipeline_id}, Pipeline, PIPELINES)
+        self.put_or_remove(pipeline_id, pipeline)
+
+    def put_or_remove(self, pipeline_id, pipeline: Pipeline = None):
+        if pipeline is None:
+            self.remove(pipeline_id)
+        else:
+            self.put(pipeline)
+
+    def __add(self, pipeline: Pipeline):
+        self.pipelines[pipeline.pipelineId] = pipeline
+        if not pipeline.enabled:
+            return
+        for trigger_type in TRIGGER_TYPES_BY_PIPELINE_TYPE.get(pipeline.type, []):
+            for tenant_id in [pipeline.tenantId, None]:
+                key = build_route_key(tenant_id, pipeline.topicId, trigger_type)
+                self.routes[key] = [*self.routes.get(key, []), pipeline]
+
+    def __remove(self, pipeline_id):
+        previous = self.pipelines.pop(pipeline_id, None)
+        if previous is None:
+            return
+        for trigger_type in TRIGGER_TYPES_BY_PIPELINE_TYPE.get(previous.type, []):
+            for tenant_id in [previous.tenantId, None]:
+                key = build_route_key(tenant_id, previous.topicId, trigger_type)
+                routes = [pipeline for pipeline in self.routes.get(key, []) if pipeline.pipelineId != pipeline_id]
+                if routes:
+                    self.routes[key] = routes
+                else:
+                    self.routes.pop(key, None)
+
+
+routing_table = PipelineRoutingTable()
+
+
+def build_pipeline_routing_table():
+    routing_table.build()
+
+
+def find_pipelines_to_trigger(topic_id, trigger_type: TriggerType, current_user=None) -> List[Pipeline]:
+    tenant_id = current_user.tenantId if current_user is not None else None
+    return routing_table.route(tenant_id, topic_id, trigger_type)
+
+
+def __on_pipeline_invalidation(message: dict):
+    # pipeline changed by other worker
+    if message.get("cache") != PIPELINE_BY_ID or not routing_table.loaded:
+        return
+    if message.get("key") is None:
+        routing_table.build()
+    else:
+        routing_table.refresh(message.get("key"))
+
+
+get_invalidation_bus().subscribe(METADATA_CHANNEL, __on_pipeline_invalidation)
@@ -1,9 +1,10 @@
 from model.model.pipeline.pipeline import Pipeline
 from model.model.pipeline.pipeline_graph import PipelinesGraphics
 
-from watchmen_boot.cache.cache_manage import cacheman, PIPELINES_BY_TOPIC_ID, PIPELINE_BY_ID
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
+from watchmen.common.cache.metadata_cache import get_metadata_cache, PIPELINES_BY_TOPIC_ID, PIPELINE_BY_ID
 from watchmen.database.find_storage_template import find_storage_template
+from watchmen.pipeline.storage.pipeline_routing import routing_table, find_pipelines_to_trigger
 
 USER_ID = "userId"
 
@@ -14,15 +15,34 @@ PIPELINE_GRAPH = "pipeline_graph"
 storage_template = find_storage_template()
 
 
+def __tenant_id(current_user):
+    return current_user.tenantId if current_user is not None else None
+
+
+def __invalidate_pipeline_cache(pipeline_id, topic_id):
+    get_metadata_cache(PIPELINE_BY_ID).invalidate(pipeline_id)
+    if topic_id is None:
+        get_metadata_cache(PIPELINES_BY_TOPIC_ID).clear()
+    else:
+        get_metadata_cache(PIPELINES_BY_TOPIC_ID).invalidate(topic_id)
+
+
 def create_pipeline(pipeline: Pipeline) -> Pipeline:
     pipeline.pipelineId = get_surrogate_key()
-    return storage_template.insert_one(pipeline, Pipeline, PIPELINES)
+    result = storage_template.insert_one(pipeline, Pipeline, PIPELINES)
+    __invalidate_pipeline_cache(result.pipelineId, result.topicId)
+    routing_table.put(result)
+    return result
 
 
 def update_pipeline(pipeline: Pipeline) -> Pipeline:
+    # read before update, the topic list of previous topic is invalidated when pipeline is moved to another topic
+    previous = routing_table.pipelines.get(pipeline.pipelineId)
     result = storage_template.update_one(pipeline, Pipeline, PIPELINES)
-    cacheman[PIPELINE_BY_ID].delete(result.pipelineId)
-    cacheman[PIPELINES_BY_TOPIC_ID].delete(result.topicId)
+    if previous is not None and previous.topicId != result.topicId:
+        get_metadata_cache(PIPELINES_BY_TOPIC_ID).invalidate(previous.topicId)
+    __invalidate_pipeline_cache(result.pipelineId, result.topicId)
+    routing_table.put(result)
     return result
 
 
@@ -31,44 +51,51 @@ def __convert_to_object(x):
 
 
 def load_pipeline_by_topic_id(topic_id, current_user=None):
-    cached_pipelines = cacheman[PIPELINES_BY_TOPIC_ID].get(topic_id)
+    cache = get_metadata_cache(PIPELINES_BY_TOPIC_ID)
+    cached_pipelines = cache.get(__tenant_id(current_user), topic_id)
     if cached_pipelines is not None:
         return cached_pipelines
 
+    version = cache.version(topic_id)
     if current_user is None:
         pipelines = storage_template.find_({"topicId": topic_id}, Pipeline, PIPELINES)
-        if pipelines is not None:
-            cacheman[PIPELINES_BY_TOPIC_ID].set(topic_id, pipelines)
-        return pipelines
     else:
         pipelines = storage_template.find_({"and": [{"topicId": topic_id}, {"tenantId": current_user.tenantId}]},
                                            Pipeline, PIPELINES)
-        if pipelines is not None:
-            cacheman[PIPELINES_BY_TOPIC_ID].set(topic_id, pipelines)
-        return pipelines
+    cache.set(__tenant_id(current_user), topic_id, pipelines, version)
+    return pipelines
+
+
+def has_pipeline_to_trigger(topic_id, trigger_type, current_user=None) -> bool:
+    return len(find_pipelines_to_trigger(topic_id, trigger_type, current_user)) > 0
 
 
 def load_pipeline_by_id(pipeline_id, current_user):
-    cached_pipeline = cacheman[PIPELINE_BY_ID].get(pipeline_id)
+    cache = get_metadata_cache(PIPELINE_BY_ID)
+    cached_pipeline = cache.get(current_user.tenantId, pipeline_id)
     if cached_pipeline is not None:
         return cached_pipeline
+    version = cache.version(pipeline_id)
     result = storage_template.find_one({"and": [{"pipelineId": pipeline_id}, {"tenantId": current_user.tenantId}]},
                                        Pipeline, PIPELINES)
-    if result is not None:
-        cacheman[PIPELINE_BY_ID].set(pipeline_id, result)
+    cache.set(current_user.tenantId, pipeline_id, result, version)
     return result
 
 
 def update_pipeline_status(pipeline_id, enabled):
     storage_template.update_({"pipelineId": pipeline_id}, {"enabled": enabled}, Pipeline, PIPELINES)
-    cacheman[PIPELINE_BY_ID].delete(pipeline_id)
-    cacheman[PIPELINES_BY_TOPIC_ID].clear()
+    __refresh_pipeline(pipeline_id)
 
 
 def update_pipeline_name(pipeline_id, name):
     storage_template.update_({"pipelineId": pipeline_id}, {"name": name}, Pipeline, PIPELINES)
-    cacheman[PIPELINE_BY_ID].delete(pipeline_id)
-    cacheman[PIPELINES_BY_TOPIC_ID].clear()
+    __refresh_pipeline(pipeline_id)
+
+
+def __refresh_pipeline(pipeline_id):
+    pipeline = storage_template.find_one({"pipelineId": pipeline_id}, Pipeline, PIPELINES)
+    __invalidate_pipeline_cache(pipeline_id, pipeline.topicId if pipeline is not None else None)
+    routing_table.put_or_remove(pipeline_id, pipeline)
 
 
 def load_pipeline_list(current_user):
@@ -94,6 +121,20 @@ def load_pipeline_graph(user_id, current_user):
 
 def import_pipeline_to_db(pipeline):
     storage_template.insert_one(pipeline, Pipeline, PIPELINES)
-    cacheman[PIPELINE_BY_ID].clear()
-    cacheman[PIPELINES_BY_TOPIC_ID].clear()
+    __invalidate_pipeline_cache(pipeline.pipelineId, pipeline.topicId)
+    routing_table.put(pipeline)
     return pipeline
+
+
+def warm_up_pipeline_cache():
+    pipelines = storage_template.list_all(Pipeline, PIPELINES)
+    by_id = get_metadata_cache(PIPELINE_BY_ID)
+    by_topic_id = get_metadata_cache(PIPELINES_BY_TOPIC_ID)
+    pipelines_by_topic = {}
+    for pipeline in pipelines:
+        by_id.set(pipeline.tenantId, pipeline.pipelineId, pipeline)
+        key = (pipeline.tenantId, pipeline.topicId)
+        pipelines_by_topic[key] = [*pipelines_by_topic.get(key, []), pipeline]
+    for (tenant_id, topic_id), topic_pipelines in pipelines_by_topic.items():
+        by_topic_id.set(tenant_id, topic_id, topic_pipelines)
+    return len(pipelines)
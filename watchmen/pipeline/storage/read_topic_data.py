@@ -1,7 +1,10 @@
 from model.model.common.user import User
 from model.model.topic.topic import Topic
 
+from watchmen.config.config import processor_settings
 from watchmen.database.topic.adapter.topic_storage_adapter import get_template_by_datasource_id
+from watchmen.pipeline.storage.negative_cache import find_row_unless_absent
+from watchmen.pipeline.storage.row_cache import find_row_through_cache
 
 
 def __merge_tenant_id_to_where_condition(where_, current_user: User = None):
@@ -15,6 +18,33 @@ def query_topic_data(where_, topic: Topic, current_user: User):
     return template.topic_data_find_one(__merge_tenant_id_to_where_condition(where_, current_user), topic.name)
 
 
+def query_topic_data_through_cache(where_, topic: Topic, current_user: User):
+    """
+    for read only lookups, the row is from row cache when topic is cached.
+    do not use it to find the row to update, the cached row may lag behind writes of other workers within ttl
+    """
+    return find_row_through_cache(where_, topic, current_user, query_topic_data_unless_absent)
+
+
+def query_topic_data_unless_absent(where_, topic: Topic, current_user: User):
+    """
+    None without lookup when the row is known not exist by negative cache, in batch and replay mode
+    """
+    return find_row_unless_absent(where_, topic, current_user, query_topic_data,
+                                  lambda columns: scan_topic_data_columns(columns, topic, current_user))
+
+
+def scan_topic_data_columns(columns, topic: Topic, current_user: User):
+    """
+    values of columns of all rows of topic for current tenant, fetched in batches
+    """
+    template = get_template_by_datasource_id(topic.dataSourceId)
+    for rows in template.topic_data_scan_columns(__merge_tenant_id_to_where_condition({}, current_user),
+                                                 list(columns), topic.name,
+                                                 processor_settings.NEGATIVE_CACHE_PRESCAN_FETCH_SIZE):
+        yield from rows
+
+
 def query_multiple_topic_data(where_, topic: Topic, current_user: User):
     template = get_template_by_datasource_id(topic.dataSourceId)
     return template.topic_data_find_(__merge_tenant_id_to_where_condition(where_, current_user), topic.name)
@@ -0,0 +1,123 @@
+import copy
+import json
+import threading
+from typing import Dict
+
+from cacheout import Cache
+from model.model.topic.topic import Topic
+
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+
+ROW_CACHE_CHANNEL = "row_cache"
+
+
+def build_row_key(tenant_id, where_) -> tuple:
+    """
+    where_ is normalized by sorting keys, so the same condition built in different order hits the same row
+    """
+    return tenant_id, json.dumps(where_, sort_keys=True, default=str)
+
+
+class TopicRowCache:
+    """
+    rows of one topic by (tenant, where_), only rows found are cached.
+
+    the version is increased on each write of topic, a row loaded from storage is only cached
+    when the version is not changed during loading, so a concurrent write is never overwritten by stale row.
+    """
+
+    def __init__(self, topic_name: str, maxsize: int, ttl: float):
+        self.name = "row:" + topic_name
+        self.cache = Cache(maxsize=maxsize, ttl=ttl)
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        row = self.cache.get(key)
+        if row is None:
+            CACHE_MISS.labels(self.name).inc()
+            return None
+        CACHE_HIT.labels(self.name).inc()
+        # actions may change the row in variables, never share the cached one
+        return copy.deepcopy(row)
+
+    def set(self, key, row, version: int):
+        if row is None or isinstance(row, list):
+            return
+        with self.lock:
+            if version != self.version:
+                return
+            self.cache.set(key, copy.deepcopy(row))
+
+    def invalidate(self):
+        with self.lock:
+            self.version = self.version + 1
+            self.cache.clear()
+
+
+class RowCacheManager:
+    """
+    row caches of topics listed in ROW_CACHE_TOPICS, eg. small dimension topics read by key in every event
+    """
+
+    def __init__(self):
+        self.topicNames = set(processor_settings.ROW_CACHE_TOPICS)
+        self.caches: Dict[str, TopicRowCache] = {}
+        self.lock = threading.Lock()
+
+    def is_cached(self, topic: Topic) -> bool:
+        return topic.name in self.topicNames
+
+    def get_cache(self, topic_name) -> TopicRowCache:
+        cache = self.caches.get(topic_name)
+        if cache is None:
+            with self.lock:
+                cache = self.caches.get(topic_name)
+                if cache is None:
+                    cache = TopicRowCache(topic_name, processor_settings.ROW_CACHE_SIZE,
+                                          processor_settings.ROW_CACHE_TTL)
+                    self.caches[topic_name] = cache
+        return cache
+
+    def invalidate(self, topic_name, publish: bool = True):
+        cache = self.caches.get(topic_name)
+        if cache is not None:
+            cache.invalidate()
+        if publish:
+            get_invalidation_bus().publish(ROW_CACHE_CHANNEL, {"topic": topic_name})
+
+
+row_cache_manager = RowCacheManager()
+
+
+def find_row_through_cache(where_, topic: Topic, current_user, load):
+    """
+    read through row cache when topic is cached, otherwise load from storage directly
+    """
+    if not row_cache_manager.is_cached(topic):
+        return load(where_, topic, current_user)
+    cache = row_cache_manager.get_cache(topic.name)
+    tenant_id = current_user.tenantId if current_user is not None else None
+    key = build_row_key(tenant_id, where_)
+    row = cache.get(key)
+    if row is not None:
+        return row
+    version = cache.version
+    row = load(where_, topic, current_user)
+    cache.set(key, row, version)
+    return row
+
+
+def invalidate_topic_rows(topic: Topic):
+    if row_cache_manager.is_cached(topic):
+        row_cache_manager.invalidate(topic.name)
+
+
+def __on_row_invalidation(message: dict):
+    # topic written by other worker
+    row_cache_manager.invalidate(message.get("topic"), False)
+
+
+get_invalidation_bus().subscribe(ROW_CACHE_CHANNEL, __on_row_invalidation)
@@ -11,6 +11,10 @@ from watchmen.common.utils.data_utils import get_id_name_by_datasource, add_tena
 from watchmen_boot.config.config import settings
 from watchmen.database.datasource.container import data_source_container
 from watchmen.database.topic.adapter.topic_storage_adapter import get_template_by_datasource_id
+from watchmen.pipeline.storage.negative_cache import note_topic_row_written, invalidate_negative_cache
+from watchmen.pipeline.storage.pipeline_storage import has_pipeline_to_trigger
+from watchmen.pipeline.storage.row_cache import invalidate_topic_rows
+from watchmen.report.engine.result_cache import invalidate_query_results
 from watchmen.pipeline.utils.units_func import add_audit_columns, add_trace_columns, INSERT, UPDATE
 from watchmen.security.index import encrypt_value
 
@@ -21,6 +25,13 @@ def __build_trigger_pipeline_data(topic_name: str, data, trigger_type):
     return TriggerData(topicName=topic_name, triggerType=trigger_type, data=data)
 
 
+def need_trigger_pipeline(topic: Topic, trigger_type, current_user, triggerable=True) -> bool:
+    """
+    the trigger data is built only when some enabled pipeline of topic consumes it
+    """
+    return triggerable and has_pipeline_to_trigger(topic.topicId, trigger_type, current_user)
+
+
 def __find_encrypt_factor_in_mapping_result(mapping_result, topic: Topic) -> List[Factor]:
     need_encrypt_factors = list(
         filter(lambda factor: factor.name in mapping_result and factor.encrypt is not None, topic.factors))
@@ -40,7 +51,7 @@ def __encrypt_value(need_encrypt_factors: List[Factor], mapping_result, current_
             mapping_result[factor.name] = value_after_encrypt
 
 
-def insert_topic_data(mapping_result, pipeline_uid, topic: Topic, current_user):
+def insert_topic_data(mapping_result, pipeline_uid, topic: Topic, current_user, triggerable=True):
     check_current_user(current_user)
     add_audit_columns(mapping_result, INSERT)
     add_tenant_id_to_instance(mapping_result, current_user)
@@ -49,46 +60,67 @@ def insert_topic_data(mapping_result, pipeline_uid, topic: Topic, current_user):
         __encrypt_value(__find_encrypt_factor_in_mapping_result(mapping_result, topic), mapping_result, current_user)
     template = get_template_by_datasource_id(topic.dataSourceId)
     template.topic_data_insert_one(mapping_result, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    note_topic_row_written(topic, mapping_result, current_user)
+    if not need_trigger_pipeline(topic, TriggerType.insert, current_user, triggerable):
+        return None
     return __build_trigger_pipeline_data(topic.name,
                                          {pipeline_constants.NEW: mapping_result, pipeline_constants.OLD: None},
                                          TriggerType.insert)
 
 
-def update_topic_data(mapping_result, target_data, pipeline_uid, query_, topic: Topic, current_user):
+def update_topic_data(mapping_result, target_data, pipeline_uid, query_, topic: Topic, current_user,
+                      triggerable=True):
     check_current_user(current_user)
     template = get_template_by_datasource_id(topic.dataSourceId)
-    old_data = template.topic_data_find_by_id(
-        target_data[get_id_name_by_datasource(data_source_container.get_data_source_by_id(topic.dataSourceId))],
-        topic.name)
+    trigger = need_trigger_pipeline(topic, TriggerType.update, current_user, triggerable)
+    old_data = __find_old_data(template, target_data, topic) if trigger else None
     add_audit_columns(mapping_result, UPDATE)
     add_tenant_id_to_instance(mapping_result, current_user)
     if __need_encrypt():
         __encrypt_value(__find_encrypt_factor_in_mapping_result(mapping_result, topic), mapping_result, current_user)
     add_trace_columns(mapping_result, "update_row", pipeline_uid)
     template.topic_data_update_(query_, mapping_result, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    invalidate_negative_cache(topic)
+    if not trigger:
+        return None
     data = {**target_data, **mapping_result}
     return __build_trigger_pipeline_data(topic.name,
                                          {pipeline_constants.NEW: data, pipeline_constants.OLD: old_data},
                                          TriggerType.update)
 
 
+def __find_old_data(template, target_data, topic: Topic):
+    return template.topic_data_find_by_id(
+        target_data[get_id_name_by_datasource(data_source_container.get_data_source_by_id(topic.dataSourceId))],
+        topic.name)
+
+
 def check_current_user(current_user):
     if current_user is None:
         raise Exception("current_user is None")
 
 
-def update_topic_data_one(mapping_result, target_data, pipeline_uid, id_, topic: Topic, current_user):
+def update_topic_data_one(mapping_result, target_data, pipeline_uid, id_, topic: Topic, current_user,
+                          triggerable=True):
     check_current_user(current_user)
     template = get_template_by_datasource_id(topic.dataSourceId)
-    old_data = template.topic_data_find_by_id(
-        target_data[get_id_name_by_datasource(data_source_container.get_data_source_by_id(topic.dataSourceId))],
-        topic.name)
+    trigger = need_trigger_pipeline(topic, TriggerType.update, current_user, triggerable)
+    old_data = __find_old_data(template, target_data, topic) if trigger else None
     add_audit_columns(mapping_result, UPDATE)
     add_trace_columns(mapping_result, "update_row", pipeline_uid)
     if __need_encrypt():
         __encrypt_value(__find_encrypt_factor_in_mapping_result(mapping_result, topic), mapping_result, current_user)
     add_tenant_id_to_instance(mapping_result, current_user)
     template.topic_data_update_one(id_, mapping_result, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    note_topic_row_written(topic, {**target_data, **mapping_result}, current_user)
+    if not trigger:
+        return None
     data = {**target_data, **mapping_result}
     return __build_trigger_pipeline_data(topic.name,
                                          {pipeline_constants.NEW: data, pipeline_constants.OLD: old_data},
@@ -96,18 +128,22 @@ def update_topic_data_one(mapping_result, target_data, pipeline_uid, id_, topic:
 
 
 def update_topic_data_one_with_version(mapping_result, target_data, pipeline_uid, id_, version_, topic: Topic,
-                                       current_user):
+                                       current_user, triggerable=True):
     check_current_user(current_user)
     template = get_template_by_datasource_id(topic.dataSourceId)
-    old_data = template.topic_data_find_by_id(
-        target_data[get_id_name_by_datasource(data_source_container.get_data_source_by_id(topic.dataSourceId))],
-        topic.name)
+    trigger = need_trigger_pipeline(topic, TriggerType.update, current_user, triggerable)
+    old_data = __find_old_data(template, target_data, topic) if trigger else None
     add_audit_columns(mapping_result, UPDATE)
     add_tenant_id_to_instance(mapping_result, current_user)
     add_trace_columns(mapping_result, "update_row", pipeline_uid)
     if __need_encrypt():
         __encrypt_value(__find_encrypt_factor_in_mapping_result(mapping_result, topic), mapping_result, current_user)
     template.topic_data_update_one_with_version(id_, version_, mapping_result, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    note_topic_row_written(topic, {**target_data, **mapping_result}, current_user)
+    if not trigger:
+        return None
     data = {**target_data, **mapping_result}
     return __build_trigger_pipeline_data(topic.name,
                                          {pipeline_constants.NEW: data, pipeline_constants.OLD: old_data},
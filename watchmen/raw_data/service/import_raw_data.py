@@ -1,11 +1,14 @@
+from typing import List
+
 from model.model.pipeline.trigger_type import TriggerType
 
 from watchmen.common.constants import pipeline_constants
-from watchmen.common.utils.data_utils import is_raw
+from watchmen.common.utils.data_utils import is_raw, add_tenant_id_to_instance
 from watchmen.database.topic_utils import get_flatten_field
+from watchmen.pipeline.core.executor.pipeline_executor import get_pipeline_executor
 from watchmen.pipeline.index import trigger_pipeline
 from watchmen.pipeline.utils.units_func import INSERT, add_audit_columns
-from watchmen.topic.storage.topic_data_storage import save_topic_instance
+from watchmen.topic.storage.topic_data_storage import save_topic_instance, save_topic_instances
 from watchmen.topic.storage.topic_schema_storage import get_topic
 
 
@@ -14,16 +17,49 @@ async def import_raw_topic_data(topic_event, current_user):
     if topic is None:
         raise Exception(topic_event.code + " topic name does not exist")
 
-    raw_data = await get_input_data(topic, topic_event)
+    raw_data = __build_raw_data(topic, topic_event)
+    save_topic_instance(topic, raw_data, current_user)
+    __trigger_pipeline(topic_event, current_user)
+
+
+def import_raw_topic_data_batch(topic_code, topic_events: List, current_user):
+    """
+    events of one topic are saved by one bulk insert, then pipelines are triggered in order of events
+    """
+    save_raw_topic_data_batch(topic_code, topic_events, current_user)
+    for topic_event in topic_events:
+        __trigger_pipeline(topic_event, current_user)
+
+
+def save_raw_topic_data_batch(topic_code, topic_events: List, current_user):
+    """
+    events of one topic are saved by one bulk insert, pipelines are not triggered
+    """
+    topic = get_topic(topic_code, current_user)
+    if topic is None:
+        raise Exception(topic_code + " topic name does not exist")
+
+    raw_data_list = [add_tenant_id_to_instance(__build_raw_data(topic, topic_event), current_user)
+                     for topic_event in topic_events]
+    save_topic_instances(topic, raw_data_list)
+
+
+async def run_raw_topic_pipeline(topic_event, current_user):
+    """
+    trigger pipelines of saved raw event on pipeline executor
+    """
+    await get_pipeline_executor().submit(None, current_user.tenantId, __trigger_pipeline, topic_event, current_user)
+
+
+def __build_raw_data(topic, topic_event):
+    raw_data = get_input_data(topic, topic_event)
     add_audit_columns(raw_data, INSERT)
     flatten_fields = get_flatten_field(topic_event.data, topic.factors)
     raw_data.update(flatten_fields)
-
-    save_topic_instance(topic, raw_data, current_user)
-    __trigger_pipeline(topic_event, current_user)
+    return raw_data
 
 
-async def get_input_data(topic, topic_event):
+def get_input_data(topic, topic_event):
     if is_raw(topic):
         raw_data = {"data_": topic_event.data}
     else:
@@ -18,52 +18,62 @@ def build_report_funnels(funnels: List[ReportFunnel], dataset_query_alias, datas
         if funnel.enabled:
             column = columns.get(funnel.columnId)
             field = Field(column.alias, None, AliasedQuery(dataset_query_alias))
-            if funnel.type == ReportFunnelType.NUMERIC:
-                if funnel.range:
-                    if check_funnel_values(funnel.values, True):
-                        lower = Decimal(funnel.values[0])
-                        upper = Decimal(funnel.values[1])
-                        criterions.append(field.between(lower, upper))
-                else:
-                    if check_funnel_values(funnel.values, False):
-                        criterions.append(field.eq(Decimal(funnel.values[0])))
-            elif funnel.type == ReportFunnelType.DATE:
-                if funnel.range:
-                    if check_funnel_values(funnel.values, True):
-                        lower_value = funnel.values[0]
-                        upper_value = funnel.values[1]
-                        lower = LiteralValue("DATE \'{0}\'".format(arrow.get(lower_value).format('YYYY-MM-DD')))
-                        upper = LiteralValue("DATE \'{0}\'".format(arrow.get(upper_value).format('YYYY-MM-DD')))
-                        criterions.append(field.between(lower, upper))
-                else:
-                    if check_funnel_values(funnel.values, False):
-                        value = LiteralValue("DATE \'{0}\'".format(arrow.get(funnel.values[0]).format('YYYY-MM-DD')))
-                        criterions.append(field.eq(value))
-            elif funnel.type == ReportFunnelType.YEAR:
-                if funnel.range:
-                    if check_funnel_values(funnel.values, True):
-                        lower = Decimal(funnel.values[0])
-                        upper = Decimal(funnel.values[1])
-                        criterions.append(presto_fn.PrestoYear(field).between(lower, upper))
-                else:
-                    if check_funnel_values(funnel.values, False):
-                        value = Decimal(funnel.values[0])
-                        criterions.append(presto_fn.PrestoYear(field).eq(value))
-            elif funnel.type == ReportFunnelType.MONTH:
-                if funnel.range:
-                    if check_funnel_values(funnel.values, True):
-                        lower = Decimal(funnel.values[0])
-                        upper = Decimal(funnel.values[1])
-                        criterions.append(presto_fn.PrestoMonth(field).between(lower, upper))
-                else:
-                    if check_funnel_values(funnel.values, False):
-                        value = Decimal(funnel.values[0])
-                        criterions.append(presto_fn.PrestoMonth(field).eq(value))
-            else:
-                raise NotImplementedError("funnel type is not supported")
+            criterion = build_funnel_criterion(funnel, field)
+            if criterion is not None:
+                criterions.append(criterion)
     return Criterion.all(criterions)
 
 
+def build_funnel_criterion(funnel: ReportFunnel, field):
+    """
+    none when funnel values are not set
+    """
+    if funnel.type == ReportFunnelType.NUMERIC:
+        if funnel.range:
+            if check_funnel_values(funnel.values, True):
+                lower = Decimal(funnel.values[0])
+                upper = Decimal(funnel.values[1])
+                return field.between(lower, upper)
+        else:
+            if check_funnel_values(funnel.values, False):
+                return field.eq(Decimal(funnel.values[0]))
+    elif funnel.type == ReportFunnelType.DATE:
+        if funnel.range:
+            if check_funnel_values(funnel.values, True):
+                lower_value = funnel.values[0]
+                upper_value = funnel.values[1]
+                lower = LiteralValue("DATE \'{0}\'".format(arrow.get(lower_value).format('YYYY-MM-DD')))
+                upper = LiteralValue("DATE \'{0}\'".format(arrow.get(upper_value).format('YYYY-MM-DD')))
+                return field.between(lower, upper)
+        else:
+            if check_funnel_values(funnel.values, False):
+                value = LiteralValue("DATE \'{0}\'".format(arrow.get(funnel.values[0]).format('YYYY-MM-DD')))
+                return field.eq(value)
+    elif funnel.type == ReportFunnelType.YEAR:
+        if funnel.range:
+            if check_funnel_values(funnel.values, True):
+                lower = Decimal(funnel.values[0])
+                upper = Decimal(funnel.values[1])
+                return presto_fn.PrestoYear(field).between(lower, upper)
+        else:
+            if check_funnel_values(funnel.values, False):
+                value = Decimal(funnel.values[0])
+                return presto_fn.PrestoYear(field).eq(value)
+    elif funnel.type == ReportFunnelType.MONTH:
+        if funnel.range:
+            if check_funnel_values(funnel.values, True):
+                lower = Decimal(funnel.values[0])
+                upper = Decimal(funnel.values[1])
+                return presto_fn.PrestoMonth(field).between(lower, upper)
+        else:
+            if check_funnel_values(funnel.values, False):
+                value = Decimal(funnel.values[0])
+                return presto_fn.PrestoMonth(field).eq(value)
+    else:
+        raise NotImplementedError("funnel type is not supported")
+    return None
+
+
 def check_funnel_values(values, is_range):
     if values:
         if is_range:
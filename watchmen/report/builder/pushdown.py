@@ -0,0 +1,193 @@
+from typing import List, Optional, Set
+
+from pypika import Criterion
+
+from watchmen.parser.console_paramter_parser import ConsoleParameterJointParser, ConsoleParameterParser
+from watchmen.parser.constants import ParameterKind
+from watchmen.report.builder.dialects import PrestoQuery
+from watchmen.report.builder.funnel import build_funnel_criterion
+from watchmen.report.builder.utils import build_table_by_topic_id, convent_column_list_to_dict
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+
+FUNCTION_PREFIX = "{&"
+
+
+def find_source_topic_ids(dataset) -> List[str]:
+    """
+    topics in from and join clauses of dataset query,
+    no topic when dataset has no joins and its first column is not of topic
+    """
+    if dataset.joins:
+        topic_ids = [dataset.joins[0].topicId]
+        for join in dataset.joins:
+            topic_ids.extend([join.topicId, join.secondaryTopicId])
+    else:
+        topic_ids = [dataset.columns[0].parameter.topicId]
+    return [topic_id for topic_id in dict.fromkeys(topic_ids) if topic_id is not None]
+
+
+def find_pushdown_topic_ids(dataset) -> Set[str]:
+    """
+    topics never null supplied by outer joins, a predicate on such topic filters the same rows before and after joins
+    """
+    topic_ids = find_source_topic_ids(dataset)
+    null_supplied = set()
+    joined = topic_ids[:1]
+    for join in dataset.joins:
+        if join.type == "left":
+            null_supplied.add(join.secondaryTopicId)
+        elif join.type == "right":
+            null_supplied.update(joined)
+        joined.append(join.secondaryTopicId)
+    return set(topic_ids) - null_supplied
+
+
+def __collect_parameter(parameter, references: set, key) -> bool:
+    """
+    collect key of topic parameters, returns false when some constant function refers to topics by name
+    """
+    if parameter is None:
+        return True
+    if parameter.kind == ParameterKind.TOPIC:
+        references.add(key(parameter))
+    elif parameter.kind == ParameterKind.CONSTANT:
+        if (parameter.value or "").strip().startswith(FUNCTION_PREFIX):
+            return False
+    elif parameter.kind != ParameterKind.COMPUTED:
+        return False
+    return all(__collect_parameter(item, references, key) for item in parameter.parameters or []) \
+        and __collect_joint(parameter.on, references, key)
+
+
+def __collect_joint(joint, references: set, key) -> bool:
+    if joint is None:
+        return True
+    return all(__collect_joint(item, references, key) for item in joint.filters or []) \
+        and __collect_parameter(joint.left, references, key) \
+        and __collect_parameter(joint.right, references, key)
+
+
+def find_column_topic_id(column) -> Optional[str]:
+    """
+    the only topic which dataset column is computed from
+    """
+    topic_ids = set()
+    if column.parameter is None or not __collect_parameter(column.parameter, topic_ids, lambda p: p.topicId):
+        return None
+    return topic_ids.pop() if len(topic_ids) == 1 else None
+
+
+def __find_filter_topic_id(joint, columns: dict) -> Optional[str]:
+    """
+    the only topic which columns referred by report filter are computed from, topic parameters of report filter
+    refer to dataset columns by column id
+    """
+    column_ids = set()
+    if not __collect_joint(joint, column_ids, lambda p: p.factorId) or not column_ids:
+        return None
+    topic_ids = set()
+    for column_id in column_ids:
+        column = columns.get(column_id)
+        topic_ids.add(find_column_topic_id(column) if column is not None else None)
+    return topic_ids.pop() if len(topic_ids) == 1 else None
+
+
+def __rewrite_parameter(parameter, columns: dict):
+    if parameter is None:
+        return None
+    if parameter.kind == ParameterKind.TOPIC:
+        return columns[parameter.factorId].parameter
+    return parameter.copy(update={"parameters": [__rewrite_parameter(item, columns)
+                                                 for item in parameter.parameters or []],
+                                  "on": __rewrite_joint(parameter.on, columns)})
+
+
+def __rewrite_joint(joint, columns: dict):
+    """
+    report filter on dataset columns to filter on topic factors
+    """
+    if joint is None:
+        return None
+    return joint.copy(update={"filters": [__rewrite_joint(item, columns) for item in joint.filters or []],
+                              "left": __rewrite_parameter(joint.left, columns),
+                              "right": __rewrite_parameter(joint.right, columns)})
+
+
+def split_conjuncts(joint) -> list:
+    if joint.jointType == "and":
+        conjuncts = []
+        for item in joint.filters or []:
+            conjuncts.extend(split_conjuncts(item))
+        return conjuncts
+    return [joint]
+
+
+class ReportPushdown:
+    def __init__(self, topic_space_filter, filters, funnels):
+        # sub queries of topics with pushed predicates, or of space filters
+        self.topicSpaceFilter = topic_space_filter
+        # report filters and funnels left on chart query
+        self.filters = filters
+        self.funnels = funnels
+
+
+def push_down_report_filters(report, dataset, topic_space_filter) -> ReportPushdown:
+    """
+    report filters and funnels referring to columns of one topic are moved into sub query of the topic,
+    it is the space filter sub query when topic has one, otherwise a sub query is created.
+    so joins read reduced topics, whether presto pushes predicates down across joins or not
+    """
+    columns = convent_column_list_to_dict(dataset.columns)
+    topic_ids = find_pushdown_topic_ids(dataset)
+    pushed = {}
+
+    def push(topic_id, criterion):
+        if topic_id in topic_ids:
+            pushed.setdefault(topic_id, []).append(criterion)
+            return True
+        return False
+
+    filters = report.filters
+    if filters is not None:
+        conjuncts = split_conjuncts(filters)
+        left_conjuncts = []
+        for conjunct in conjuncts:
+            topic_id = __find_filter_topic_id(conjunct, columns)
+            if topic_id is None or not push(topic_id, ConsoleParameterJointParser(
+                    __rewrite_joint(conjunct, columns)).parse_parameter_joint()):
+                left_conjuncts.append(conjunct)
+        if not left_conjuncts:
+            filters = None
+        elif len(left_conjuncts) < len(conjuncts):
+            filters = filters.copy(update={"jointType": "and", "filters": left_conjuncts})
+
+    funnels = []
+    for funnel in report.funnels or []:
+        column = columns.get(funnel.columnId)
+        topic_id = find_column_topic_id(column) if funnel.enabled and column is not None else None
+        if topic_id is not None and topic_id in topic_ids:
+            criterion = build_funnel_criterion(funnel, ConsoleParameterParser(column.parameter).parse_parameter().result)
+            if criterion is not None:
+                push(topic_id, criterion)
+            continue
+        funnels.append(funnel)
+
+    return ReportPushdown(build_pushdown_space_filter(topic_space_filter, pushed), filters, funnels)
+
+
+def build_pushdown_space_filter(topic_space_filter, pushed: dict):
+    sub_queries = {}
+    for topic_id, criteria in pushed.items():
+        sub_query = topic_space_filter(topic_id)
+        if sub_query:
+            sub_queries[topic_id] = {"alias": sub_query["alias"],
+                                     "query": sub_query["query"].where(Criterion.all(criteria))}
+        else:
+            sub_queries[topic_id] = {"alias": get_topic_by_id(topic_id).name,
+                                     "query": PrestoQuery.from_(build_table_by_topic_id(topic_id)).select('*').where(
+                                         Criterion.all(criteria))}
+
+    def get_topic_sub_query_by_topic_id(topic_id):
+        return sub_queries.get(topic_id, None) or topic_space_filter(topic_id)
+
+    return get_topic_sub_query_by_topic_id
@@ -0,0 +1,129 @@
+import re
+from decimal import Decimal
+from typing import List
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ROWS = "rows"
+COLUMNS = "columns"
+ARROW = "arrow"
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+PRESTO_INTEGER_TYPES = ["tinyint", "smallint", "integer", "bigint"]
+PRESTO_FLOATING_TYPES = ["real", "double"]
+PRESTO_DECIMAL_PATTERN = re.compile(r"decimal\((\d+),\s*(\d+)\)")
+
+
+def arrow_enabled() -> bool:
+    return pyarrow is not None
+
+
+class ColumnarResult:
+    """
+    values of each column in one list, rows of cursor batches are transposed when appended
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.columns = [[] for _ in names]
+        self.rowCount = 0
+
+    def append(self, rows):
+        if not rows:
+            return
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(values)
+        self.rowCount = self.rowCount + len(rows)
+
+    def to_json(self) -> dict:
+        return {"columns": self.names, "data": self.columns}
+
+
+def fetch_columnar(cur, batch_size: int) -> ColumnarResult:
+    rows = cur.fetchmany(batch_size)
+    # description is ready after first fetch
+    result = ColumnarResult([description[0] for description in cur.description or []])
+    while rows:
+        result.append(rows)
+        rows = cur.fetchmany(batch_size)
+    return result
+
+
+def rows_to_columns(rows) -> list:
+    return [list(values) for values in zip(*rows)] if rows else []
+
+
+def infer_arrow_schema(names: List[str], columns: List[list]):
+    """
+    types are inferred from values, columns without value are strings
+    """
+    fields = []
+    for name, values in zip(names, columns):
+        data_type = pyarrow.array(values).type
+        fields.append(pyarrow.field(name, pyarrow.string() if pyarrow.types.is_null(data_type) else data_type))
+    return pyarrow.schema(fields)
+
+
+def __to_arrow_type(presto_type: str):
+    presto_type = (presto_type or "").lower()
+    if presto_type == "boolean":
+        return pyarrow.bool_()
+    if presto_type in PRESTO_INTEGER_TYPES:
+        return pyarrow.int64()
+    if presto_type in PRESTO_FLOATING_TYPES:
+        return pyarrow.float64()
+    matched = PRESTO_DECIMAL_PATTERN.fullmatch(presto_type)
+    if matched is not None:
+        return pyarrow.decimal128(min(int(matched.group(1)), 38), int(matched.group(2)))
+    # dates and times are strings, they are returned as strings by presto client
+    return pyarrow.string()
+
+
+def __widen_arrow_type(data_type):
+    if pyarrow.types.is_null(data_type):
+        return pyarrow.string()
+    if pyarrow.types.is_integer(data_type) or pyarrow.types.is_floating(data_type):
+        return pyarrow.float64()
+    if pyarrow.types.is_decimal(data_type):
+        return pyarrow.decimal128(38, data_type.scale)
+    return data_type
+
+
+def build_arrow_schema(names: List[str], description, columns: List[list]):
+    """
+    types are of columns of cursor description, so the schema fits values of later batches.
+    without description, types are inferred from values and widened
+    """
+    if description is not None and len(description) == len(names):
+        return pyarrow.schema([pyarrow.field(name, __to_arrow_type(column[1]))
+                               for name, column in zip(names, description)])
+    inferred = infer_arrow_schema(names, columns)
+    return pyarrow.schema([pyarrow.field(field.name, __widen_arrow_type(field.type)) for field in inferred])
+
+
+def __convert_values(data_type, values: list) -> list:
+    if pyarrow.types.is_string(data_type):
+        return [None if value is None else str(value) for value in values]
+    if pyarrow.types.is_decimal(data_type):
+        # decimals are strings in rows of presto client
+        return [value if value is None or isinstance(value, Decimal) else Decimal(str(value)) for value in values]
+    if pyarrow.types.is_floating(data_type):
+        return [None if value is None else float(value) for value in values]
+    return values
+
+
+def build_arrow_arrays(schema, columns: List[list]) -> list:
+    return [pyarrow.array(__convert_values(field.type, values), type=field.type)
+            for field, values in zip(schema, columns)]
+
+
+def to_arrow_stream(result: ColumnarResult) -> bytes:
+    schema = infer_arrow_schema(result.names, result.columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(pyarrow.RecordBatch.from_arrays(build_arrow_arrays(schema, result.columns), schema=schema))
+    return sink.getvalue().to_pybytes()
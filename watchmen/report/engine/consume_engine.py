@@ -3,16 +3,18 @@ import logging
 from typing import List
 from pypika import AliasedQuery
 
-from watchmen.common.presto.presto_client import get_connection
+from watchmen.common.presto.presto_client import presto_connection
+from watchmen.config.config import processor_settings
 from watchmen.report.builder.consume_filter import build_indicators, build_where
 from watchmen.report.builder.dialects import PrestoQuery
+from watchmen.report.engine.columnar import ColumnarResult, fetch_columnar
 from watchmen.report.engine.dataset_engine import build_query_for_subject
 from watchmen.report.model.consume_model import Indicator, Where
 
 log = logging.getLogger("app." + __name__)
 
 
-def build_query_for_consume(console_subject, indicators: List[Indicator], where_: Where, current_user):
+def build_consume_sql(console_subject, indicators: List[Indicator], where_: Where, current_user) -> str:
     dataset_query = build_query_for_subject(console_subject, current_user)
     dataset_query_alias = "consume_dataset"
     consume_query = PrestoQuery.with_(dataset_query, dataset_query_alias).from_(AliasedQuery(dataset_query_alias))
@@ -26,8 +28,25 @@ def build_query_for_consume(console_subject, indicators: List[Indicator], where_
         consume_query = consume_query.where(filter_)
     query_sql = consume_query.get_sql()
     log.info("sql:{0}".format(query_sql))
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(query_sql)
-    rows = cur.fetchall()
+    return query_sql
+
+
+def build_query_for_consume(console_subject, indicators: List[Indicator], where_: Where, current_user):
+    query_sql = build_consume_sql(console_subject, indicators, where_, current_user)
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query_sql)
+        rows = cur.fetchall()
     return rows
+
+
+def query_columnar_for_consume(console_subject, indicators: List[Indicator], where_: Where,
+                               current_user) -> ColumnarResult:
+    """
+    rows are transposed into columns batch by batch, the rows of whole result are never kept
+    """
+    query_sql = build_consume_sql(console_subject, indicators, where_, current_user)
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query_sql)
+        return fetch_columnar(cur, processor_settings.COLUMNAR_FETCH_SIZE)
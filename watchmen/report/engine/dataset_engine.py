@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 import traceback
@@ -5,17 +6,20 @@ import traceback
 from model.model.common.pagination import Pagination
 from pypika import functions as fn, AliasedQuery, Field, JoinType
 
-from watchmen.common.presto.presto_client import get_connection
+from watchmen.common.presto.presto_client import presto_connection
 from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_id
 from watchmen.monitor.model.query_monitor import QueryMonitor
 from watchmen.monitor.services.query_monitor_service import build_query_summary, \
-    build_result_summary, build_query_monitor
+    build_result_summary, build_query_monitor, save_query_monitor
 from watchmen.pipeline.utils.units_func import get_factor
 from watchmen.report.builder.dataset_filter import build_dataset_where, build_dataset_select_fields
 from watchmen.report.builder.dialects import PrestoQuery
 from watchmen.report.builder.space_filter import get_topic_sub_query_with_space_filter
 from watchmen.report.builder.utils import build_table_by_topic_id
+from watchmen.report.engine.dataset_paging import build_keyset_page, find_dataset_count, find_keyset
+from watchmen.report.engine.result_cache import find_query_result
 from watchmen.report.engine.sql_builder import _filter
+from watchmen.report.engine.sql_cache import find_compiled_sql, get_compiled_sql_cache, DATASET
 from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
 
 log = logging.getLogger("app." + __name__)
@@ -35,14 +39,14 @@ def get_factor_value_by_subject_and_condition(console_subject, factor_name_list,
     query = build_query_for_subject(console_subject, current_user)
     if filter_list:
         query = _filter(query, filter_list)
-    conn = get_connection()
-    cur = conn.cursor()
     sql = query.get_sql()
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        description = cur.description
 
-    cur.execute(sql)
-    rows = cur.fetchall()
-
-    index_list = __find_factor_index(cur.description, factor_name_list)
+    index_list = __find_factor_index(description, factor_name_list)
     results = []
     if index_list:
         for rw in rows:
@@ -55,46 +59,104 @@ def get_factor_value_by_subject_and_condition(console_subject, factor_name_list,
         raise KeyError("factor_name :{0} can't find in subject {1}".format(factor_name_list, console_subject.name))
 
 
+class CompiledDataset:
+    def __init__(self, count_sql: str, query, sql: str, keyset):
+        self.countSql = count_sql
+        self.query = query
+        self.sql = sql
+        self.keyset = keyset
+
+
+def compile_dataset(console_subject, current_user) -> CompiledDataset:
+    topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
+    count_query = build_count_query_for_subject(console_subject, current_user, topic_space_filter)
+    query = build_query_for_subject(console_subject, current_user, topic_space_filter)
+    return CompiledDataset(count_query.get_sql(), query, query.get_sql(),
+                           find_keyset(console_subject, topic_space_filter))
+
+
 async def load_dataset_by_subject_id(subject_id, pagination: Pagination, current_user):
+    # waiting for a pooled presto connection blocks, never in event loop
+    return await asyncio.get_event_loop().run_in_executor(None, __load_dataset, subject_id, pagination,
+                                                          current_user)
+
+
+def __load_dataset(subject_id, pagination: Pagination, current_user):
+    stamp = get_compiled_sql_cache().stamp()
     console_subject = load_console_subject_by_id(subject_id, current_user)
-    query_monitor: QueryMonitor = build_query_monitor(console_subject, query_type="dataset")
     try:
         # build query condition
-        start = time.time()
-        count_query = build_count_query_for_subject(console_subject, current_user)
-        count_sql = count_query.get_sql()
-        query_count_summary = build_query_summary(count_sql)
-        conn = get_connection()
+        compiled: CompiledDataset = find_compiled_sql(DATASET, current_user, console_subject, None, stamp,
+                                                      lambda: compile_dataset(console_subject, current_user))
+        count_sql = compiled.countSql
+        count = find_dataset_count(current_user, console_subject, count_sql,
+                                   lambda: find_query_result(current_user, count_sql, console_subject,
+                                                             lambda: __load_with_monitor(console_subject, current_user,
+                                                                                         __load_count, count_sql),
+                                                             lambda: __load_count(count_sql))[0])
+
+        page = build_keyset_page(compiled.query, compiled.sql, compiled.keyset, console_subject, pagination,
+                                 current_user)
+        if page is None:
+            # query_sql = build_page_by_row_number(pagination, query)
+            query_sql = build_pagination(compiled.sql, pagination)
+        else:
+            query_sql = page.sql
+        # monitors are saved only when queries run for requests, not for cached results or background reloads
+        rows = find_query_result(current_user, query_sql, console_subject,
+                                 lambda: __load_with_monitor(console_subject, current_user, __load_page, query_sql),
+                                 lambda: __load_page(query_sql))
+        if page is not None:
+            page.record(rows)
+        return rows, count
+    except Exception as e:
+        log.exception(e)
+        # return [],0
+
+
+def __load_with_monitor(console_subject, current_user, load, sql):
+    query_monitor: QueryMonitor = build_query_monitor(console_subject, query_type="dataset",
+                                                      current_user=current_user)
+    start = time.time()
+    try:
+        return load(sql, query_monitor)
+    except Exception:
+        query_monitor.error = traceback.format_exc()
+        query_monitor.success = False
+        raise
+    finally:
+        query_monitor.executionTime = time.time() - start
+        save_query_monitor(query_monitor)
+
+
+def __load_count(count_sql, query_monitor=None):
+    start = time.time()
+    query_count_summary = build_query_summary(count_sql)
+    log.info("sql count:{0}".format(count_sql))
+    with presto_connection() as conn:
         cur = conn.cursor()
-        log.info("sql count:{0}".format(count_sql))
         cur.execute(count_sql)
         count_rows = cur.fetchone()
-        log.info("sql result: {0}".format(count_rows))
-        query_count_summary.resultSummary = build_result_summary(count_rows, start)
+    log.info("sql result: {0}".format(count_rows))
+    query_count_summary.resultSummary = build_result_summary(count_rows, start)
+    if query_monitor:
         query_monitor.querySummaryList.append(query_count_summary)
+    return count_rows
 
-        query_start = time.time()
-        query = build_query_for_subject(console_subject, current_user)
-        # query_sql = build_page_by_row_number(pagination, query)
-        query_sql = build_pagination(query.get_sql(), pagination)
-        query_summary = build_query_summary(query_sql)
-        log.info("sql:{0}".format(query_sql))
-        print(query_sql)
+
+def __load_page(query_sql, query_monitor=None):
+    start = time.time()
+    query_summary = build_query_summary(query_sql)
+    log.info("sql:{0}".format(query_sql))
+    with presto_connection() as conn:
         cur = conn.cursor()
         cur.execute(query_sql)
         rows = cur.fetchall()
-        log.debug("sql result: {0}".format(rows))
-        query_summary.resultSummary = build_result_summary(rows, query_start)
+    log.debug("sql result: {0}".format(rows))
+    query_summary.resultSummary = build_result_summary(rows, start)
+    if query_monitor:
         query_monitor.querySummaryList.append(query_summary)
-        query_monitor.executionTime = time.time() - start
-        return rows, count_rows[0]
-    except Exception as e:
-        log.exception(e)
-        query_monitor.error = traceback.format_exc()
-        query_monitor.success = False
-    finally:
-        await save_query_monitor_data(query_monitor)
-        # return [],0
+    return rows
 
 
 def __remove_index(rows):
@@ -113,24 +175,25 @@ def build_pagination(query: str, pagination):
 
 
 async def save_query_monitor_data(query_monitor):
-    pass  ## TODO save_query_monitor_data
-    # await sync_query_monitor_data(query_monitor)
+    # queued and saved in batches by writer thread
+    save_query_monitor(query_monitor)
 
 
-def build_query_for_subject(console_subject, current_user):
-    return build_dataset_query_for_subject(console_subject, current_user)
+def build_query_for_subject(console_subject, current_user, topic_space_filter=None):
+    return build_dataset_query_for_subject(console_subject, current_user, topic_space_filter=topic_space_filter)
 
 
-def build_count_query_for_subject(console_subject, current_user):
-    return build_dataset_query_for_subject(console_subject, current_user, True)
+def build_count_query_for_subject(console_subject, current_user, topic_space_filter=None):
+    return build_dataset_query_for_subject(console_subject, current_user, True, topic_space_filter)
 
 
-def build_dataset_query_for_subject(console_subject, current_user, for_count=False):
+def build_dataset_query_for_subject(console_subject, current_user, for_count=False, topic_space_filter=None):
     dataset = console_subject.dataset
     if dataset is None:
         return None
 
-    topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
+    if topic_space_filter is None:
+        topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
 
     if dataset.joins and len(dataset.joins) > 0:
         topic_id = dataset.joins[0].topicId
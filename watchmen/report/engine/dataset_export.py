@@ -0,0 +1,162 @@
+import asyncio
+import csv
+import io
+import logging
+import time
+from contextlib import ExitStack
+from typing import List
+
+from watchmen.common.presto.presto_client import presto_connection
+from watchmen.config.config import processor_settings
+from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_id
+from watchmen.report.engine.columnar import build_arrow_schema, build_arrow_arrays
+from watchmen.report.engine.dataset_engine import compile_dataset
+from watchmen.report.engine.sql_cache import find_compiled_sql, get_compiled_sql_cache, DATASET
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+log = logging.getLogger("app." + __name__)
+
+CSV = "csv"
+PARQUET = "parquet"
+
+
+def parquet_export_enabled() -> bool:
+    return pyarrow is not None
+
+
+class CsvChunkWriter:
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+
+    def header(self) -> bytes:
+        return self.write([self.columns])
+
+    @staticmethod
+    def write(rows, description=None) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    def close(self) -> bytes:
+        return b""
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    collects bytes written by parquet writer, they are taken out after each row group
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position = self.position + len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetChunkWriter:
+    """
+    one row group per chunk, the schema is built from cursor description when the first chunk is written
+    """
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self.sink = ChunkSink()
+        self.writer = None
+
+    def header(self) -> bytes:
+        return b""
+
+    def write(self, rows, description=None) -> bytes:
+        values = [[row[index] for row in rows] for index in range(len(self.columns))]
+        if self.writer is None:
+            self.writer = parquet.ParquetWriter(self.sink, build_arrow_schema(self.columns, description, values))
+        arrays = build_arrow_arrays(self.writer.schema, values)
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.writer.schema))
+        return self.sink.take()
+
+    def close(self) -> bytes:
+        if self.writer is None:
+            return b""
+        self.writer.close()
+        return self.sink.take()
+
+
+def create_chunk_writer(export_format: str, columns: List[str]):
+    if export_format == PARQUET:
+        return ParquetChunkWriter(columns)
+    return CsvChunkWriter(columns)
+
+
+def find_export_subject(subject_id, current_user):
+    """
+    returns the subject and its compiled dataset
+    """
+    stamp = get_compiled_sql_cache().stamp()
+    console_subject = load_console_subject_by_id(subject_id, current_user)
+    if console_subject is None or console_subject.dataset is None:
+        return console_subject, None
+    compiled = find_compiled_sql(DATASET, current_user, console_subject, None, stamp,
+                                 lambda: compile_dataset(console_subject, current_user))
+    return console_subject, compiled
+
+
+async def export_dataset(console_subject, compiled, export_format: str, max_rows: int, is_disconnected):
+    """
+    rows are fetched in chunks and written to bytes one chunk by one, never all in memory.
+    the query is cancelled when client is disconnected or the generator is closed before rows are exhausted
+    """
+    loop = asyncio.get_event_loop()
+    columns = [column.alias for column in console_subject.dataset.columns]
+    writer = create_chunk_writer(export_format, columns)
+    sql = compiled.sql + f' LIMIT {max_rows}'
+    log.info("export sql:{0}".format(sql))
+    start = time.time()
+    exported = 0
+    exhausted = False
+    with ExitStack() as stack:
+        # waiting for a pooled connection blocks, never in event loop
+        conn = await loop.run_in_executor(None, stack.enter_context, presto_connection())
+        cur = conn.cursor()
+        try:
+            await loop.run_in_executor(None, cur.execute, sql)
+            yield writer.header()
+            while True:
+                rows = await loop.run_in_executor(None, cur.fetchmany, processor_settings.EXPORT_FETCH_SIZE)
+                if not rows:
+                    exhausted = True
+                    break
+                exported = exported + len(rows)
+                yield writer.write(rows, cur.description)
+                if await is_disconnected():
+                    log.warning("export of subject {0} is cancelled by client".format(console_subject.subjectId))
+                    break
+            yield writer.close()
+        finally:
+            if not exhausted:
+                try:
+                    cur.cancel()
+                except Exception:
+                    log.warning("cancel export query failed")
+            log.info("export {0} rows of subject {1} in {2} seconds".format(
+                exported, console_subject.subjectId, time.time() - start))
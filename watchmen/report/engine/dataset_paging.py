@@ -0,0 +1,171 @@
+import hashlib
+import threading
+from decimal import Decimal
+from typing import List, Optional
+
+from cacheout import Cache
+from pypika import Criterion
+
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+from watchmen.parser.console_paramter_parser import ConsoleParameterParser
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+
+DATASET_COUNT = "dataset_count"
+DATASET_BOUNDARY = "dataset_boundary"
+UNIQUE_INDEX_PREFIX = "u-"
+INNER_JOIN_TYPES = ("inner", "", None)
+KEY_VALUE_TYPES = (str, int, float, Decimal)
+
+# boundary keys of pages by (tenant, subject, filter hash, page size), a boundary is the key of last row of page
+boundary_cache = Cache(maxsize=processor_settings.DATASET_PAGING_CACHE_SIZE,
+                       ttl=processor_settings.DATASET_BOUNDARY_CACHE_TTL)
+count_cache = Cache(maxsize=processor_settings.DATASET_PAGING_CACHE_SIZE,
+                    ttl=processor_settings.DATASET_COUNT_CACHE_TTL)
+boundary_lock = threading.Lock()
+
+
+def build_filter_hash(sql: str) -> str:
+    """
+    dataset filters and space filters are compiled into sql
+    """
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()
+
+
+def find_keyset_columns(console_subject) -> List[int]:
+    """
+    indexes of dataset columns which identify a row, all factors of one unique index of each topic must be selected.
+    keyset is not used when dataset is outer joined, or some topic has no unique index selected
+    """
+    dataset = console_subject.dataset
+    if dataset is None or not dataset.columns:
+        return []
+    if any(join.type not in INNER_JOIN_TYPES for join in dataset.joins):
+        return []
+    selected = {}
+    for index, column in enumerate(dataset.columns):
+        parameter = column.parameter
+        if parameter is not None and parameter.kind == "topic" and parameter.factorId:
+            selected.setdefault((parameter.topicId, parameter.factorId), index)
+    topic_ids = list(dict.fromkeys([topic_id for topic_id, _ in selected.keys()]))
+    for join in dataset.joins:
+        topic_ids.extend([join.topicId, join.secondaryTopicId])
+    key_indexes = []
+    for topic_id in dict.fromkeys(topic_ids):
+        indexes = __find_unique_index_columns(get_topic_by_id(topic_id), selected)
+        if indexes is None:
+            return []
+        key_indexes.extend(indexes)
+    return key_indexes
+
+
+def __find_unique_index_columns(topic, selected) -> Optional[List[int]]:
+    if topic is None:
+        return None
+    groups = {}
+    for factor in topic.factors:
+        if factor.indexGroup and factor.indexGroup.startswith(UNIQUE_INDEX_PREFIX):
+            groups.setdefault(factor.indexGroup, []).append(factor.factorId)
+    for index_group in sorted(groups.keys()):
+        keys = [(topic.topicId, factor_id) for factor_id in groups[index_group]]
+        if all(key in selected for key in keys):
+            return [selected[key] for key in keys]
+    return None
+
+
+class Keyset:
+    def __init__(self, key_indexes: List[int], key_terms: list):
+        self.keyIndexes = key_indexes
+        self.keyTerms = key_terms
+
+
+def find_keyset(console_subject, topic_space_filter) -> Optional[Keyset]:
+    """
+    returns None when dataset has no stable key
+    """
+    key_indexes = find_keyset_columns(console_subject)
+    if not key_indexes:
+        return None
+    columns = console_subject.dataset.columns
+    key_terms = [ConsoleParameterParser(columns[index].parameter, topic_space_filter).parse_parameter().result
+                 for index in key_indexes]
+    return Keyset(key_indexes, key_terms)
+
+
+class KeysetPage:
+    """
+    rows are ordered by key columns with nulls first, a page is read after the boundary of nearest page before it,
+    so page N skips only the pages between them instead of all N - 1 pages.
+    a boundary with null is never recorded, rows with null keys are always before it.
+    """
+
+    def __init__(self, query, keyset: Keyset, boundaries: dict, pagination):
+        self.keyIndexes = keyset.keyIndexes
+        self.boundaries = boundaries
+        self.pageNumber = pagination.pageNumber
+        self.pageSize = pagination.pageSize
+        with boundary_lock:
+            start_page = max([page for page in boundaries.keys() if page < self.pageNumber], default=0)
+            start_key = boundaries.get(start_page)
+        if start_page > 0:
+            query = query.where(build_keyset_criterion(keyset.keyTerms, start_key))
+        for term in keyset.keyTerms:
+            query = query.orderby(term.notnull(), term)
+        skip = self.pageSize * (self.pageNumber - 1 - start_page)
+        if skip > 0:
+            self.sql = query.get_sql() + f' OFFSET {skip} LIMIT {self.pageSize}'
+        else:
+            self.sql = query.get_sql() + f' LIMIT {self.pageSize}'
+
+    def record(self, rows):
+        if not rows or len(rows) < self.pageSize:
+            return
+        key = tuple(rows[-1][index] for index in self.keyIndexes)
+        if all(isinstance(value, KEY_VALUE_TYPES) and not isinstance(value, bool) for value in key):
+            with boundary_lock:
+                self.boundaries[self.pageNumber] = key
+
+
+def build_keyset_criterion(key_terms: list, boundary: tuple):
+    """
+    (k1, k2) > (v1, v2) as k1 > v1 or (k1 = v1 and k2 > v2)
+    """
+    criteria = []
+    for index, term in enumerate(key_terms):
+        equals = [key_terms[i] == boundary[i] for i in range(index)]
+        criteria.append(Criterion.all([*equals, term > boundary[index]]))
+    return Criterion.any(criteria)
+
+
+def build_keyset_page(query, sql: str, keyset: Optional[Keyset], console_subject, pagination,
+                      current_user) -> Optional[KeysetPage]:
+    """
+    returns None when dataset has no stable key, the page is read by offset
+    """
+    if keyset is None:
+        return None
+    key = (current_user.tenantId, console_subject.subjectId, build_filter_hash(sql), pagination.pageSize)
+    with boundary_lock:
+        boundaries = boundary_cache.get(key)
+        if boundaries is None:
+            CACHE_MISS.labels(DATASET_BOUNDARY).inc()
+            boundaries = {}
+            boundary_cache.set(key, boundaries)
+        else:
+            CACHE_HIT.labels(DATASET_BOUNDARY).inc()
+    return KeysetPage(query, keyset, boundaries, pagination)
+
+
+def find_dataset_count(current_user, console_subject, count_sql: str, load) -> int:
+    """
+    count of dataset is cached per subject and filter hash, it is refreshed after ttl
+    """
+    key = (current_user.tenantId, console_subject.subjectId, build_filter_hash(count_sql))
+    count = count_cache.get(key)
+    if count is not None:
+        CACHE_HIT.labels(DATASET_COUNT).inc()
+        return count
+    CACHE_MISS.labels(DATASET_COUNT).inc()
+    count = load()
+    count_cache.set(key, count)
+    return count
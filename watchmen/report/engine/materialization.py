@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from cacheout import Cache
+from model.model.common.user import User
+from pypika import Table, Schema, Field, Criterion, AliasedQuery
+from pypika.terms import LiteralValue
+
+from watchmen.common.constants.pipeline_constants import INSERT_TIME, UPDATE_TIME
+from watchmen.common.presto.presto_client import presto_connection
+from watchmen.config.config import processor_settings
+from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_id
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+from watchmen.report.builder.dialects import PrestoQuery
+from watchmen.report.builder.pushdown import find_source_topic_ids
+from watchmen.report.builder.space_filter import get_topic_sub_query_with_space_filter
+from watchmen.report.builder.utils import build_table_by_topic_id
+from watchmen.report.engine.dataset_engine import build_query_for_subject, compile_dataset
+from watchmen.report.engine.dataset_paging import build_filter_hash, INNER_JOIN_TYPES
+from watchmen.report.engine.result_cache import invalidate_query_results
+from watchmen.report.engine.sql_cache import find_compiled_sql, DATASET
+from watchmen.report.model.materialization import SubjectMaterialization
+from watchmen.report.storage.materialization_storage import load_materialization, create_materialization, \
+    save_materialization, load_all_materializations, delete_materialization
+from watchmen.topic.storage.topic_schema_storage import get_topic_by_id
+
+log = logging.getLogger("app." + __name__)
+
+MATERIALIZATION = "materialization"
+TABLE_PREFIX = "subject_mv_"
+READY = "READY"
+FAILED = "FAILED"
+
+# materializations by (tenant, subject), None is cached when subject is not materialized
+materialization_cache = Cache(maxsize=1000, ttl=processor_settings.MATERIALIZATION_LOOKUP_TTL)
+# one refresh at a time in this process
+refresh_lock = threading.Lock()
+
+
+def build_materialized_table(table_name: str) -> Table:
+    schema = Schema(processor_settings.MATERIALIZATION_SCHEMA, LiteralValue(processor_settings.MATERIALIZATION_CATALOG))
+    return Table(table_name, schema)
+
+
+def build_materialized_query(table_name: str, columns):
+    """
+    replaces the dataset query of subject, columns of materialized table are named by aliases of dataset columns
+    """
+    return PrestoQuery.from_(build_materialized_table(table_name)).select(*[Field(column.alias) for column in columns])
+
+
+def build_timestamp(value: datetime):
+    return LiteralValue("timestamp \'{0}\'".format(value.strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def build_watermark_criterion(insert_times: List[Field], low: Optional[datetime], high: datetime):
+    """
+    rows joined from topic rows all inserted until high, and some of them inserted after low.
+    rows without insert time are taken as inserted before any watermark
+    """
+    criteria = [Criterion.any([insert_time.isnull(), insert_time <= build_timestamp(high)])
+                for insert_time in insert_times]
+    if low is not None:
+        criteria.append(Criterion.any([insert_time > build_timestamp(low) for insert_time in insert_times]))
+    return Criterion.all(criteria)
+
+
+def is_append_only(dataset) -> bool:
+    """
+    with inner joins only, a row inserted into any topic never changes rows already joined
+    """
+    return all(join.type in INNER_JOIN_TYPES for join in dataset.joins)
+
+
+def __find_insert_time(topic_id, topic_space_filter) -> Field:
+    sub_query = topic_space_filter(topic_id)
+    if sub_query:
+        return Field(INSERT_TIME, None, AliasedQuery(sub_query["alias"]))
+    else:
+        return Field(INSERT_TIME, None, build_table_by_topic_id(topic_id))
+
+
+def __exists(cur, table, criterion) -> bool:
+    cur.execute(PrestoQuery.from_(table).select(LiteralValue("1")).where(criterion).limit(1).get_sql())
+    return len(cur.fetchall()) > 0
+
+
+def __find_changes(cur, topic_id, watermark: datetime):
+    """
+    returns (inserted, updated) of topic rows after watermark, updated rows are inserted before watermark
+    """
+    table = build_table_by_topic_id(topic_id)
+    insert_time = Field(INSERT_TIME, None, table)
+    update_time = Field(UPDATE_TIME, None, table)
+    inserted = __exists(cur, table, insert_time > build_timestamp(watermark))
+    updated = __exists(cur, table, (update_time > build_timestamp(watermark)) & (
+            insert_time.isnull() | (insert_time <= build_timestamp(watermark))))
+    return inserted, updated
+
+
+def __execute_count(cur, sql: str) -> int:
+    log.info("materialization sql:{0}".format(sql))
+    cur.execute(sql)
+    rows = cur.fetchall()
+    return rows[0][0] if rows and rows[0] else 0
+
+
+def __drop_table(cur, table_name: str):
+    cur.execute("DROP TABLE IF EXISTS {0}".format(build_materialized_table(table_name).get_sql()))
+    cur.fetchall()
+
+
+def __drop_retired_table(cur, materialization: SubjectMaterialization, now: datetime) -> bool:
+    """
+    retired table is kept until workers cached it before rebuild see the new table, returns whether it is dropped
+    """
+    if materialization.retiredTableName is None:
+        return True
+    if (now - materialization.rebuiltAt).total_seconds() <= processor_settings.MATERIALIZATION_LOOKUP_TTL:
+        return False
+    __drop_table(cur, materialization.retiredTableName)
+    materialization.retiredTableName = None
+    return True
+
+
+def __is_outdated(materialization: SubjectMaterialization, sql_hash: str, now: datetime) -> bool:
+    """
+    dataset is changed, or it is not rebuilt in rebuild interval, deleted topic rows are only removed by rebuild
+    """
+    if materialization.tableName is None or materialization.sqlHash != sql_hash:
+        return True
+    return (now - materialization.rebuiltAt).total_seconds() > processor_settings.MATERIALIZATION_REBUILD_INTERVAL
+
+
+def __refresh(materialization: SubjectMaterialization, console_subject, current_user) -> List[str]:
+    """
+    rebuilt when dataset is changed, has outer joins and some topic is inserted, or some topic row is updated
+    after watermark; otherwise rows joined from newly inserted topic rows are appended.
+    returns ids of topics changed
+    """
+    dataset = console_subject.dataset
+    topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
+    query = build_query_for_subject(console_subject, current_user, topic_space_filter)
+    sql_hash = build_filter_hash(query.get_sql())
+    topic_ids = find_source_topic_ids(dataset)
+    now = datetime.now()
+    high = now.replace(microsecond=0) - timedelta(seconds=processor_settings.MATERIALIZATION_WATERMARK_LAG)
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        retired_dropped = __drop_retired_table(cur, materialization, now)
+        if __is_outdated(materialization, sql_hash, now):
+            changes = {topic_id: (True, True) for topic_id in topic_ids}
+        else:
+            changes = {topic_id: __find_changes(cur, topic_id, materialization.watermark) for topic_id in topic_ids}
+        inserted = [topic_id for topic_id in topic_ids if changes[topic_id][0]]
+        updated = [topic_id for topic_id in topic_ids if changes[topic_id][1]]
+        if updated or (inserted and not is_append_only(dataset)):
+            if not retired_dropped:
+                log.warning("rebuild of subject {0} is postponed until table {1} is dropped".format(
+                    console_subject.subjectId, materialization.retiredTableName))
+                return []
+            table_name = "{0}{1}_{2}".format(TABLE_PREFIX, console_subject.subjectId, high.strftime("%Y%m%d%H%M%S"))
+            insert_times = [__find_insert_time(topic_id, topic_space_filter) for topic_id in topic_ids]
+            sql = "CREATE TABLE {0} AS {1}".format(
+                build_materialized_table(table_name).get_sql(),
+                query.where(build_watermark_criterion(insert_times, None, high)).get_sql())
+            materialization.rowCount = __execute_count(cur, sql)
+            materialization.retiredTableName = materialization.tableName
+            materialization.tableName = table_name
+            materialization.sqlHash = sql_hash
+            materialization.rebuiltAt = now
+        elif inserted:
+            insert_times = [__find_insert_time(topic_id, topic_space_filter) for topic_id in topic_ids]
+            criterion = build_watermark_criterion(insert_times, materialization.watermark, high)
+            sql = "INSERT INTO {0} {1}".format(build_materialized_table(materialization.tableName).get_sql(),
+                                               query.where(criterion).get_sql())
+            materialization.rowCount = (materialization.rowCount or 0) + __execute_count(cur, sql)
+    materialization.watermark = high
+    materialization.refreshedAt = now
+    return list(dict.fromkeys(inserted + updated))
+
+
+def refresh_materialization(subject_id, current_user, create: bool = False) -> Optional[SubjectMaterialization]:
+    """
+    refresh materialized dataset of subject, it is materialized first when create is true.
+    returns None when subject is not materialized
+    """
+    with refresh_lock:
+        materialization = load_materialization(subject_id, current_user)
+        if materialization is None:
+            if not create:
+                return None
+            materialization = SubjectMaterialization(subjectId=subject_id, tenantId=current_user.tenantId)
+            create_materialization(materialization)
+        console_subject = load_console_subject_by_id(subject_id, current_user)
+        if console_subject is None or console_subject.dataset is None or not console_subject.dataset.columns:
+            # subject is deleted or has no dataset
+            __drop_materialization(materialization)
+            return None
+        try:
+            changed_topic_ids = __refresh(materialization, console_subject, current_user)
+            materialization.status = READY
+            materialization.error = None
+        except Exception as e:
+            log.exception(e)
+            changed_topic_ids = []
+            materialization.status = FAILED
+            materialization.error = str(e)[:1000]
+        save_materialization(materialization)
+        materialization_cache.set((materialization.tenantId, subject_id), materialization)
+    for topic_id in changed_topic_ids:
+        # results queried from materialization before refresh are outdated
+        invalidate_query_results(get_topic_by_id(topic_id))
+    return materialization
+
+
+def drop_materialization(subject_id, current_user):
+    with refresh_lock:
+        materialization = load_materialization(subject_id, current_user)
+        if materialization is not None:
+            __drop_materialization(materialization)
+
+
+def __drop_materialization(materialization: SubjectMaterialization):
+    delete_materialization(materialization.subjectId)
+    materialization_cache.delete((materialization.tenantId, materialization.subjectId))
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        for table_name in [materialization.retiredTableName, materialization.tableName]:
+            if table_name is not None:
+                __drop_table(cur, table_name)
+
+
+def refresh_all_materializations():
+    for materialization in load_all_materializations():
+        try:
+            refresh_materialization(materialization.subjectId, User(tenantId=materialization.tenantId))
+        except Exception as e:
+            log.exception(e)
+
+
+def __find_materialization(subject_id, current_user) -> Optional[SubjectMaterialization]:
+    key = (current_user.tenantId, subject_id)
+    if materialization_cache.has(key):
+        CACHE_HIT.labels(MATERIALIZATION).inc()
+        return materialization_cache.get(key)
+    CACHE_MISS.labels(MATERIALIZATION).inc()
+    materialization = load_materialization(subject_id, current_user)
+    materialization_cache.set(key, materialization)
+    return materialization
+
+
+def find_materialized_table(console_subject, current_user, stamp: int) -> Optional[str]:
+    """
+    returns name of materialized table when it is refreshed in max staleness and dataset is not changed since then
+    """
+    if not processor_settings.MATERIALIZATION_ON:
+        return None
+    materialization = __find_materialization(console_subject.subjectId, current_user)
+    if materialization is None or materialization.tableName is None or materialization.refreshedAt is None:
+        return None
+    staleness = (datetime.now() - materialization.refreshedAt).total_seconds()
+    if staleness > processor_settings.MATERIALIZATION_MAX_STALENESS:
+        return None
+    compiled = find_compiled_sql(DATASET, current_user, console_subject, None, stamp,
+                                 lambda: compile_dataset(console_subject, current_user))
+    if compiled is None or build_filter_hash(compiled.sql) != materialization.sqlHash:
+        return None
+    return materialization.tableName
+
+
+class MaterializationRefresher:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.running = True
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while self.running:
+            try:
+                await loop.run_in_executor(None, refresh_all_materializations)
+            except Exception:
+                log.error(traceback.format_exc())
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+
+materialization_refresher: MaterializationRefresher = None
+
+
+def start_materialization_refresher():
+    global materialization_refresher
+    if processor_settings.MATERIALIZATION_REFRESH_INTERVAL <= 0:
+        return
+    materialization_refresher = MaterializationRefresher(processor_settings.MATERIALIZATION_REFRESH_INTERVAL)
+    asyncio.ensure_future(materialization_refresher.run())
+
+
+def stop_materialization_refresher():
+    if materialization_refresher is not None:
+        materialization_refresher.stop()
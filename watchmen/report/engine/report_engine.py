@@ -1,22 +1,36 @@
+import asyncio
 import logging
+import threading
 import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from model.model.report.report import Report
 from pypika import AliasedQuery
 from pypika import Order
 
-from watchmen.common.presto.presto_client import get_connection
-from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_report_id
-from watchmen.monitor.services.query_monitor_service import build_query_summary, build_result_summary
+from watchmen.common.presto.presto_client import presto_connection
+from watchmen.config.config import processor_settings
+from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_report_id, \
+    load_console_subjects_by_report_ids
+from watchmen.monitor.services.query_monitor_service import build_query_summary, build_result_summary, \
+    build_query_monitor_report, save_query_monitor
 from watchmen.report.builder.dialects import PrestoQuery
 from watchmen.report.builder.funnel import build_report_funnels
+from watchmen.report.builder.pushdown import push_down_report_filters
 from watchmen.report.builder.report_filer import build_indicators, build_dimensions, build_report_where
 from watchmen.report.builder.space_filter import get_topic_sub_query_with_space_filter
 from watchmen.report.engine.dataset_engine import build_dataset_query_for_subject
-from watchmen.report.storage.report_storage import load_report_by_id
+from watchmen.report.engine.materialization import find_materialized_table, build_materialized_query
+from watchmen.report.engine.result_cache import find_query_result
+from watchmen.report.engine.sql_cache import find_compiled_sql, get_compiled_sql_cache, CHART
+from watchmen.report.storage.report_storage import load_report_by_id, load_reports_by_ids
 
 log = logging.getLogger("app." + __name__)
 
+dashboard_chart_executor = ThreadPoolExecutor(max_workers=processor_settings.DASHBOARD_CHART_CONCURRENCY,
+                                              thread_name_prefix="dashboard-chart")
+
 
 def build_query_for_chart(chart_id, current_user):
     console_subject = load_console_subject_by_report_id(chart_id, current_user)
@@ -25,8 +39,18 @@ def build_query_for_chart(chart_id, current_user):
     return __build_chart_query(report, console_subject, current_user)
 
 
-def __build_chart_query(report, console_subject, current_user):
-    q = build_dataset_query_for_subject(console_subject, current_user)
+def __build_chart_query(report, console_subject, current_user, topic_space_filter=None, materialized_table=None):
+    if topic_space_filter is None:
+        topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
+    filters, funnels = report.filters, report.funnels
+    if materialized_table is None:
+        dataset_space_filter = topic_space_filter
+        if processor_settings.REPORT_FILTER_PUSHDOWN_ON:
+            pushdown = push_down_report_filters(report, console_subject.dataset, topic_space_filter)
+            dataset_space_filter, filters, funnels = pushdown.topicSpaceFilter, pushdown.filters, pushdown.funnels
+        q = build_dataset_query_for_subject(console_subject, current_user, topic_space_filter=dataset_space_filter)
+    else:
+        q = build_materialized_query(materialized_table, console_subject.dataset.columns)
     dataset_query_alias = "chart_dataset"
     chart_query = PrestoQuery.with_(q, dataset_query_alias).from_(AliasedQuery(dataset_query_alias))
     _indicator_selects, _indicator_in_group_by = build_indicators(report.indicators,
@@ -51,44 +75,63 @@ def __build_chart_query(report, console_subject, current_user):
             if count:
                 chart_query = chart_query.limit(count)
 
-    if report.filters:
-        topic_space_filter = get_topic_sub_query_with_space_filter(console_subject, current_user)
-        chart_query = chart_query.where(build_report_where(report.filters,
+    if filters:
+        chart_query = chart_query.where(build_report_where(filters,
                                                            topic_space_filter,
                                                            dataset_query_alias,
                                                            console_subject.dataset.columns
                                                            ))
-    if report.funnels:
-        chart_query = chart_query.where(build_report_funnels(report.funnels,
+    if funnels:
+        chart_query = chart_query.where(build_report_funnels(funnels,
                                                              dataset_query_alias,
                                                              console_subject.dataset.columns
                                                              ))
     return chart_query
 
 
+def __compile_chart_sql(report, console_subject, current_user, topic_space_filter=None,
+                        materialized_table=None) -> str:
+    query = __build_chart_query(report, console_subject, current_user, topic_space_filter, materialized_table)
+    return query.get_sql() if query is not None else ""
+
+
+def __chart_sql_name(materialized_table) -> str:
+    # materialized table is renamed when rebuilt, so it is a part of cache key
+    return CHART if materialized_table is None else "{0}@{1}".format(CHART, materialized_table)
+
+
 async def load_chart_dataset(report_id, current_user):
-    try:
-        query = build_query_for_chart(report_id, current_user)
+    # waiting for a pooled presto connection blocks, never in event loop
+    return await asyncio.get_event_loop().run_in_executor(None, __load_chart, report_id, current_user)
 
-        if query is None or query.get_sql() == "":
+
+def __load_chart(report_id, current_user):
+    try:
+        stamp = get_compiled_sql_cache().stamp()
+        console_subject = load_console_subject_by_report_id(report_id, current_user)
+        report: Report = load_report_by_id(report_id, current_user)
+        materialized_table = find_materialized_table(console_subject, current_user, stamp)
+        query_sql = find_compiled_sql(__chart_sql_name(materialized_table), current_user, console_subject,
+                                      report_id, stamp,
+                                      lambda: __compile_chart_sql(report, console_subject, current_user,
+                                                                  materialized_table=materialized_table))
+        if query_sql == "":
             return []
         else:
-            rows = __load_chart_dataset(query, query_monitor=None)
-            return rows
+            return __load_monitored_chart(report, console_subject, query_sql, current_user)
     except Exception as e:
         log.exception(e)
 
 
-def __load_chart_dataset(query, query_monitor=None):
+def __load_chart_dataset(query_sql, query_monitor=None):
     start = time.time()
-    conn = get_connection()
-    query_sql = query.get_sql()
     query_sql_summary = build_query_summary(query_sql)
     log.info("sql: {0}".format(query_sql))
     # print(query_sql)
-    cur = conn.cursor()
-    cur.execute(query_sql)
-    rows = cur.fetchall()
+    with presto_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query_sql)
+        rows = cur.fetchall()
     log.debug("sql result: {0}".format(rows))
     query_sql_summary.resultSummary = build_result_summary(rows, start)
 
@@ -98,10 +141,87 @@ def __load_chart_dataset(query, query_monitor=None):
     return rows or []
 
 
+def __load_monitored_chart(report, console_subject, query_sql, current_user):
+    # monitor is recorded only when the query runs, not for cached results
+    return find_query_result(current_user, query_sql, console_subject,
+                             lambda: __load_chart_dataset_with_monitor(report, query_sql, current_user))
+
+
+def __load_chart_dataset_with_monitor(report, query_sql, current_user):
+    query_monitor = build_query_monitor_report(report, "report", current_user)
+    start = time.time()
+    try:
+        return __load_chart_dataset(query_sql, query_monitor)
+    except Exception:
+        query_monitor.error = traceback.format_exc()
+        query_monitor.success = False
+        raise
+    finally:
+        query_monitor.executionTime = time.time() - start
+        save_query_monitor(query_monitor)
+
+
 def load_chart_dataset_temp(report, current_user):
     console_subject = load_console_subject_by_report_id(report.reportId, current_user)
-    query = __build_chart_query(report, console_subject, current_user)
-    if query is None or query.get_sql() == "":
+    # report is not saved yet, it is compiled every time
+    materialized_table = find_materialized_table(console_subject, current_user, get_compiled_sql_cache().stamp())
+    query_sql = __compile_chart_sql(report, console_subject, current_user, materialized_table=materialized_table)
+    if query_sql == "":
         return []
     else:
-        return __load_chart_dataset(query)
+        return __load_monitored_chart(report, console_subject, query_sql, current_user)
+
+
+def __load_dashboard_chart(report, console_subject, find_space_filter, stamp, current_user):
+    materialized_table = find_materialized_table(console_subject, current_user, stamp)
+    query_sql = find_compiled_sql(__chart_sql_name(materialized_table), current_user, console_subject,
+                                  report.reportId, stamp,
+                                  lambda: __compile_chart_sql(report, console_subject, current_user,
+                                                              find_space_filter(console_subject), materialized_table))
+    if query_sql == "":
+        return []
+    return __load_monitored_chart(report, console_subject, query_sql, current_user)
+
+
+async def load_dashboard_charts(dashboard, current_user):
+    """
+    reports and subjects of dashboard are loaded at once, then charts are queried concurrently.
+    space filters are resolved once per subject, only when some chart of it is not compiled yet.
+    yields (report id, rows, error) in the order charts are finished
+    """
+    report_ids = [dashboard_report.reportId for dashboard_report in dashboard.reports or []]
+    if not report_ids:
+        return
+    stamp = get_compiled_sql_cache().stamp()
+    reports = {report.reportId: report for report in load_reports_by_ids(report_ids, current_user)}
+    subjects = {}
+    for console_subject in load_console_subjects_by_report_ids(report_ids, current_user):
+        for report_id in console_subject.reportIds:
+            subjects[report_id] = console_subject
+    space_filters = {}
+    space_filter_lock = threading.Lock()
+
+    def find_space_filter(console_subject):
+        with space_filter_lock:
+            if console_subject.subjectId not in space_filters:
+                space_filters[console_subject.subjectId] = get_topic_sub_query_with_space_filter(console_subject,
+                                                                                                  current_user)
+            return space_filters[console_subject.subjectId]
+
+    loop = asyncio.get_event_loop()
+
+    async def load(report_id):
+        report = reports.get(report_id)
+        console_subject = subjects.get(report_id)
+        if report is None or console_subject is None:
+            return report_id, None, "report {0} is not found".format(report_id)
+        try:
+            rows = await loop.run_in_executor(dashboard_chart_executor, __load_dashboard_chart, report,
+                                              console_subject, find_space_filter, stamp, current_user)
+            return report_id, rows, None
+        except Exception as e:
+            log.exception(e)
+            return report_id, None, str(e)
+
+    for finished in asyncio.as_completed([load(report_id) for report_id in dict.fromkeys(report_ids)]):
+        yield await finished
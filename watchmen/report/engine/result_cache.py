@@ -0,0 +1,190 @@
+import logging
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set
+
+from cacheout import LRUCache
+from model.model.topic.topic import Topic
+
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+
+log = logging.getLogger("app." + __name__)
+
+QUERY_RESULT_CHANNEL = "query_result"
+QUERY_RESULT = "query_result"
+QUERY_RESULT_STALE = "query_result_stale"
+
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def find_topic_ids_of_subject(console_subject) -> Set[str]:
+    """
+    topics referred by columns, joins and filters of subject dataset
+    """
+    topic_ids = set()
+
+    def collect(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in ("topicId", "secondaryTopicId") and item:
+                    topic_ids.add(item)
+                else:
+                    collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    if console_subject.dataset is not None:
+        collect(console_subject.dataset.dict())
+    return topic_ids
+
+
+class CachedResult:
+    def __init__(self, rows, topic_ids: Set[str]):
+        self.rows = rows
+        self.topicIds = topic_ids
+        self.createdAt = time.time()
+
+
+class QueryResultCache:
+    """
+    results of report queries by (tenant, normalized sql). space filters are compiled into sql, so they are part of key.
+
+    a result is fresh in ttl, and served in stale ttl after it while it is reloaded in background.
+    results of a topic are removed when the topic is written, a result loaded during a write is not cached,
+    it is guarded by the versions of its topics.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float, refresh_workers: int, publish_interval: float):
+        self.ttl = ttl
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self.keysByTopic: Dict[str, Set[tuple]] = {}
+        self.topicVersions: Dict[str, int] = {}
+        self.refreshing: Set[tuple] = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="query-refresh")
+        self.publishInterval = publish_interval
+        self.lastPublished: Dict[str, float] = {}
+        self.pendingTopics: Set[str] = set()
+
+    def find(self, tenant_id, sql: str, topic_ids: Set[str], load, reload=None):
+        key = (tenant_id, normalize_sql(sql))
+        cached: CachedResult = self.cache.get(key)
+        if cached is None:
+            CACHE_MISS.labels(QUERY_RESULT).inc()
+            return self.load(key, topic_ids, load)
+        if time.time() - cached.createdAt < self.ttl:
+            CACHE_HIT.labels(QUERY_RESULT).inc()
+        else:
+            CACHE_HIT.labels(QUERY_RESULT_STALE).inc()
+            self.refresh(key, topic_ids, reload or load)
+        return cached.rows
+
+    def load(self, key, topic_ids: Set[str], load):
+        versions = self.__get_versions(topic_ids)
+        rows = load()
+        if rows is not None:
+            self.set(key, CachedResult(rows, topic_ids), versions)
+        return rows
+
+    def refresh(self, key, topic_ids: Set[str], load):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def reload():
+            try:
+                self.load(key, topic_ids, load)
+            except Exception:
+                log.error("refresh query result failed: {0}".format(traceback.format_exc()))
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        self.executor.submit(reload)
+
+    def set(self, key, result: CachedResult, versions: Dict[str, int]):
+        with self.lock:
+            if versions != self.__get_versions(result.topicIds):
+                # some topic is written during loading
+                return
+            self.cache.set(key, result)
+            for topic_id in result.topicIds:
+                keys = self.keysByTopic.setdefault(topic_id, set())
+                keys.add(key)
+                if len(keys) > self.cache.maxsize:
+                    # keys evicted from cache are left in index, remove them
+                    self.keysByTopic[topic_id] = set(filter(self.cache.has, keys))
+
+    def __get_versions(self, topic_ids: Set[str]) -> Dict[str, int]:
+        return {topic_id: self.topicVersions.get(topic_id, 0) for topic_id in topic_ids}
+
+    def invalidate(self, topic_id, publish: bool = True):
+        with self.lock:
+            self.topicVersions[topic_id] = self.topicVersions.get(topic_id, 0) + 1
+            for key in self.keysByTopic.pop(topic_id, set()):
+                self.cache.delete(key)
+        if publish:
+            self.publish(topic_id)
+
+    def publish(self, topic_id):
+        """
+        topics are written by pipelines continuously, other workers are notified at most once in publish interval
+        """
+        with self.lock:
+            if topic_id in self.pendingTopics:
+                return
+            delay = self.lastPublished.get(topic_id, 0) + self.publishInterval - time.time()
+            if delay > 0:
+                self.pendingTopics.add(topic_id)
+                timer = threading.Timer(delay, self.publish_pending, [topic_id])
+                timer.daemon = True
+                timer.start()
+                return
+            self.lastPublished[topic_id] = time.time()
+        get_invalidation_bus().publish(QUERY_RESULT_CHANNEL, {"topicId": topic_id})
+
+    def publish_pending(self, topic_id):
+        with self.lock:
+            self.pendingTopics.discard(topic_id)
+            self.lastPublished[topic_id] = time.time()
+        get_invalidation_bus().publish(QUERY_RESULT_CHANNEL, {"topicId": topic_id})
+
+
+query_result_cache = QueryResultCache(processor_settings.QUERY_CACHE_SIZE,
+                                      processor_settings.QUERY_CACHE_TTL,
+                                      processor_settings.QUERY_CACHE_STALE_TTL,
+                                      processor_settings.QUERY_CACHE_REFRESH_WORKERS,
+                                      processor_settings.QUERY_CACHE_PUBLISH_INTERVAL)
+
+
+def find_query_result(current_user, sql: str, console_subject, load, reload=None):
+    """
+    load is called when result is not cached, reload is called in background when result is stale,
+    load is used when reload is not given. rows returned are shared by requests, never change them
+    """
+    if not processor_settings.QUERY_CACHE_ON:
+        return load()
+    return query_result_cache.find(current_user.tenantId, sql, find_topic_ids_of_subject(console_subject), load,
+                                   reload)
+
+
+def invalidate_query_results(topic: Topic):
+    if processor_settings.QUERY_CACHE_ON:
+        query_result_cache.invalidate(topic.topicId)
+
+
+def __on_query_result_invalidation(message: dict):
+    # topic written by other worker
+    query_result_cache.invalidate(message.get("topicId"), False)
+
+
+get_invalidation_bus().subscribe(QUERY_RESULT_CHANNEL, __on_query_result_invalidation)
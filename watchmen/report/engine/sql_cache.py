@@ -0,0 +1,107 @@
+import threading
+
+from cacheout import LRUCache
+
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.common.cache.metadata_cache import get_metadata_cache, TOPIC_BY_ID
+from watchmen.common.cache.versions import Versions
+from watchmen.config.config import processor_settings
+from watchmen.monitor.prometheus.metrics import CACHE_HIT, CACHE_MISS
+from watchmen.report.engine.result_cache import find_topic_ids_of_subject
+
+COMPILED_SQL_CHANNEL = "compiled_sql"
+COMPILED_SQL = "compiled_sql"
+
+SUBJECT = "subject"
+REPORT = "report"
+SPACE_FILTER = "space_filter"
+
+CHART = "chart"
+DATASET = "dataset"
+
+
+class CompiledSqlCache:
+    """
+    compiled queries by tenant and versions of subject, report, space filters and topics they are built from.
+    a version is increased when it is saved, entries of old versions are never hit again and evicted by lru.
+
+    metadata loaded before a save may be compiled after the version is increased, so the compiled query
+    is only cached when nothing is saved since the stamp taken before loading metadata.
+    """
+
+    def __init__(self, maxsize: int):
+        self.cache = LRUCache(maxsize=maxsize, ttl=0)
+        self.versions = Versions(processor_settings.CACHE_VERSIONS_SIZE)
+        self.saves = 0
+        self.lock = threading.Lock()
+
+    def stamp(self) -> int:
+        return self.saves
+
+    def version(self, kind: str, id_) -> int:
+        return self.versions.get((kind, id_))
+
+    def build_key(self, name: str, current_user, console_subject, report_id=None) -> tuple:
+        topic_cache = get_metadata_cache(TOPIC_BY_ID)
+        topic_versions = tuple(sorted((topic_id, topic_cache.version(topic_id))
+                                      for topic_id in find_topic_ids_of_subject(console_subject)))
+        return (name, current_user.tenantId,
+                console_subject.subjectId, self.version(SUBJECT, console_subject.subjectId),
+                report_id, self.version(REPORT, report_id),
+                self.version(SPACE_FILTER, None),
+                topic_versions)
+
+    def find(self, key: tuple, stamp: int, build):
+        compiled = self.cache.get(key)
+        if compiled is not None:
+            CACHE_HIT.labels(COMPILED_SQL).inc()
+            return compiled
+        CACHE_MISS.labels(COMPILED_SQL).inc()
+        compiled = build()
+        with self.lock:
+            if compiled is not None and stamp == self.saves:
+                self.cache.set(key, compiled)
+        return compiled
+
+    def increase_version(self, kind: str, id_=None, publish: bool = True):
+        with self.lock:
+            self.versions.increase((kind, id_))
+            self.saves = self.saves + 1
+        if publish:
+            get_invalidation_bus().publish(COMPILED_SQL_CHANNEL, {"kind": kind, "id": id_})
+
+
+compiled_sql_cache = CompiledSqlCache(processor_settings.COMPILED_SQL_CACHE_SIZE)
+
+
+def get_compiled_sql_cache() -> CompiledSqlCache:
+    return compiled_sql_cache
+
+
+def find_compiled_sql(name: str, current_user, console_subject, report_id, stamp: int, build):
+    """
+    take the stamp by get_compiled_sql_cache().stamp() before loading subject and report
+    """
+    key = compiled_sql_cache.build_key(name, current_user, console_subject, report_id)
+    return compiled_sql_cache.find(key, stamp, build)
+
+
+def subject_saved(subject_id):
+    compiled_sql_cache.increase_version(SUBJECT, subject_id)
+
+
+def report_saved(report_id):
+    compiled_sql_cache.increase_version(REPORT, report_id)
+
+
+def space_filter_saved():
+    # spaces are seldom saved, the filters of all spaces share one version
+    compiled_sql_cache.increase_version(SPACE_FILTER)
+
+
+def __on_compiled_sql_invalidation(message: dict):
+    # saved by other worker
+    compiled_sql_cache.increase_version(message.get("kind"), message.get("id"), False)
+
+
+get_invalidation_bus().subscribe(COMPILED_SQL_CHANNEL, __on_compiled_sql_invalidation)
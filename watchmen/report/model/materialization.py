@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from model.model.common.watchmen_model import WatchmenModel
+
+
+class SubjectMaterialization(WatchmenModel):
+    subjectId: str = None
+    tenantId: str = None
+    tableName: str = None
+    retiredTableName: str = None  # replaced by last rebuild, dropped at a later refresh
+    sqlHash: str = None
+    watermark: datetime = None  # rows of source topics inserted until it are materialized
+    rebuiltAt: datetime = None
+    refreshedAt: datetime = None
+    rowCount: int = None
+    status: str = None  # READY, FAILED
+    error: str = None
@@ -0,0 +1,27 @@
+from watchmen.database.find_storage_template import find_storage_template
+from watchmen.report.model.materialization import SubjectMaterialization
+
+SUBJECT_MATERIALIZATIONS = "subject_materializations"
+
+storage_template = find_storage_template()
+
+
+def create_materialization(materialization: SubjectMaterialization):
+    return storage_template.insert_one(materialization, SubjectMaterialization, SUBJECT_MATERIALIZATIONS)
+
+
+def save_materialization(materialization: SubjectMaterialization):
+    return storage_template.update_one(materialization, SubjectMaterialization, SUBJECT_MATERIALIZATIONS)
+
+
+def load_materialization(subject_id, current_user) -> SubjectMaterialization:
+    return storage_template.find_one({"and": [{"subjectId": subject_id}, {"tenantId": current_user.tenantId}]},
+                                     SubjectMaterialization, SUBJECT_MATERIALIZATIONS)
+
+
+def load_all_materializations():
+    return storage_template.list_all(SubjectMaterialization, SUBJECT_MATERIALIZATIONS)
+
+
+def delete_materialization(subject_id):
+    storage_template.delete_by_id(subject_id, SUBJECT_MATERIALIZATIONS)
@@ -2,8 +2,9 @@ from model.model.common.pagination import Pagination
 from model.model.common.user import User
 from model.model.report.report import Report
 
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.database.find_storage_template import find_storage_template
+from watchmen.report.engine.sql_cache import report_saved
 
 CONSOLE_REPORTS = "console_reports"
 
@@ -16,7 +17,9 @@ def create_report(report: Report):
 
 
 def save_subject_report(report):
-    return storage_template.update_one(report, Report, CONSOLE_REPORTS)
+    result = storage_template.update_one(report, Report, CONSOLE_REPORTS)
+    report_saved(report.reportId)
+    return result
 
 
 def load_report_by_id(report_id, current_user):
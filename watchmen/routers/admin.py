@@ -30,7 +30,7 @@ from watchmen.auth.user_group import UserGroup
 from watchmen.common import deps
 from watchmen.common.presto.presto_utils import create_or_update_presto_schema_fields
 from watchmen.common.security.pat.pat_service import createPAT, queryPAT, deletePAT
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id, add_tenant_id_to_model, \
     compare_tenant, clean_password, is_super_admin
 from watchmen_boot.config.config import settings
@@ -4,8 +4,9 @@ from fastapi import APIRouter, Depends
 from model.model.common.user import User
 
 from watchmen.common import deps
-from watchmen_boot.cache.cache_manage import cacheman, TOPIC_BY_NAME, TOPIC_BY_ID, PIPELINE_BY_ID, \
-    PIPELINES_BY_TOPIC_ID, COLUMNS_BY_TABLE_NAME, TOPIC_DICT_BY_NAME
+from watchmen_boot.cache.cache_manage import cacheman, COLUMNS_BY_TABLE_NAME, TOPIC_DICT_BY_NAME
+from watchmen.common.cache.metadata_cache import get_metadata_cache, metadata_caches, TOPIC_BY_NAME, TOPIC_BY_ID, \
+    PIPELINE_BY_ID, PIPELINES_BY_TOPIC_ID
 from watchmen.database.find_storage_template import find_storage_template
 
 router = APIRouter()
@@ -18,6 +19,8 @@ log = logging.getLogger("app." + __name__)
 @router.get("/cache/clear/all", tags=["admin"])
 def clear_all():
     cacheman.clear_all()
+    for cache in metadata_caches.values():
+        cache.clear()
     storage_template.clear_metadata()
 
 
@@ -30,9 +33,9 @@ def delete_topic_cache(topic_name, current_user: User = Depends(deps.get_current
 
 @router.get("/cache/clear/topics", tags=["admin"])
 def clear_topics_cache(current_user: User = Depends(deps.get_current_user)):
-    cacheman[TOPIC_BY_NAME].clear()
+    get_metadata_cache(TOPIC_BY_NAME).clear()
     cacheman[TOPIC_DICT_BY_NAME].clear()
-    cacheman[TOPIC_BY_ID].clear()
+    get_metadata_cache(TOPIC_BY_ID).clear()
     cacheman[COLUMNS_BY_TABLE_NAME].clear()
 
 
@@ -50,8 +53,8 @@ def clear_pipelines_cache(topic_id, current_user: User = Depends(deps.get_curren
 
 @router.get("/cache/clear/topics/pipelines", tags=["admin"])
 def clear_pipelines_cache(current_user: User = Depends(deps.get_current_user)):
-    cacheman[PIPELINES_BY_TOPIC_ID].clear()
-    cacheman[PIPELINE_BY_ID].clear()
+    get_metadata_cache(PIPELINES_BY_TOPIC_ID).clear()
+    get_metadata_cache(PIPELINE_BY_ID).clear()
 
 
 '''
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import List, Any
 
@@ -19,8 +20,9 @@ from watchmen.auth.tenant import Tenant
 from watchmen.collection.model.topic_event import TopicEvent
 from watchmen.common import deps
 from watchmen.common.constants.parameter_constants import TOPIC, CONSTANT
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
+from watchmen.common.utils.fast_json import FastJSONResponse
 from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_id
 from watchmen.database.datasource.container import data_source_container
 from watchmen.database.datasource.storage import data_source_storage
@@ -71,10 +73,7 @@ async def save_topic_data(topic_event: TopicEvent, current_user: User = Depends(
 async def load_topic_instance(topic_name, current_user: User = Depends(deps.get_current_user)):
     topic: Topic = get_topic_by_name(topic_name, current_user)
     results = get_topic_instances_all(topic)
-    instances = []
-    for result in results:
-        instances.append(TopicInstance(data=result))
-    return instances
+    return FastJSONResponse([{"data": result} for result in results])
 
 
 @router.post("/topic/data/rerun", tags=["common"], deprecated=True)
@@ -159,8 +158,9 @@ async def get_factor_value_by_topic_name_and_condition(query_subject: QuerySubje
     console_subject = load_console_subject_by_id(query_subject.subjectId, current_user)
     subject_filter = __build_subject_filter(query_subject.conditions, console_subject)
     factor_name_list = __get_factor_name_by_alias(query_subject.columnNames, console_subject)
-    return get_factor_value_by_subject_and_condition(console_subject, factor_name_list,
-                                                     subject_filter, current_user)
+    return await asyncio.get_event_loop().run_in_executor(None, get_factor_value_by_subject_and_condition,
+                                                          console_subject, factor_name_list, subject_filter,
+                                                          current_user)
 
 
 @router.get("/table/metadata/clear", tags=["common"])
@@ -1,7 +1,8 @@
+import asyncio
 from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Depends, Body, HTTPException
+from fastapi import APIRouter, Depends, Body, HTTPException, Request, Query
 from model.model.common.data_page import DataPage
 from model.model.common.pagination import Pagination
 from model.model.common.user import User
@@ -17,12 +18,15 @@ from model.model.topic.topic import Topic
 from model.model.topic.topic_relationship import TopicRelationship
 from pydantic import BaseModel
 from starlette import status
+from starlette.responses import StreamingResponse
 
 from watchmen.auth.storage.user import get_user
 from watchmen.common import deps
 from watchmen.common.security.index import validate_jwt
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import build_data_pages, check_fake_id, add_tenant_id_to_model
+from watchmen.common.utils.fast_json import FastJSONResponse, json_dumps
+from watchmen.config.config import processor_settings
 from watchmen.console_space.service.console_space_service import delete_console_subject, \
     delete_console_space_and_sub_data, copy_template_to_console_space, load_space_list_by_dashboard
 from watchmen.console_space.storage.console_space_storage import save_console_space, load_console_space_list_by_user, \
@@ -36,8 +40,13 @@ from watchmen.console_space.storage.favorite_storage import load_favorite, save_
 from watchmen.console_space.storage.last_snapshot_storage import load_last_snapshot, save_last_snapshot
 from watchmen.dashborad.storage.dashborad_storage import create_dashboard_to_storage, update_dashboard_to_storage, \
     load_dashboard_by_user_id, delete_dashboard_by_id, rename_dashboard_by_id, load_dashboard_by_id
+from watchmen.report.engine.columnar import ROWS, COLUMNS, rows_to_columns
 from watchmen.report.engine.dataset_engine import load_dataset_by_subject_id
-from watchmen.report.engine.report_engine import load_chart_dataset, load_chart_dataset_temp
+from watchmen.report.engine.dataset_export import export_dataset, find_export_subject, parquet_export_enabled, \
+    CSV, PARQUET
+from watchmen.report.engine.materialization import refresh_materialization, drop_materialization
+from watchmen.report.engine.report_engine import load_chart_dataset, load_chart_dataset_temp, load_dashboard_charts
+from watchmen.report.model.materialization import SubjectMaterialization
 from watchmen.report.storage.report_storage import create_report, save_subject_report, \
     load_reports_by_ids, delete_report_by_id
 from watchmen.space.service.console import load_topic_list_by_space_id
@@ -202,7 +211,44 @@ async def load_dataset(subject_id, pagination: Pagination = Body(...),
                        current_user: User = Depends(deps.get_current_user)):
     data, count = await load_dataset_by_subject_id(subject_id, pagination, current_user)
 
-    return build_data_pages(pagination, data, count)
+    return FastJSONResponse(build_data_pages(pagination, data, count))
+
+
+@router.get("/console_space/subject/dataset/export", tags=["console"])
+async def export_subject_dataset(subject_id, request: Request, format: str = CSV, max_rows: int = Query(None, ge=1),
+                                 current_user: User = Depends(deps.get_current_user)):
+    """
+    stream all rows of subject dataset in csv or parquet, at most EXPORT_MAX_ROWS rows
+    """
+    if format not in (CSV, PARQUET):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format should be csv or parquet")
+    if format == PARQUET and not parquet_export_enabled():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="parquet export needs pyarrow")
+    console_subject, compiled = find_export_subject(subject_id, current_user)
+    if compiled is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    limit = min(max_rows or processor_settings.EXPORT_MAX_ROWS, processor_settings.EXPORT_MAX_ROWS)
+    media_type = "text/csv" if format == CSV else "application/octet-stream"
+    headers = {"Content-Disposition": 'attachment; filename="{0}.{1}"'.format(console_subject.subjectId, format)}
+    return StreamingResponse(export_dataset(console_subject, compiled, format, limit, request.is_disconnected),
+                             media_type=media_type, headers=headers)
+
+
+@router.get("/console_space/subject/materialize", tags=["console"], response_model=SubjectMaterialization)
+async def materialize_subject(subject_id, current_user: User = Depends(deps.get_current_user)):
+    """
+    materialize subject dataset when it is not materialized yet, otherwise refresh it now
+    """
+    materialization = await asyncio.get_event_loop().run_in_executor(None, refresh_materialization, subject_id,
+                                                                     current_user, True)
+    if materialization is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return materialization
+
+
+@router.get("/console_space/subject/materialize/delete", tags=["console"])
+async def delete_subject_materialization(subject_id, current_user: User = Depends(deps.get_current_user)):
+    await asyncio.get_event_loop().run_in_executor(None, drop_materialization, subject_id, current_user)
 
 
 @router.post("/console_space/graphics", tags=["console"], response_model=ConnectedSpaceGraphics)
@@ -250,15 +296,32 @@ async def delete_report(report_id, current_user: User = Depends(deps.get_current
 
 
 @router.get("/console_space/dataset/chart", tags=["console"], response_model=ConsoleSpaceSubjectChartDataSet)
-async def load_chart(report_id, current_user: User = Depends(deps.get_current_user)):
+async def load_chart(report_id, format: str = ROWS, current_user: User = Depends(deps.get_current_user)):
+    __check_chart_format(format)
     result = await load_chart_dataset(report_id, current_user)
-    return ConsoleSpaceSubjectChartDataSet(meta=[], data=result)
+    return FastJSONResponse({"meta": [], "data": __format_chart_data(result, format)})
 
 
 @router.post("/console_space/dataset/chart/temporary", tags=["console"], response_model=ConsoleSpaceSubjectChartDataSet)
-async def load_temporary_chart(report: Report, current_user: User = Depends(deps.get_current_user)):
-    result = load_chart_dataset_temp(report, current_user)
-    return ConsoleSpaceSubjectChartDataSet(meta=[], data=result)
+async def load_temporary_chart(report: Report, format: str = ROWS,
+                               current_user: User = Depends(deps.get_current_user)):
+    __check_chart_format(format)
+    result = await asyncio.get_event_loop().run_in_executor(None, load_chart_dataset_temp, report, current_user)
+    return FastJSONResponse({"meta": [], "data": __format_chart_data(result, format)})
+
+
+def __check_chart_format(format_: str):
+    if format_ not in (ROWS, COLUMNS):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format should be rows or columns")
+
+
+def __format_chart_data(rows, format_: str):
+    """
+    columns: values of each selected indicator and dimension in one list
+    """
+    if format_ == COLUMNS:
+        return rows_to_columns(rows)
+    return rows
 
 
 ## Dashboard
@@ -284,6 +347,26 @@ async def load_dashboard(current_user: User = Depends(deps.get_current_user)):
     return load_dashboard_by_user_id(current_user.userId, current_user)
 
 
+@router.get("/dashboard/data", tags=["console"])
+async def load_dashboard_data(dashboard_id, current_user: User = Depends(deps.get_current_user)):
+    """
+    charts of dashboard in ndjson, one line is written when one chart is loaded
+    """
+    dashboard = load_dashboard_by_id(dashboard_id, current_user)
+    if dashboard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    async def generate():
+        async for report_id, rows, error in load_dashboard_charts(dashboard, current_user):
+            if error is None:
+                line = {"reportId": report_id, "meta": [], "data": rows}
+            else:
+                line = {"reportId": report_id, "error": error}
+            yield json_dumps(line) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.get("/dashboard/delete", tags=["console"])
 async def delete_dashboard(dashboard_id, current_user: User = Depends(deps.get_current_user)):
     delete_dashboard_by_id(dashboard_id)
@@ -1,17 +1,39 @@
-from fastapi import APIRouter, Depends
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
 from model.model.common.user import User
+from starlette import status
+from starlette.responses import Response
 
 
 from watchmen.common import deps
+from watchmen.common.utils.fast_json import FastJSONResponse
 from watchmen.console_space.storage.console_subject_storage import load_console_subject_by_name
-from watchmen.report.engine.consume_engine import build_query_for_consume
+from watchmen.report.engine.columnar import ROWS, COLUMNS, ARROW, ARROW_MEDIA_TYPE, arrow_enabled, to_arrow_stream
+from watchmen.report.engine.consume_engine import build_query_for_consume, query_columnar_for_consume
 from watchmen.report.model.consume_model import Query
 
 router = APIRouter()
 
 
 @router.post("/consume/dataset/query", tags=["console"])
-async def query_dataset(query: Query, current_user: User = Depends(deps.get_current_user)):
+async def query_dataset(query: Query, format: str = ROWS, current_user: User = Depends(deps.get_current_user)):
+    """
+    format: rows, columns for column-major json, or arrow for arrow ipc stream
+    """
+    if format not in (ROWS, COLUMNS, ARROW):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format should be rows, columns or arrow")
+    if format == ARROW and not arrow_enabled():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="arrow format needs pyarrow")
     console_subject = load_console_subject_by_name(query.subject_name, current_user)
-    data = build_query_for_consume(console_subject, query.indicators, query.where, current_user)
-    return {"data": data}
+    # waiting for a pooled presto connection blocks, never in event loop
+    loop = asyncio.get_event_loop()
+    if format == ROWS:
+        data = await loop.run_in_executor(None, build_query_for_consume, console_subject, query.indicators,
+                                          query.where, current_user)
+        return FastJSONResponse({"data": data})
+    result = await loop.run_in_executor(None, query_columnar_for_consume, console_subject, query.indicators,
+                                        query.where, current_user)
+    if format == ARROW:
+        return Response(content=to_arrow_stream(result), media_type=ARROW_MEDIA_TYPE)
+    return FastJSONResponse(result.to_json())
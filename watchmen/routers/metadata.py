@@ -14,7 +14,7 @@ from model.model.report.report import Report
 from model.model.space.space import Space
 from model.model.topic.topic import Topic
 from pydantic import BaseModel
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 
 from watchmen.auth.storage.user import import_user_to_db, get_user, update_user_storage
 from watchmen.auth.storage.user_group import import_user_group_to_db, get_user_group, update_user_group_storage
@@ -1,3 +1,21 @@
-from fastapi import APIRouter
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, Depends
+from model.model.common.user import User
+
+from watchmen.common import deps
+from watchmen.monitor.model.query_monitor import SlowQuerySource
+from watchmen.monitor.services.query_monitor_service import find_slowest_query_sources
 
 router = APIRouter()
+
+
+@router.get("/monitor/query/slowest", tags=["monitor"], response_model=List[SlowQuerySource])
+async def load_slowest_query_sources(top: int = 10, hours: float = 24,
+                                     current_user: User = Depends(deps.get_current_user)):
+    """
+    top n subjects and reports by average execution time of queries in last hours, needs QUERY_MONITOR_ON
+    """
+    return await asyncio.get_event_loop().run_in_executor(None, find_slowest_query_sources, current_user, top,
+                                                          hours)
@@ -1,19 +1,28 @@
 import asyncio
 import datetime
 import logging
+from typing import Dict, List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from model.model.common.user import User
 from model.model.topic.topic import Topic
 
 from watchmen.collection.model.topic_event import TopicEvent
 from watchmen.common import deps
-from watchmen_boot.guid.snowflake import get_surrogate_key
-from watchmen.pipeline.service.pipeline_service import save_topic_data, get_input_data, run_pipeline
+from watchmen.common.guid.id_block import get_surrogate_key, get_surrogate_keys
+from watchmen.common.utils.fast_json import json_loads
+from watchmen.config.config import processor_settings
+from watchmen.pipeline.core.executor.pipeline_executor import get_pipeline_executor, PipelineExecutorBusyError
+from watchmen.pipeline.service.pipeline_journal_service import pipeline_journal_enabled, journal_topic_event, \
+    replay_pipeline_dead_letters
+from watchmen.pipeline.service.pipeline_service import save_topic_data, get_input_data, run_pipeline, \
+    save_topic_data_batch, run_pipeline_batch, schedule_pipeline
 from watchmen.topic.storage.topic_schema_storage import get_topic, get_topic_by_name_and_tenant_id
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPES = ["application/x-ndjson", "application/ndjson", "application/jsonl"]
+
 log = logging.getLogger("app." + __name__)
 
 
@@ -22,6 +31,14 @@ async def health():
     return {"health": True}
 
 
+def __check_pipeline_capacity():
+    # reject before raw data is saved, the event can be pushed again
+    try:
+        get_pipeline_executor().check_capacity()
+    except PipelineExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 async def __load_topic_definition(topic_name: str, current_user: User) -> Topic:
     topic = get_topic(topic_name, current_user)
     if topic is None:
@@ -36,9 +53,13 @@ async def push_pipeline_data_async(topic_event: TopicEvent, current_user: User =
     #
     # create_raw_topic_instance
     topic = await __load_topic_definition(topic_event.code, current_user)
+    if pipeline_journal_enabled():
+        await journal_topic_event(topic_event, current_user, trace_id)
+        return {"received": True, "trace_id": trace_id}
     data = get_input_data(topic, topic_event)
+    __check_pipeline_capacity()
     await save_topic_data(topic, data, current_user)
-    asyncio.ensure_future(run_pipeline(topic_event, current_user, trace_id))
+    schedule_pipeline(topic_event, current_user, trace_id)
     return {"received": True, "trace_id": trace_id}
 
 
@@ -51,6 +72,7 @@ async def push_pipeline_data(topic_event: TopicEvent, current_user: User = Depen
     data = get_input_data(topic, topic_event)
     before_save_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"The request trace id is {trace_id}, before_save_time is {before_save_time}.")
+    __check_pipeline_capacity()
     await save_topic_data(topic, data, current_user)
     after_save_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"The request trace id is {trace_id}, after_save_time is {after_save_time}.")
@@ -65,8 +87,120 @@ async def push_pipeline_data_async_tenant(topic_event: TopicEvent, current_user:
     trace_id = get_surrogate_key()
     topic = get_topic_by_name_and_tenant_id(topic_event.code,
                                             topic_event.tenantId)
-    data = get_input_data(topic, topic_event)
+    if topic is None:
+        raise Exception(f"{topic_event.code} topic name does not exist")
     current_user.tenantId = topic_event.tenantId
+    if pipeline_journal_enabled():
+        await journal_topic_event(topic_event, current_user, trace_id)
+        return {"received": True, "trace_id": trace_id}
+    data = get_input_data(topic, topic_event)
+    __check_pipeline_capacity()
     await save_topic_data(topic, data, current_user)
-    asyncio.ensure_future(run_pipeline(topic_event, current_user, trace_id))
+    schedule_pipeline(topic_event, current_user, trace_id)
     return {"received": True, "trace_id": trace_id}
+
+
+async def __read_batch_payloads(request: Request):
+    """
+    payloads of a json array, or of a ndjson body which is parsed while streaming
+    """
+    content_type = request.headers.get("content-type", "")
+    if any(content_type.startswith(media_type) for media_type in NDJSON_MEDIA_TYPES):
+        buffer = b""
+        async for chunk in request.stream():
+            lines = (buffer + chunk).split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    else:
+        payloads = json_loads(await request.body())
+        if not isinstance(payloads, list):
+            raise HTTPException(status_code=400, detail="batch body should be a json array or ndjson")
+        for payload in payloads:
+            yield payload
+
+
+def __parse_topic_event(payload) -> TopicEvent:
+    if isinstance(payload, (bytes, str)):
+        payload = json_loads(payload)
+    return TopicEvent.parse_obj(payload)
+
+
+async def __ingest_batch_chunk(chunk: List[tuple], current_user: User, rows: Dict[int, dict]):
+    """
+    events are grouped by topic, rows of each topic are saved by one bulk insert and triggered as one batch.
+    capacity is checked before each group is saved, rows of groups rejected or failed have the error
+    """
+    trace_ids = get_surrogate_keys(len(chunk))
+    groups: Dict[str, List[tuple]] = {}
+    for (index, topic_event), trace_id in zip(chunk, trace_ids):
+        groups.setdefault(topic_event.code, []).append((index, topic_event, trace_id))
+    for code, items in groups.items():
+        topic_events = [topic_event for _, topic_event, _ in items]
+        try:
+            get_pipeline_executor().check_capacity()
+            topic = await __load_topic_definition(code, current_user)
+            await asyncio.get_event_loop().run_in_executor(
+                None, save_topic_data_batch, topic, [get_input_data(topic, topic_event) for topic_event in topic_events],
+                current_user)
+        except Exception as e:
+            log.error("save batch of topic {0} failed: {1}".format(code, e))
+            for index, _, _ in items:
+                rows[index] = {"index": index, "error": str(e)}
+            continue
+        for index, _, trace_id in items:
+            rows[index] = {"index": index, "trace_id": trace_id}
+        try:
+            await run_pipeline_batch(code, topic_events, current_user, [trace_id for _, _, trace_id in items])
+        except Exception as e:
+            # raw data is saved, trace ids are kept to find the pipeline runs
+            log.error("run pipelines of topic {0} failed: {1}".format(code, e))
+            for index, _, _ in items:
+                rows[index]["error"] = str(e)
+
+
+@router.post("/pipeline/data/batch", tags=["pipeline"])
+async def push_pipeline_data_batch(request: Request, current_user: User = Depends(deps.get_current_user)):
+    """
+    accepts a json array of topic events, or ndjson with one topic event per line.
+    each row of response has the trace id, or the error when the event is invalid or not saved,
+    or both when pipelines of the saved event are not triggered
+    """
+    rows: Dict[int, dict] = {}
+    chunk = []
+    index = 0
+    async for payload in __read_batch_payloads(request):
+        try:
+            chunk.append((index, __parse_topic_event(payload)))
+        except Exception as e:
+            rows[index] = {"index": index, "error": str(e)}
+        index = index + 1
+        if len(chunk) >= processor_settings.PIPELINE_BATCH_CHUNK_SIZE:
+            await __ingest_batch_chunk(chunk, current_user, rows)
+            chunk = []
+    if chunk:
+        await __ingest_batch_chunk(chunk, current_user, rows)
+    return {"received": len([row for row in rows.values() if "trace_id" in row]),
+            "rows": [rows[i] for i in range(index)]}
+
+
+@router.post("/pipeline/run/cancel", tags=["pipeline"])
+async def cancel_pipeline_run(trace_id: str, current_user: User = Depends(deps.get_current_user)):
+    """
+    cancel the pipeline run which is scheduled and not started yet
+    """
+    run = get_pipeline_executor().find_run(trace_id)
+    if run is None or run.tenantId != current_user.tenantId:
+        return {"cancelled": False, "trace_id": trace_id}
+    return {"cancelled": run.cancel(), "trace_id": trace_id}
+
+
+@router.post("/pipeline/journal/dead-letter/replay", tags=["pipeline"])
+async def replay_journal_dead_letters(current_user: User = Depends(deps.get_current_user)):
+    """
+    drain dead letters of pipeline journal of the worker process again
+    """
+    return {"replayed": await replay_pipeline_dead_letters()}
@@ -4,7 +4,7 @@ from model.model.space.space import Space
 
 from watchmen.auth.storage.user_group import get_user_group_list_by_ids, update_user_group_storage, USER_GROUPS
 from watchmen.auth.user_group import UserGroup
-from watchmen_boot.guid.snowflake import get_surrogate_key
+from watchmen.common.guid.id_block import get_surrogate_key
 from watchmen.common.utils.data_utils import check_fake_id
 from watchmen.database.find_storage_template import find_storage_template
 from watchmen.space.storage.space_storage import insert_space_to_storage, update_space_to_storage
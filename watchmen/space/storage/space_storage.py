@@ -6,6 +6,7 @@ from model.model.common.user import User
 from model.model.space.space import Space, SpaceFilter
 
 from watchmen.database.find_storage_template import find_storage_template
+from watchmen.report.engine.sql_cache import space_filter_saved
 
 SPACES = "spaces"
 
@@ -22,7 +23,9 @@ def get_space_by_id(space_id: str, current_user: User) -> Space:
 
 
 def update_space_to_storage(space_id: str, space: Space) -> Space:
-    return storage_template.update_one(space, Space, SPACES)
+    result = storage_template.update_one(space, Space, SPACES)
+    space_filter_saved()
+    return result
 
 
 def query_space_with_pagination(query_name: str, pagination: Pagination, current_user) -> DataPage:
@@ -2,21 +2,36 @@ from model.model.topic.topic import Topic
 
 from watchmen.common.utils.data_utils import add_tenant_id_to_instance
 from watchmen.database.topic.adapter.topic_storage_adapter import get_template_by_datasource_id
+from watchmen.pipeline.storage.negative_cache import note_topic_row_written, invalidate_negative_cache
+from watchmen.pipeline.storage.row_cache import invalidate_topic_rows
+from watchmen.report.engine.result_cache import invalidate_query_results
 
 
 def save_topic_instance(topic: Topic, instance, current_user=None):
     template = get_template_by_datasource_id(topic.dataSourceId)
-    return template.topic_data_insert_one(add_tenant_id_to_instance(instance, current_user), topic.name)
+    result = template.topic_data_insert_one(add_tenant_id_to_instance(instance, current_user), topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    note_topic_row_written(topic, instance, current_user)
+    return result
 
 
 def save_topic_instances(topic: Topic, instances):
     template = get_template_by_datasource_id(topic.dataSourceId)
-    return template.topic_data_insert_(instances, topic.name)
+    result = template.topic_data_insert_(instances, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    invalidate_negative_cache(topic)
+    return result
 
 
 def update_topic_instance(topic: Topic, instance, instance_id):
     template = get_template_by_datasource_id(topic.dataSourceId)
-    return template.topic_data_update_one(instance_id, instance, topic.name)
+    result = template.topic_data_update_one(instance_id, instance, topic.name)
+    invalidate_topic_rows(topic)
+    invalidate_query_results(topic)
+    invalidate_negative_cache(topic)
+    return result
 
 
 def get_topic_instances(topic: Topic, conditions):
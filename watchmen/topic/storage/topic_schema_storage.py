@@ -5,8 +5,9 @@ from model.model.common.pagination import Pagination
 from model.model.topic.topic import Topic
 from storage.storage.storage_interface import OrderType
 
-from watchmen_boot.cache.cache_manage import cacheman, TOPIC_BY_ID, TOPIC_BY_NAME, COLUMNS_BY_TABLE_NAME, \
-    TOPIC_DICT_BY_NAME
+from watchmen_boot.cache.cache_manage import cacheman, COLUMNS_BY_TABLE_NAME, TOPIC_DICT_BY_NAME
+from watchmen.common.cache.invalidation_bus import get_invalidation_bus
+from watchmen.common.cache.metadata_cache import get_metadata_cache, TOPIC_BY_ID, TOPIC_BY_NAME, METADATA_CHANNEL
 from watchmen.common.utils.data_utils import build_collection_name
 from watchmen.database.find_storage_template import find_storage_template
 
@@ -15,6 +16,10 @@ TOPICS = "topics"
 storage_template = find_storage_template()
 
 
+def __tenant_id(current_user):
+    return current_user.tenantId if current_user is not None else None
+
+
 def save_topic(topic: Topic) -> Topic:
     return storage_template.insert_one(topic, Topic, TOPICS)
 
@@ -30,28 +35,31 @@ def load_all_topic_list(pagination: Pagination, current_user) -> DataPage:
 
 
 def get_topic_by_name(topic_name: str, current_user=None) -> Topic:
-    cached_topic = cacheman[TOPIC_BY_NAME].get(topic_name)
+    cache = get_metadata_cache(TOPIC_BY_NAME)
+    cached_topic = cache.get(__tenant_id(current_user), topic_name)
     if cached_topic is not None:
         return cached_topic
+    version = cache.version(topic_name)
     if current_user is None:
         result = storage_template.find_one({"name": topic_name}, Topic, TOPICS)
     else:
         result = storage_template.find_one({"and": [{"name": topic_name}, {"tenantId": current_user.tenantId}]}, Topic,
                                            TOPICS)
-    cacheman[TOPIC_BY_NAME].set(topic_name, result)
+    cache.set(__tenant_id(current_user), topic_name, result, version)
     return result
 
 
 def get_topic_by_name_and_tenant_id(topic_name: str, tenant_id: str):
-    cached_topic = cacheman[TOPIC_BY_NAME].get(topic_name)
-    if cached_topic is not None:
-        return cached_topic
     if tenant_id is None:
         raise Exception("tenant_id is empty")
-    else:
-        result = storage_template.find_one({"and": [{"name": topic_name}, {"tenantId": tenant_id}]}, Topic,
-                                           TOPICS)
-    cacheman[TOPIC_BY_NAME].set(topic_name, result)
+    cache = get_metadata_cache(TOPIC_BY_NAME)
+    cached_topic = cache.get(tenant_id, topic_name)
+    if cached_topic is not None:
+        return cached_topic
+    version = cache.version(topic_name)
+    result = storage_template.find_one({"and": [{"name": topic_name}, {"tenantId": tenant_id}]}, Topic,
+                                       TOPICS)
+    cache.set(tenant_id, topic_name, result, version)
     return result
 
 
@@ -71,13 +79,7 @@ def load_topic_list_by_name_and_exclude(topic_name, topic_type, current_user) ->
 
 
 def load_topic_by_name(topic_name: str, current_user) -> Topic:
-    cached_topic = cacheman[TOPIC_BY_NAME].get(topic_name)
-    if cached_topic is not None:
-        return cached_topic
-    result = storage_template.find_one({"and": [{"name": topic_name}, {"tenantId": current_user.tenantId}]}, Topic,
-                                       TOPICS)
-    cacheman[TOPIC_BY_NAME].set(topic_name, result)
-    return result
+    return get_topic_by_name_and_tenant_id(topic_name, current_user.tenantId)
 
 
 def get_topic_list_all():
@@ -85,22 +87,19 @@ def get_topic_list_all():
 
 
 def get_topic_by_id(topic_id: str, current_user=None) -> Topic:
-    cached_topic = cacheman[TOPIC_BY_ID].get(topic_id)
+    cache = get_metadata_cache(TOPIC_BY_ID)
+    cached_topic = cache.get(__tenant_id(current_user), topic_id)
     if cached_topic is not None:
         return cached_topic
 
+    version = cache.version(topic_id)
     if current_user is None:
         result = storage_template.find_one({"topicId": topic_id}, Topic, TOPICS)
-        if result is not None:
-            cacheman[TOPIC_BY_ID].set(topic_id, result)
-        return result
-
     else:
         result = storage_template.find_one({"and": [{"topicId": topic_id}, {"tenantId": current_user.tenantId}]}, Topic,
                                            TOPICS)
-        if result is not None:
-            cacheman[TOPIC_BY_ID].set(topic_id, result)
-        return result
+    cache.set(__tenant_id(current_user), topic_id, result, version)
+    return result
 
 
 def get_topic_list_by_ids(topic_ids: List[str], current_user) -> List[Topic]:
@@ -123,17 +122,44 @@ def query_topic_list_with_pagination(query_name: str, pagination: Pagination, cu
 
 def update_topic(topic_id: str, topic: Topic) -> Topic:
     result = storage_template.update_one(topic, Topic, TOPICS)
-    cacheman[TOPIC_BY_NAME].delete(topic.name)
-    cacheman[TOPIC_DICT_BY_NAME].delete(topic.name)
-    cacheman[TOPIC_BY_ID].delete(topic_id)
-    cacheman[COLUMNS_BY_TABLE_NAME].delete(build_collection_name(topic.name))
+    __invalidate_topic_cache(topic_id, topic.name)
     return result
 
 
 def import_topic_to_db(topic: Topic) -> Topic:
     result = storage_template.insert_one(topic, Topic, TOPICS)
-    cacheman[TOPIC_BY_NAME].delete(topic.name)
-    cacheman[TOPIC_DICT_BY_NAME].delete(topic.name)
-    cacheman[TOPIC_BY_ID].delete(topic.topicId)
-    cacheman[COLUMNS_BY_TABLE_NAME].delete(build_collection_name(topic.name))
+    __invalidate_topic_cache(topic.topicId, topic.name)
     return result
+
+
+def __invalidate_topic_cache(topic_id, topic_name):
+    get_metadata_cache(TOPIC_BY_NAME).invalidate(topic_name)
+    get_metadata_cache(TOPIC_BY_ID).invalidate(topic_id)
+    cacheman[TOPIC_DICT_BY_NAME].delete(topic_name)
+    cacheman[COLUMNS_BY_TABLE_NAME].delete(build_collection_name(topic_name))
+
+
+def warm_up_topic_cache():
+    topics = storage_template.list_all(Topic, TOPICS)
+    by_name = get_metadata_cache(TOPIC_BY_NAME)
+    by_id = get_metadata_cache(TOPIC_BY_ID)
+    for topic in topics:
+        by_name.set(topic.tenantId, topic.name, topic)
+        by_id.set(topic.tenantId, topic.topicId, topic)
+        # topic id is unique in all tenants
+        by_id.set(None, topic.topicId, topic)
+    return len(topics)
+
+
+def __on_topic_invalidation(message: dict):
+    # caches of storage templates are invalidated with topic in other workers
+    if message.get("cache") == TOPIC_BY_NAME:
+        if message.get("key") is None:
+            cacheman[TOPIC_DICT_BY_NAME].clear()
+            cacheman[COLUMNS_BY_TABLE_NAME].clear()
+        else:
+            cacheman[TOPIC_DICT_BY_NAME].delete(message.get("key"))
+            cacheman[COLUMNS_BY_TABLE_NAME].delete(build_collection_name(message.get("key")))
+
+
+get_invalidation_bus().subscribe(METADATA_CHANNEL, __on_topic_invalidation)